@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from typing import Optional
+from datetime import date, datetime, time
 
 from app.config.database import get_db
 from app.core.dependencies import get_current_active_user
 from app.models.user import User
 from app.models.account_balance_history import BalanceChangeType
 from app.services.account_balance_history_service import AccountBalanceHistoryService
+from app.services.balance_checkpoint_service import BalanceCheckpointService
+from app.services.balance_history_compaction_service import BalanceHistoryCompactionService
 from app.core.responses import success_response, error_response
 from app.core.exceptions import NotFoundError, ValidationError
 
@@ -27,7 +30,7 @@ async def get_account_balance_history(
 ):
     """获取账户余额历史"""
     try:
-        histories = balance_service.get_account_balance_history(
+        history_responses = balance_service.get_account_history_entries(
             user_id=current_user.id,
             account_id=account_id,
             limit=limit,
@@ -35,23 +38,6 @@ async def get_account_balance_history(
             change_type=change_type
         )
 
-        # 转换为响应格式
-        history_responses = []
-        for history in histories:
-            history_dict = {
-                "id": history.id,
-                "account_id": history.account_id,
-                "transaction_id": history.transaction_id,
-                "change_type": history.change_type,
-                "amount_before": float(history.amount_before),
-                "amount_after": float(history.amount_after),
-                "change_amount": float(history.change_amount),
-                "description": history.description,
-                "reference_id": history.reference_id,
-                "created_at": history.created_at
-            }
-            history_responses.append(history_dict)
-
         return success_response(data=history_responses)
 
     except NotFoundError as e:
@@ -59,6 +45,29 @@ async def get_account_balance_history(
     except Exception as e:
         return error_response(500, f"获取账户余额历史失败: {str(e)}")
 
+@router.get("/accounts/{account_id}/balance-history/summaries/{summary_id}/archive")
+async def get_balance_history_archive(
+    account_id: int,
+    summary_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """获取已压缩汇总行对应的归档明细"""
+    try:
+        summary = AccountBalanceHistoryService(db).get_history_summary(
+            user_id=current_user.id,
+            account_id=account_id,
+            summary_id=summary_id
+        )
+        rows = BalanceHistoryCompactionService(db).read_archive(summary.archive_file) if summary.archive_file else []
+
+        return success_response(data=rows)
+
+    except NotFoundError as e:
+        return error_response(404, str(e))
+    except Exception as e:
+        return error_response(500, f"获取归档明细失败: {str(e)}")
+
 @router.get("/balance-history")
 async def get_user_balance_history(
     limit: int = Query(100, le=200, description="限制数量"),
@@ -69,31 +78,13 @@ async def get_user_balance_history(
 ):
     """获取用户所有账户的余额历史"""
     try:
-        histories = balance_service.get_user_balance_history(
+        history_responses = balance_service.get_user_history_entries(
             user_id=current_user.id,
             limit=limit,
             offset=offset,
             change_type=change_type
         )
 
-        # 转换为响应格式
-        history_responses = []
-        for history in histories:
-            history_dict = {
-                "id": history.id,
-                "account_id": history.account_id,
-                "account_name": history.account.name if history.account else None,
-                "transaction_id": history.transaction_id,
-                "change_type": history.change_type,
-                "amount_before": float(history.amount_before),
-                "amount_after": float(history.amount_after),
-                "change_amount": float(history.change_amount),
-                "description": history.description,
-                "reference_id": history.reference_id,
-                "created_at": history.created_at
-            }
-            history_responses.append(history_dict)
-
         return success_response(data=history_responses)
 
     except Exception as e:
@@ -121,6 +112,29 @@ async def get_balance_statistics(
     except Exception as e:
         return error_response(500, f"获取账户余额统计失败: {str(e)}")
 
+@router.get("/accounts/{account_id}/balance-as-of")
+async def get_balance_as_of(
+    account_id: int,
+    as_of_date: date = Query(..., alias="date", description="查询日期，返回该日结束时的余额"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """查询账户在指定日期结束时的余额"""
+    try:
+        checkpoint_service = BalanceCheckpointService(db)
+        result = checkpoint_service.get_balance_as_of(
+            user_id=current_user.id,
+            account_id=account_id,
+            as_of=datetime.combine(as_of_date, time.max)
+        )
+
+        return success_response(data=result)
+
+    except NotFoundError as e:
+        return error_response(404, str(e))
+    except Exception as e:
+        return error_response(500, f"查询历史余额失败: {str(e)}")
+
 @router.post("/accounts/{account_id}/record-initial-balance")
 async def record_initial_balance(
     account_id: int,
@@ -1,15 +1,18 @@
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from typing import Optional
+from datetime import date, timedelta
 
 from app.config.database import get_db
 from app.core.dependencies import get_current_active_user
 from app.models.user import User
 from app.models.account import AccountType
 from app.services.account_service import AccountService
+from app.services.balance_reconciliation_service import BalanceReconciliationService
 from app.schemas.account import (
     AccountCreate, AccountUpdate, AccountTransfer,
-    AccountResponse, AccountListResponse, AccountWithStats
+    AccountResponse, AccountListResponse, AccountWithStats,
+    AccountWithStatsListResponse
 )
 from app.core.responses import success_response, error_response
 from app.core.exceptions import NotFoundError, ValidationError
@@ -116,6 +119,100 @@ async def get_default_account(
     except Exception as e:
         return error_response(500, f"获取默认账户失败: {str(e)}")
 
+@router.get("/with-stats", response_model=AccountWithStatsListResponse)
+async def get_accounts_with_stats(
+    type: Optional[str] = Query(None, description="账户类型"),
+    is_enabled: Optional[bool] = Query(None, description="是否启用"),
+    current_user: User = Depends(get_current_active_user),
+    account_service: AccountService = Depends(get_account_service)
+):
+    """获取全部账户及余额、收支、转账统计"""
+    try:
+        account_type = None
+        if type and type.strip():
+            account_type = AccountType(type)
+
+        accounts = account_service.get_accounts_with_stats(
+            user_id=current_user.id,
+            account_type=account_type,
+            is_enabled=is_enabled
+        )
+
+        return AccountWithStatsListResponse(
+            accounts=accounts,
+            total=len(accounts)
+        )
+
+    except Exception as e:
+        return error_response(500, f"获取账户统计失败: {str(e)}")
+
+@router.get("/net-worth")
+async def get_net_worth(
+    start_date: Optional[date] = Query(None, description="开始日期，默认结束日期前一年"),
+    end_date: Optional[date] = Query(None, description="结束日期，默认今天"),
+    granularity: str = Query("day", pattern="^(day|month)$", description="粒度：day/month"),
+    current_user: User = Depends(get_current_active_user),
+    account_service: AccountService = Depends(get_account_service)
+):
+    """获取净资产时间序列"""
+    try:
+        end_date = end_date or date.today()
+        start_date = start_date or end_date - timedelta(days=365)
+
+        result = account_service.get_net_worth_series(
+            user_id=current_user.id,
+            start_date=start_date,
+            end_date=end_date,
+            granularity=granularity
+        )
+
+        return success_response(data=result)
+
+    except ValidationError as e:
+        return error_response(400, str(e))
+    except Exception as e:
+        return error_response(500, f"获取净资产序列失败: {str(e)}")
+
+@router.get("/reconciliation")
+async def get_balance_reconciliation(
+    tolerance: float = Query(0.01, ge=0, description="容差（元）"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """按交易记录核对账户余额，仅报告差异"""
+    try:
+        result = BalanceReconciliationService(db).reconcile_user(
+            user_id=current_user.id,
+            tolerance=tolerance
+        )
+
+        return success_response(data=result)
+
+    except Exception as e:
+        return error_response(500, f"余额对账失败: {str(e)}")
+
+@router.post("/reconciliation")
+async def fix_balance_reconciliation(
+    tolerance: float = Query(0.01, ge=0, description="容差（元）"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """按交易记录核对并修正账户余额（记录 CORRECTION 余额历史）"""
+    try:
+        result = BalanceReconciliationService(db).reconcile_user(
+            user_id=current_user.id,
+            fix=True,
+            tolerance=tolerance
+        )
+
+        return success_response(
+            message=f"已修正 {result['fixed_count']} 个账户的余额",
+            data=result
+        )
+
+    except Exception as e:
+        return error_response(500, f"余额修正失败: {str(e)}")
+
 @router.get("/{account_id}", response_model=AccountWithStats)
 async def get_account(
     account_id: int,
@@ -246,24 +343,19 @@ async def transfer_between_accounts(
 ):
     """账户间转账"""
     try:
-        from_transaction, to_transaction, from_account, to_account = account_service.transfer_between_accounts(
+        transaction, from_account, to_account = account_service.transfer_between_accounts(
             user_id=current_user.id,
             transfer_data=transfer_data
         )
 
         # 构建响应数据
         response_data = {
-            "from_transaction": {
-                "id": from_transaction.id,
-                "amount": float(from_transaction.amount),
-                "account_name": from_account.name,
-                "remark": from_transaction.remark
-            },
-            "to_transaction": {
-                "id": to_transaction.id,
-                "amount": float(to_transaction.amount),
-                "account_name": to_account.name,
-                "remark": to_transaction.remark
+            "transaction": {
+                "id": transaction.id,
+                "amount": float(transaction.amount),
+                "from_account_name": from_account.name,
+                "to_account_name": to_account.name,
+                "remark": transaction.remark
             },
             "from_account_balance": float(from_account.balance),
             "to_account_balance": float(to_account.balance)
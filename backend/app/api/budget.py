@@ -1,15 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from sqlalchemy import and_
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 from decimal import Decimal
+import asyncio
+import json
 
 from app.config.database import get_db
 from app.models.budget import Budget, PeriodType
-from app.models.category import Category
-from app.models.transaction import Transaction, TransactionType
+from app.models.category import Category, CategoryClosure
 from app.core.responses import success_response, error_response
+from app.core.dependencies import get_current_active_user
+from app.core.events import broker
+from app.models.user import User
+from app.services.budget_service import BudgetService, calculate_percentage, get_budget_status
 
 router = APIRouter()
 
@@ -19,6 +25,8 @@ async def get_budgets(
     year: int = Query(..., description="年份"),
     month: Optional[int] = Query(None, description="月份"),
     period_type: Optional[str] = Query(None, description="周期类型: monthly, yearly"),
+    category_id: Optional[int] = Query(None, description="分类ID"),
+    include_descendants: bool = Query(False, description="是否包含子分类的预算"),
     db: Session = Depends(get_db)
 ):
     """获取预算列表"""
@@ -35,17 +43,23 @@ async def get_budgets(
             query_conditions.append(Budget.period_type == period_type)
 
         # 查询预算
-        budgets = db.query(Budget).join(Category).filter(
-            and_(*query_conditions)
-        ).all()
-
-        # 获取预算执行情况
+        query = db.query(Budget).join(Category)
+        if category_id is not None:
+            if include_descendants:
+                # 经闭包表一次连接取出整棵子树上的预算
+                query = query.join(CategoryClosure, and_(
+                    CategoryClosure.descendant_id == Budget.category_id,
+                    CategoryClosure.ancestor_id == category_id
+                ))
+            else:
+                query_conditions.append(Budget.category_id == category_id)
+        budgets = query.filter(and_(*query_conditions)).all()
+
+        # 获取预算执行情况（一次分组查询）
         budget_data = []
-        for budget in budgets:
-            # 计算实际支出
-            actual_spending = get_actual_spending(db, budget)
-            percentage = calculate_percentage(actual_spending, budget.amount)
-            status = get_budget_status(percentage, budget.alert_threshold)
+        for evaluation in BudgetService(db).evaluate(budgets):
+            budget = evaluation["budget"]
+            actual_spending = evaluation["actual_spending"]
 
             budget_data.append({
                 "id": budget.id,
@@ -57,9 +71,9 @@ async def get_budgets(
                 } if budget.category else None,
                 "amount": float(budget.amount),
                 "actual_spending": float(actual_spending),
-                "remaining": float(budget.amount - actual_spending),
-                "percentage": percentage,
-                "status": status,
+                "remaining": float(evaluation["remaining"]),
+                "percentage": evaluation["percentage"],
+                "status": evaluation["status"],
                 "period_type": budget.period_type.value,
                 "year": budget.year,
                 "month": budget.month,
@@ -132,6 +146,8 @@ async def create_budget(
         )
 
         db.add(budget)
+        db.flush()
+        BudgetService(db).refresh_counters([budget])
         db.commit()
         db.refresh(budget)
 
@@ -173,6 +189,7 @@ async def update_budget(
         if "is_enabled" in budget_data:
             budget.is_enabled = budget_data["is_enabled"]
 
+        BudgetService(db).refresh_status(budget)
         db.commit()
         db.refresh(budget)
 
@@ -239,10 +256,10 @@ async def get_budget_summary(
         warning_count = 0
 
         budget_details = []
-        for budget in budgets:
-            actual_spending = get_actual_spending(db, budget)
-            percentage = calculate_percentage(actual_spending, budget.amount)
-            status = get_budget_status(percentage, budget.alert_threshold)
+        for evaluation in BudgetService(db).evaluate(budgets):
+            budget = evaluation["budget"]
+            actual_spending = evaluation["actual_spending"]
+            status = evaluation["status"]
 
             total_budget += budget.amount
             total_spending += actual_spending
@@ -257,7 +274,7 @@ async def get_budget_summary(
                 "category_name": budget.category.name if budget.category else "总预算",
                 "budget_amount": float(budget.amount),
                 "actual_spending": float(actual_spending),
-                "percentage": percentage,
+                "percentage": evaluation["percentage"],
                 "status": status
             })
 
@@ -284,49 +301,48 @@ async def get_budget_summary(
     except Exception as e:
         return error_response(500, f"获取预算汇总失败: {str(e)}")
 
-@router.get("/alerts")
-async def get_budget_alerts(
+@router.get("/forecast")
+async def get_budget_forecast(
+    year: Optional[int] = Query(None, description="年份，默认当前年份"),
+    month: Optional[int] = Query(None, ge=1, le=12, description="月份，默认当前月份"),
+    history_months: int = Query(3, ge=0, le=12, description="参考的历史月份数"),
     db: Session = Depends(get_db)
 ):
-    """获取预算预警信息"""
+    """预测月度预算的月末支出和超支日期"""
     try:
         current_date = datetime.now()
-        current_year = current_date.year
-        current_month = current_date.month
+        year = year or current_date.year
+        month = month or current_date.month
 
-        # 查询当前月份的所有启用预算
         budgets = db.query(Budget).join(Category).filter(
             and_(
-                Budget.year == current_year,
-                or_(
-                    and_(Budget.month == current_month, Budget.period_type == PeriodType.MONTHLY),
-                    Budget.period_type == PeriodType.YEARLY
-                ),
+                Budget.year == year,
+                Budget.month == month,
+                Budget.period_type == PeriodType.MONTHLY,
                 Budget.is_enabled == True
             )
         ).all()
 
-        alerts = []
-        for budget in budgets:
-            actual_spending = get_actual_spending(db, budget)
-            percentage = calculate_percentage(actual_spending, budget.amount)
-            status = get_budget_status(percentage, budget.alert_threshold)
-
-            if status in ["warning", "exceeded"]:
-                alerts.append({
-                    "id": budget.id,
-                    "category_name": budget.category.name if budget.category else "总预算",
-                    "budget_amount": float(budget.amount),
-                    "actual_spending": float(actual_spending),
-                    "percentage": percentage,
-                    "status": status,
-                    "remaining": float(budget.amount - actual_spending),
-                    "alert_threshold": budget.alert_threshold,
-                    "period_type": budget.period_type.value
-                })
-
-        # 按百分比排序，超支的排在前面
-        alerts.sort(key=lambda x: x["percentage"], reverse=True)
+        forecasts = BudgetService(db).forecast(budgets, year, month, history_months=history_months)
+
+        return success_response({
+            "year": year,
+            "month": month,
+            "history_months": history_months,
+            "forecasts": forecasts,
+            "overrun_count": len([f for f in forecasts if f["overrun_date"]])
+        })
+
+    except Exception as e:
+        return error_response(500, f"获取预算预测失败: {str(e)}")
+
+@router.get("/alerts")
+async def get_budget_alerts(
+    db: Session = Depends(get_db)
+):
+    """获取预算预警信息（读取交易写入时维护的预算计数器）"""
+    try:
+        alerts = BudgetService(db).get_alerts()
 
         return success_response({
             "alerts": alerts,
@@ -338,49 +354,35 @@ async def get_budget_alerts(
     except Exception as e:
         return error_response(500, f"获取预算预警失败: {str(e)}")
 
+@router.get("/alerts/stream")
+async def stream_budget_alerts(
+    request: Request,
+    current_user: User = Depends(get_current_active_user)
+):
+    """订阅预算预警推送（Server-Sent Events），交易写入使预算进入预警或超支时推送"""
+    user_id = current_user.id
+
+    async def event_stream():
+        queue = broker.subscribe(user_id)
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # 心跳，保持连接并及时发现断开
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: budget_alert\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        finally:
+            broker.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 def get_actual_spending(db: Session, budget: Budget) -> Decimal:
-    """计算预算期间的实际支出"""
-    query_conditions = [
-        Transaction.type == TransactionType.EXPENSE
-    ]
-
-    # 时间范围
-    if budget.period_type == PeriodType.MONTHLY and budget.month:
-        start_date = datetime(budget.year, budget.month, 1)
-        if budget.month == 12:
-            end_date = datetime(budget.year + 1, 1, 1)
-        else:
-            end_date = datetime(budget.year, budget.month + 1, 1)
-    else:  # YEARLY
-        start_date = datetime(budget.year, 1, 1)
-        end_date = datetime(budget.year + 1, 1, 1)
-
-    query_conditions.extend([
-        Transaction.transaction_date >= start_date,
-        Transaction.transaction_date < end_date
-    ])
-
-    # 分类筛选
-    if budget.category_id:
-        query_conditions.append(Transaction.category_id == budget.category_id)
-
-    actual_spending = db.query(func.coalesce(func.sum(Transaction.amount), 0)).filter(
-        and_(*query_conditions)
-    ).scalar()
-
-    return actual_spending or Decimal('0')
-
-def calculate_percentage(actual: Decimal, budget: Decimal) -> float:
-    """计算预算使用百分比"""
-    if budget == 0:
-        return 0.0
-    return round(float(actual / budget * 100), 2)
-
-def get_budget_status(percentage: float, alert_threshold: int) -> str:
-    """获取预算状态"""
-    if percentage >= 100:
-        return "exceeded"  # 超支
-    elif percentage >= alert_threshold:
-        return "warning"    # 预警
-    else:
-        return "normal"     # 正常
\ No newline at end of file
+    """计算预算期间的实际支出（批量计算请使用 BudgetService.evaluate）"""
+    return BudgetService(db).get_spending([budget]).get(budget.id, Decimal('0'))
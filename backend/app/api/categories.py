@@ -78,52 +78,13 @@ async def get_category_tree(
 ):
     """获取分类树"""
     try:
-        categories = category_service.get_category_tree(
+        tree = category_service.get_category_tree(
             user_id=current_user.id,
             category_type=type,
             include_system=include_system
         )
 
-        # 转换为响应格式
-        category_responses = []
-        for category in categories:
-            category_dict = {
-                "id": category.id,
-                "user_id": None,  # 分类是系统级的,没有user_id
-                "name": category.name,
-                "type": category.type,
-                "icon": category.icon,
-                "color": category.color,
-                "parent_id": category.parent_id,
-                "sort_order": category.sort_order,
-                "is_system": category.is_system,
-                "created_at": category.created_at,
-                "updated_at": category.updated_at,
-                "children": [],
-            }
-
-            # 递归处理子分类
-            if hasattr(category, 'children') and category.children:
-                for child in category.children:
-                    child_dict = {
-                        "id": child.id,
-                        "user_id": child.user_id,
-                        "name": child.name,
-                        "type": child.type,
-                        "icon": child.icon,
-                        "color": child.color,
-                        "parent_id": child.parent_id,
-                        "sort_order": child.sort_order,
-                        "is_system": child.is_system,
-                        "created_at": child.created_at,
-                        "updated_at": child.updated_at,
-                        "children": [],
-                    }
-                    category_dict["children"].append(CategoryTreeResponse(**child_dict))
-
-            category_responses.append(CategoryTreeResponse(**category_dict))
-
-        return category_responses
+        return [CategoryTreeResponse(**node) for node in tree]
 
     except Exception as e:
         return error_response(500, f"获取分类树失败: {str(e)}")
@@ -132,6 +93,7 @@ async def get_category_tree(
 async def get_categories_with_stats(
     type: Optional[CategoryType] = Query(None, description="分类类型"),
     limit: int = Query(20, ge=1, le=100, description="返回数量限制"),
+    include_descendants: bool = Query(False, description="父分类是否汇总子分类的交易"),
     current_user: User = Depends(get_current_active_user),
     category_service: CategoryService = Depends(get_category_service)
 ):
@@ -140,7 +102,8 @@ async def get_categories_with_stats(
         categories = category_service.get_categories_with_usage_stats(
             user_id=current_user.id,
             category_type=type,
-            limit=limit
+            limit=limit,
+            include_descendants=include_descendants
         )
 
         return categories
@@ -151,6 +114,7 @@ async def get_categories_with_stats(
 @router.get("/{category_id}", response_model=CategoryWithStats)
 async def get_category(
     category_id: int,
+    include_descendants: bool = Query(False, description="是否汇总子分类的交易"),
     current_user: User = Depends(get_current_active_user),
     category_service: CategoryService = Depends(get_category_service)
 ):
@@ -158,7 +122,8 @@ async def get_category(
     try:
         category = category_service.get_category_with_stats(
             user_id=current_user.id,
-            category_id=category_id
+            category_id=category_id,
+            include_descendants=include_descendants
         )
 
         return category
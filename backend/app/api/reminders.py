@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, Query, BackgroundTasks
+from fastapi import APIRouter, Body, Depends, Query, BackgroundTasks
 from sqlalchemy.orm import Session
 from typing import Optional, List
 
@@ -7,9 +7,10 @@ from app.core.dependencies import get_current_active_user
 from app.models.user import User
 from app.models.reminder import ReminderType
 from app.services.reminder_service import ReminderService
+from app.services.notification_service import NotificationService
 from app.schemas.reminder import (
     ReminderCreate, ReminderUpdate, ReminderResponse, ReminderListResponse,
-    ReminderNotification, DailyReminderCheck, ReminderStatistics
+    DailyReminderCheck, ReminderStatistics
 )
 from app.core.responses import success_response, error_response
 from app.core.exceptions import NotFoundError, ValidationError
@@ -51,6 +52,7 @@ async def get_reminders(
                 "amount": float(reminder.amount) if reminder.amount else None,
                 "is_enabled": reminder.is_enabled,
                 "last_reminded_at": reminder.last_reminded_at,
+                "next_fire_at": reminder.next_fire_at,
                 "created_at": reminder.created_at,
                 "updated_at": reminder.updated_at,
             }
@@ -86,6 +88,7 @@ async def get_reminder(
             "amount": float(reminder.amount) if reminder.amount else None,
             "is_enabled": reminder.is_enabled,
             "last_reminded_at": reminder.last_reminded_at,
+            "next_fire_at": reminder.next_fire_at,
             "created_at": reminder.created_at,
             "updated_at": reminder.updated_at,
         }
@@ -122,6 +125,7 @@ async def create_reminder(
             "amount": float(reminder.amount) if reminder.amount else None,
             "is_enabled": reminder.is_enabled,
             "last_reminded_at": reminder.last_reminded_at,
+            "next_fire_at": reminder.next_fire_at,
             "created_at": reminder.created_at,
             "updated_at": reminder.updated_at,
         }
@@ -160,6 +164,7 @@ async def update_reminder(
             "amount": float(reminder.amount) if reminder.amount else None,
             "is_enabled": reminder.is_enabled,
             "last_reminded_at": reminder.last_reminded_at,
+            "next_fire_at": reminder.next_fire_at,
             "created_at": reminder.created_at,
             "updated_at": reminder.updated_at,
         }
@@ -237,6 +242,47 @@ async def check_daily_reminder(
     except Exception as e:
         return error_response(500, f"检查每日提醒失败: {str(e)}")
 
+@router.get("/notifications/inbox")
+async def get_notification_inbox(
+    include_sent: bool = Query(False, description="是否包含已送达的通知"),
+    limit: int = Query(50, ge=1, le=200, description="返回数量"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """获取通知收件箱（默认只返回尚未送达的通知）"""
+    try:
+        notifications = NotificationService(db).list_inbox(current_user.id, include_sent, limit)
+
+        return success_response(data=[
+            {
+                "id": notification.id,
+                "reminder_id": notification.reminder_id,
+                "status": notification.status,
+                "payload": notification.payload,
+                "created_at": notification.created_at,
+                "sent_at": notification.sent_at
+            }
+            for notification in notifications
+        ])
+
+    except Exception as e:
+        return error_response(500, f"获取通知失败: {str(e)}")
+
+@router.post("/notifications/ack")
+async def acknowledge_notifications(
+    notification_ids: List[int] = Body(..., embed=True, description="已读的通知ID"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """确认通知已读，标记为已发送"""
+    try:
+        count = NotificationService(db).acknowledge(current_user.id, notification_ids)
+
+        return success_response(message=f"已确认 {count} 条通知", data={"acknowledged_count": count})
+
+    except Exception as e:
+        return error_response(500, f"确认通知失败: {str(e)}")
+
 @router.post("/system/process-due-reminders")
 async def process_due_reminders(
     background_tasks: BackgroundTasks,
@@ -244,28 +290,12 @@ async def process_due_reminders(
 ):
     """处理到期提醒（系统接口）"""
     try:
-        due_reminders = reminder_service.get_due_reminders()
-
-        notifications = []
-        for reminder in due_reminders:
-            # 构建通知数据
-            notification = ReminderNotification(
-                id=reminder.id,
-                type=reminder.type,
-                title=reminder.title or f"{reminder.type.value}提醒",
-                content=reminder.content or "您有待处理的提醒",
-                user_id=reminder.user_id,
-                category_name=reminder.category.name if reminder.category else None
-            )
-            notifications.append(notification.dict())
-
-            # 更新最后提醒时间
-            background_tasks.add_task(reminder_service.update_last_reminded, reminder.id)
+        notifications = reminder_service.process_due_reminders()
 
         return success_response(
-            message=f"处理了 {len(due_reminders)} 个到期提醒",
+            message=f"处理了 {len(notifications)} 个到期提醒，通知已加入发送队列",
             data={
-                "processed_count": len(due_reminders),
+                "processed_count": len(notifications),
                 "notifications": notifications
             }
         )
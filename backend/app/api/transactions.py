@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Optional
 from datetime import datetime
 
-from app.config.database import get_db
+from app.config.database import get_db, SessionLocal
 from app.core.dependencies import get_current_active_user
 from app.models.user import User
-from app.models.transaction import TransactionType
+from app.models.transaction import TransactionType, TransactionSource
 from app.services.transaction_service import TransactionService
 from app.schemas.transaction import (
     TransactionCreate, TransactionUpdate, TransactionFilter,
@@ -14,6 +15,7 @@ from app.schemas.transaction import (
 )
 from app.core.responses import success_response, error_response
 from app.core.exceptions import NotFoundError
+from app.utils.export import TRANSACTION_STREAM_FIELDS, iter_ndjson, iter_csv, gzip_stream
 
 router = APIRouter()
 
@@ -99,6 +101,7 @@ async def get_transactions(
                 "wechat_transaction_id": transaction.wechat_transaction_id,
                 "original_category": transaction.original_category,
                 "merchant_name": transaction.merchant_name,
+                "merchant_id": transaction.merchant_id,
                 "pay_method": transaction.pay_method,
                 "is_repeated": transaction.is_repeated,
                 "created_at": transaction.created_at,
@@ -196,6 +199,7 @@ async def search_transactions(
                 "wechat_transaction_id": transaction.wechat_transaction_id,
                 "original_category": transaction.original_category,
                 "merchant_name": transaction.merchant_name,
+                "merchant_id": transaction.merchant_id,
                 "pay_method": transaction.pay_method,
                 "is_repeated": transaction.is_repeated,
                 "created_at": transaction.created_at,
@@ -214,6 +218,84 @@ async def search_transactions(
     except Exception as e:
         return error_response(500, f"搜索交易记录失败: {str(e)}")
 
+@router.get("/export/stream")
+async def stream_transactions(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="输出格式: ndjson, csv"),
+    gzip: bool = Query(False, description="是否gzip压缩"),
+    type: Optional[str] = Query(None, description="交易类型"),
+    category_id: Optional[int] = Query(None, ge=1, description="分类ID"),
+    account_id: Optional[int] = Query(None, ge=1, description="账户ID"),
+    start_date: Optional[str] = Query(None, description="开始日期"),
+    end_date: Optional[str] = Query(None, description="结束日期"),
+    keyword: Optional[str] = Query(None, description="关键词搜索"),
+    min_amount: Optional[float] = Query(None, ge=0, description="最小金额"),
+    max_amount: Optional[float] = Query(None, ge=0, description="最大金额"),
+    source: Optional[str] = Query(None, description="数据来源"),
+    is_repeated: Optional[bool] = Query(None, description="是否重复交易"),
+    batch_size: int = Query(1000, ge=100, le=10000, description="游标批次大小"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    流式导出全部匹配的交易记录
+
+    支持与列表接口相同的筛选条件，不分页、不统计总数，
+    以 NDJSON 或 CSV 格式逐批输出，可选 gzip 压缩。
+    """
+    try:
+        filter_dict = {}
+        if type and type.strip():
+            filter_dict['type'] = TransactionType(type)
+        if category_id:
+            filter_dict['category_id'] = category_id
+        if account_id:
+            filter_dict['account_id'] = account_id
+        if start_date and start_date.strip():
+            filter_dict['start_date'] = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+        if end_date and end_date.strip():
+            filter_dict['end_date'] = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+        if keyword and keyword.strip():
+            filter_dict['keyword'] = keyword
+        if min_amount:
+            filter_dict['min_amount'] = min_amount
+        if max_amount:
+            filter_dict['max_amount'] = max_amount
+        if source and source.strip():
+            filter_dict['source'] = TransactionSource(source)
+        if is_repeated is not None:
+            filter_dict['is_repeated'] = is_repeated
+
+        filter_obj = TransactionFilter(**filter_dict) if filter_dict else None
+    except ValueError as e:
+        return error_response(400, f"筛选条件无效: {str(e)}")
+
+    user_id = current_user.id
+
+    def iter_rows():
+        # 流式响应在请求依赖释放后仍会继续读取，因此使用独立会话
+        db = SessionLocal()
+        try:
+            yield from TransactionService(db).stream_transactions(
+                user_id=user_id,
+                filter=filter_obj,
+                batch_size=batch_size
+            )
+        finally:
+            db.close()
+
+    if format == "csv":
+        body = iter_csv(iter_rows(), TRANSACTION_STREAM_FIELDS)
+        media_type = "text/csv; charset=utf-8"
+    else:
+        body = iter_ndjson(iter_rows())
+        media_type = "application/x-ndjson"
+
+    headers = {"Content-Disposition": f"attachment; filename=transactions.{format}"}
+    if gzip:
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
 @router.get("/{transaction_id}", response_model=TransactionResponse)
 async def get_transaction(
     transaction_id: int,
@@ -244,6 +326,7 @@ async def get_transaction(
             "wechat_transaction_id": transaction.wechat_transaction_id,
             "original_category": transaction.original_category,
             "merchant_name": transaction.merchant_name,
+            "merchant_id": transaction.merchant_id,
             "pay_method": transaction.pay_method,
             "is_repeated": transaction.is_repeated,
             "created_at": transaction.created_at,
@@ -293,6 +376,7 @@ async def create_transaction(
             "wechat_transaction_id": transaction.wechat_transaction_id,
             "original_category": transaction.original_category,
             "merchant_name": transaction.merchant_name,
+            "merchant_id": transaction.merchant_id,
             "pay_method": transaction.pay_method,
             "is_repeated": transaction.is_repeated,
             "created_at": transaction.created_at,
@@ -342,6 +426,7 @@ async def update_transaction(
             "wechat_transaction_id": transaction.wechat_transaction_id,
             "original_category": transaction.original_category,
             "merchant_name": transaction.merchant_name,
+            "merchant_id": transaction.merchant_id,
             "pay_method": transaction.pay_method,
             "is_repeated": transaction.is_repeated,
             "created_at": transaction.created_at,
@@ -15,8 +15,10 @@ from app.schemas.import_log import (
     ImportStatistics, WechatBillRecord, ImportPreview
 )
 from app.services.smart_categorization_service import SmartCategorizationService
+from app.services.merchant_classifier import MerchantClassifierService
 from app.services.import_error_analysis_service import ImportErrorAnalysisService
 from app.services.balance_verification_service import BalanceVerificationService
+from app.services.ledger_hooks import on_transactions_changed
 from app.core.dependencies import get_current_user
 from app.core.exceptions import NotFoundError, ValidationError
 from app.wechat_parser import parse_wechat_bill, get_file_summary
@@ -105,20 +107,10 @@ async def preview_wechat_bill(
         # 获取智能分类建议（可选，失败不影响预览）
         try:
             smart_service = SmartCategorizationService(db)
-            for transaction in preview_transactions:
+            suggestions = smart_service.suggest_categories(current_user.id, preview_transactions)
+            for transaction, suggestion in zip(preview_transactions, suggestions):
                 if transaction.get('merchant_name'):
-                    try:
-                        suggestion = smart_service.suggest_category(
-                            current_user.id,
-                            transaction['merchant_name'],
-                            transaction['amount'],
-                            transaction['transaction_type']
-                        )
-                        transaction['category_suggestion'] = suggestion
-                    except Exception as e:
-                        # 智能分类失败不影响预览
-                        print(f"智能分类失败: {str(e)}")
-                        transaction['category_suggestion'] = None
+                    transaction['category_suggestion'] = suggestion
         except Exception as e:
             # 智能分类服务失败不影响预览
             print(f"智能分类服务初始化失败: {str(e)}")
@@ -337,6 +329,26 @@ async def trigger_categorization_learning(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"学习失败: {str(e)}")
 
+@router.post("/smart-categorization/train", response_model=Dict)
+async def train_categorization_model(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    用已分类的交易重新训练商户分类器
+    """
+    try:
+        model = MerchantClassifierService(db).train(current_user.id)
+        return {
+            "message": f"已用 {model.sample_count} 条交易训练分类器",
+            "model_version": model.model_version,
+            "sample_count": model.sample_count,
+            "category_count": len(model.doc_counts),
+            "accuracy": model.accuracy
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"训练失败: {str(e)}")
+
 @router.get("/smart-categorization/suggestions", response_model=List[Dict])
 async def get_category_suggestions(
     merchant_name: str,
@@ -496,28 +508,30 @@ async def process_wechat_import(
         success_count = 0
         failed_count = 0
         error_records = []
+        imported = []
+
+        # 智能分类建议（整批一次计算，失败不影响导入）
+        try:
+            suggestions = smart_service.suggest_categories(user_id, transactions)
+        except Exception as e:
+            print(f"智能分类失败: {str(e)}")
+            suggestions = [None] * len(transactions)
 
         for index, transaction_data in enumerate(transactions):
             try:
-                # 智能分类建议
-                if transaction_data.get('merchant_name'):
-                    suggestion = smart_service.suggest_category(
-                        user_id,
-                        transaction_data['merchant_name'],
-                        transaction_data['amount'],
-                        transaction_data['transaction_type']
-                    )
-
-                    if suggestion and suggestion.confidence >= 0.7:
-                        transaction_data['category_id'] = suggestion.category_id
+                suggestion = suggestions[index]
+                if suggestion and suggestion.confidence >= 0.7:
+                    transaction_data['category_id'] = suggestion.category_id
 
                 # 创建交易记录
                 transaction = Transaction(
                     user_id=user_id,
+                    import_log_id=import_log_id,
                     **transaction_data
                 )
 
                 db.add(transaction)
+                imported.append(transaction)
                 success_count += 1
 
             except Exception as e:
@@ -546,6 +560,7 @@ async def process_wechat_import(
         import_log.completed_at = datetime.now()
         import_log.import_summary = f"导入完成：成功 {success_count} 条，失败 {failed_count} 条"
 
+        on_transactions_changed(db, added=imported, reference_id=f"import-{import_log_id}")
         db.commit()
 
         # 触发余额验证（如果启用）
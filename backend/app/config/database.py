@@ -150,6 +150,11 @@ def insert_default_data():
 
             db.commit()
 
+        # 生成分类闭包表
+        from app.services.category_closure_service import CategoryClosureService
+        CategoryClosureService(db).rebuild()
+        db.commit()
+
     except Exception as e:
         db.rollback()
         raise e
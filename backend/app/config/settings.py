@@ -23,6 +23,28 @@ class Settings(BaseSettings):
     # 文件导出配置
     export_path: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "exports")
     
+    # 余额检查点配置（day: 日末检查点, month: 月末检查点）
+    balance_checkpoint_period: str = "month"
+
+    # 余额历史压缩配置：早于保留天数的记录按日/月汇总，原始记录归档为 gzip JSONL
+    balance_history_retention_days: int = 180
+    balance_history_summary_period: str = "day"
+    balance_history_archive_path: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "archives", "balance_history")
+
+    # 后台定时任务（随应用启动；多个 worker 通过数据库租约保证每个任务同一时刻只有一个执行）
+    scheduler_enabled: bool = True
+    reminder_tick_seconds: int = 60
+
+    # 通知投递：发件箱按批发送，失败按指数退避重试（sink: broker 推送到在线客户端 / file 写入本地文件 / memory 仅内存）
+    notification_sink: str = "broker"
+    notification_delivery_seconds: int = 10
+    notification_batch_size: int = 500
+    notification_max_attempts: int = 5
+    notification_file_path: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "archives", "notifications.jsonl")
+
+    # 商户分类器模型（按用户保存的朴素贝叶斯计数）
+    classifier_model_path: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "archives", "classifier_models")
+
     @property
     def cors_origins(self) -> list[str]:
         """将逗号分隔的字符串转换为列表"""
@@ -0,0 +1,102 @@
+"""
+进程内事件推送
+
+预算预警在交易写入时产生，随数据库事务提交后才推送给已连接的客户端（SSE）。
+订阅者按用户分组，每个连接持有自己的 asyncio 队列；写入可能发生在事件循环线程
+或后台线程（导入任务），统一通过 call_soon_threadsafe 投递。
+仅推送给连接到当前进程的客户端，多进程部署时客户端仍可回退到轮询预警接口。
+"""
+
+import asyncio
+import threading
+from typing import Any, Dict, List, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+PENDING_EVENTS_KEY = "pending_events"
+
+
+class EventBroker:
+    """按用户分发事件的进程内发布/订阅"""
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        """
+        订阅用户事件（需在事件循环中调用）
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            接收事件的队列
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        """取消订阅"""
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            for item in [item for item in subscribers if item[1] is queue]:
+                subscribers.discard(item)
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+
+    def publish(self, user_id: int, payload: Dict[str, Any]) -> int:
+        """
+        向用户的全部连接发布事件（线程安全）
+
+        Args:
+            user_id: 用户ID
+            payload: 事件内容
+
+        Returns:
+            投递的连接数
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_offer, queue, payload)
+        return len(subscribers)
+
+
+def _offer(queue: asyncio.Queue, payload: Dict[str, Any]) -> None:
+    """放入队列，客户端消费过慢时丢弃新事件"""
+    try:
+        queue.put_nowait(payload)
+    except asyncio.QueueFull:
+        pass
+
+
+broker = EventBroker()
+
+
+def queue_event(db: Session, user_id: int, payload: Dict[str, Any]) -> None:
+    """
+    登记待推送事件，会话提交后发布，回滚则丢弃
+
+    Args:
+        db: 数据库会话
+        user_id: 接收事件的用户ID
+        payload: 事件内容
+    """
+    db.info.setdefault(PENDING_EVENTS_KEY, []).append((user_id, payload))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    pending: List[Tuple[int, Dict[str, Any]]] = session.info.pop(PENDING_EVENTS_KEY, [])
+    for user_id, payload in pending:
+        broker.publish(user_id, payload)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(PENDING_EVENTS_KEY, None)
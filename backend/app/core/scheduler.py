@@ -0,0 +1,210 @@
+"""
+应用内后台定时任务
+
+调度器随 FastAPI 生命周期启动，每个任务一个 asyncio 循环，按固定间隔（相对当天零点对齐，
+各 worker 在同一时刻醒来）触发；数据库操作在线程池中执行，不阻塞事件循环。
+多个 uvicorn/gunicorn worker 同时运行时，通过 scheduler_leases 表的租约决定由哪一个执行：
+持有者每次运行时续约，其他 worker 只有在租约过期后才能接管。
+"""
+
+import asyncio
+import os
+import socket
+import time as time_module
+import uuid
+from datetime import datetime, time, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config.database import SessionLocal
+from app.models.scheduler_lease import SchedulerLease
+
+
+def acquire_lease(db: Session, name: str, owner: str, ttl: timedelta, now: Optional[datetime] = None) -> bool:
+    """
+    获取或续约任务租约
+
+    Args:
+        db: 数据库会话
+        name: 任务名称
+        owner: 持有者标识
+        ttl: 租约时长
+        now: 当前时间
+
+    Returns:
+        是否持有租约
+    """
+    now = now or datetime.now()
+    renewed = db.query(SchedulerLease).filter(
+        SchedulerLease.name == name,
+        or_(SchedulerLease.owner == owner, SchedulerLease.expires_at < now)
+    ).update({
+        SchedulerLease.owner: owner,
+        SchedulerLease.expires_at: now + ttl,
+        SchedulerLease.acquired_at: now
+    }, synchronize_session=False)
+    if renewed:
+        db.commit()
+        return True
+
+    # 租约不存在时创建；已被其他 worker 持有则主键冲突
+    try:
+        db.add(SchedulerLease(name=name, owner=owner, expires_at=now + ttl, acquired_at=now))
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False
+
+
+class ScheduledJob:
+    """定时任务及其运行指标"""
+
+    def __init__(self, name: str, func: Callable[[Session], Any], interval_seconds: int, offset_seconds: int = 0):
+        self.name = name
+        self.func = func
+        self.interval = timedelta(seconds=interval_seconds)
+        self.offset = timedelta(seconds=offset_seconds)
+        # 租约覆盖到下一次运行之后半个周期，持有者宕机后其他 worker 最多错过一次运行
+        self.lease_ttl = self.interval * 1.5
+        self.next_run_at: Optional[datetime] = None
+        self.stats: Dict[str, Any] = {
+            "runs": 0,
+            "failures": 0,
+            "skipped": 0,
+            "is_leader": False,
+            "last_run_at": None,
+            "last_duration_seconds": None,
+            "max_duration_seconds": 0.0,
+            "total_duration_seconds": 0.0,
+            "last_lag_seconds": None,
+            "max_lag_seconds": 0.0,
+            "last_result": None,
+            "last_error": None
+        }
+
+    def compute_next_run(self, now: datetime) -> datetime:
+        """返回 now 之后下一个对齐的运行时间"""
+        base = datetime.combine(now.date(), time.min) + self.offset
+        if now < base:
+            base -= timedelta(days=1)
+        periods = int((now - base) / self.interval) + 1
+        return base + self.interval * periods
+
+    def metrics(self) -> Dict[str, Any]:
+        """任务指标"""
+        runs = self.stats["runs"]
+        return {
+            "name": self.name,
+            "interval_seconds": self.interval.total_seconds(),
+            "next_run_at": self.next_run_at.isoformat() if self.next_run_at else None,
+            "avg_duration_seconds": round(self.stats["total_duration_seconds"] / runs, 4) if runs else None,
+            **self.stats
+        }
+
+
+class Scheduler:
+    """进程内定时任务调度器"""
+
+    def __init__(self, session_factory: sessionmaker = SessionLocal):
+        self.session_factory = session_factory
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.started_at: Optional[datetime] = None
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[Session], Any],
+        interval_seconds: int,
+        offset_seconds: int = 0
+    ) -> ScheduledJob:
+        """
+        注册定时任务
+
+        Args:
+            name: 任务名称（同时作为租约名）
+            func: 任务函数，接收独立的数据库会话，返回值记入指标
+            interval_seconds: 运行间隔（秒）
+            offset_seconds: 相对零点的偏移（秒），如每天 9 点运行为 interval=86400, offset=32400
+
+        Returns:
+            任务对象
+        """
+        job = ScheduledJob(name, func, interval_seconds, offset_seconds)
+        self.jobs[name] = job
+        return job
+
+    def start(self) -> None:
+        """启动全部任务循环（需在事件循环中调用）"""
+        if self._tasks:
+            return
+        self.started_at = datetime.now()
+        self._tasks = [asyncio.create_task(self._run_loop(job)) for job in self.jobs.values()]
+
+    async def stop(self) -> None:
+        """停止全部任务循环"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def metrics(self) -> Dict[str, Any]:
+        """调度器及各任务的运行指标"""
+        return {
+            "owner": self.owner,
+            "running": bool(self._tasks),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "jobs": [job.metrics() for job in self.jobs.values()]
+        }
+
+    async def _run_loop(self, job: ScheduledJob) -> None:
+        while True:
+            job.next_run_at = job.compute_next_run(datetime.now())
+            delay = (job.next_run_at - datetime.now()).total_seconds()
+            await asyncio.sleep(max(delay, 0))
+            await asyncio.to_thread(self._run_job, job, job.next_run_at)
+
+    def _run_job(self, job: ScheduledJob, scheduled_at: datetime) -> None:
+        """在线程中执行一次任务：先取租约，持有者才运行"""
+        started_at = datetime.now()
+        db = self.session_factory()
+        try:
+            try:
+                job.stats["is_leader"] = acquire_lease(db, job.name, self.owner, job.lease_ttl, started_at)
+            except Exception as e:
+                job.stats["is_leader"] = False
+                job.stats["last_error"] = f"获取租约失败: {e}"
+                return
+            if not job.stats["is_leader"]:
+                job.stats["skipped"] += 1
+                return
+
+            lag = (started_at - scheduled_at).total_seconds()
+            job.stats["last_lag_seconds"] = round(lag, 4)
+            job.stats["max_lag_seconds"] = max(job.stats["max_lag_seconds"], round(lag, 4))
+            job.stats["last_run_at"] = started_at.isoformat()
+
+            clock = time_module.perf_counter()
+            try:
+                job.stats["last_result"] = job.func(db)
+                job.stats["last_error"] = None
+            except Exception as e:
+                db.rollback()
+                job.stats["failures"] += 1
+                job.stats["last_error"] = str(e)
+            finally:
+                duration = round(time_module.perf_counter() - clock, 4)
+                job.stats["runs"] += 1
+                job.stats["last_duration_seconds"] = duration
+                job.stats["max_duration_seconds"] = max(job.stats["max_duration_seconds"], duration)
+                job.stats["total_duration_seconds"] += duration
+        finally:
+            db.close()
+
+
+scheduler = Scheduler()
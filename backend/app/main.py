@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import HTTPException, RequestValidationError
@@ -11,12 +12,27 @@ from app.core.exceptions import (
     validation_exception_handler, database_exception_handler,
     general_exception_handler, CustomException
 )
+from app.core.responses import success_response
+from app.core.scheduler import scheduler
+from app.services.scheduled_jobs import register_jobs
+# 注册 flush 前写入交易和分类建议 merchant_id 的会话钩子
+from app.services import merchant_canonicalizer  # noqa: F401
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动和停止后台定时任务"""
+    if settings.scheduler_enabled:
+        register_jobs(scheduler)
+        scheduler.start()
+    yield
+    await scheduler.stop()
 
 app = FastAPI(
     title="个人财务记账系统 API",
     description="一个面向大学生和年轻群体的轻量级个人财务管理系统",
     version="1.0.0",
-    redirect_slashes=False  # 禁用自动斜杠重定向,避免CORS问题
+    redirect_slashes=False,  # 禁用自动斜杠重定向,避免CORS问题
+    lifespan=lifespan
 )
 
 # CORS中间件配置
@@ -56,6 +72,11 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics/scheduler")
+async def scheduler_metrics():
+    """后台定时任务运行指标（运行次数、耗时、调度延迟、是否持有租约）"""
+    return success_response(data=scheduler.metrics())
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -1,27 +1,39 @@
 from .user import User
-from .category import Category, CategoryType
+from .category import Category, CategoryType, CategoryClosure
 from .account import Account, AccountType
 from .transaction import Transaction, TransactionType, TransactionSource
+from .merchant import Merchant
 from .budget import Budget, PeriodType
 from .reminder import Reminder, ReminderType
 from .statistics_cache import StatisticsCache
 from .import_log import ImportLog, ImportStatus
-from .account_balance_history import AccountBalanceHistory, BalanceChangeType
+from .account_balance_history import (
+    AccountBalanceHistory, BalanceChangeType,
+    AccountBalanceHistorySummary, HistorySummaryPeriod
+)
+from .account_balance_checkpoint import AccountBalanceCheckpoint, CheckpointPeriod
 from .import_error_record import ImportErrorRecord
-from .category_suggestion import CategorySuggestion, LearningRecord
-from .balance_verification import BalanceVerification, UserPreference
+from .category_suggestion import CategorySuggestion, LearningRecord, CategoryRule, LearningWatermark
+from .balance_verification import BalanceVerification, AccountBalanceChecksum, UserPreference
+from .scheduler_lease import SchedulerLease
+from .notification_outbox import NotificationOutbox, OutboxStatus
 
 __all__ = [
     "User",
-    "Category", "CategoryType",
+    "Category", "CategoryType", "CategoryClosure",
     "Account", "AccountType",
     "Transaction", "TransactionType", "TransactionSource",
+    "Merchant",
     "Budget", "PeriodType",
     "Reminder", "ReminderType",
     "StatisticsCache",
     "ImportLog", "ImportStatus",
     "AccountBalanceHistory", "BalanceChangeType",
+    "AccountBalanceHistorySummary", "HistorySummaryPeriod",
+    "AccountBalanceCheckpoint", "CheckpointPeriod",
     "ImportErrorRecord",
-    "CategorySuggestion", "LearningRecord",
-    "BalanceVerification", "UserPreference"
+    "CategorySuggestion", "LearningRecord", "CategoryRule", "LearningWatermark",
+    "BalanceVerification", "AccountBalanceChecksum", "UserPreference",
+    "SchedulerLease",
+    "NotificationOutbox", "OutboxStatus"
 ]
\ No newline at end of file
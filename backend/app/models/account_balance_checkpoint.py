@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, Date, DateTime, Enum, Numeric, ForeignKey, UniqueConstraint, Index
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+from app.config.database import Base
+import enum
+
+class CheckpointPeriod(str, enum.Enum):
+    DAY = "day"      # 日末余额
+    MONTH = "month"  # 月末余额
+
+class AccountBalanceCheckpoint(Base):
+    __tablename__ = "account_balance_checkpoints"
+
+    id = Column(Integer, primary_key=True, autoincrement=True, comment="检查点ID")
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, comment="用户ID")
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), nullable=False, comment="账户ID")
+    period_type = Column(Enum(CheckpointPeriod, native_enum=False, values_callable=lambda x: [e.value for e in x]), nullable=False, comment="检查点周期")
+    checkpoint_date = Column(Date, nullable=False, comment="检查点日期（该日结束时的余额）")
+    balance = Column(Numeric(12, 2), nullable=False, comment="检查点余额")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+    # 关系
+    account = relationship("Account")
+
+    __table_args__ = (
+        UniqueConstraint('account_id', 'period_type', 'checkpoint_date', name='uk_balance_checkpoint'),
+        Index('idx_checkpoint_account_date', 'account_id', 'checkpoint_date'),
+    )
+
+    def __repr__(self):
+        return f"<AccountBalanceCheckpoint(account_id={self.account_id}, date={self.checkpoint_date}, balance={self.balance})>"
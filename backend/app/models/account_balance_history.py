@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum, Numeric, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, DateTime, Enum, Numeric, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.config.database import Base
@@ -12,6 +12,10 @@ class BalanceChangeType(str, enum.Enum):
     ADJUSTMENT = "adjustment"     # 手动调整
     CORRECTION = "correction"     # 错误修正
 
+class HistorySummaryPeriod(str, enum.Enum):
+    DAY = "day"      # 按日汇总
+    MONTH = "month"  # 按月汇总
+
 class AccountBalanceHistory(Base):
     __tablename__ = "account_balance_history"
 
@@ -37,5 +41,49 @@ class AccountBalanceHistory(Base):
     account = relationship("Account", back_populates="balance_history")
     transaction = relationship("Transaction", back_populates="balance_history")
 
+    __table_args__ = (
+        Index('idx_balance_history_account_created', 'account_id', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f"<AccountBalanceHistory(id={self.id}, account_id={self.account_id}, change_type='{self.change_type}', change_amount={self.change_amount})>"
+
+class AccountBalanceHistorySummary(Base):
+    """余额历史汇总表：压缩后的历史按日/月汇总，原始记录归档到本地压缩文件"""
+    __tablename__ = "account_balance_history_summaries"
+
+    id = Column(Integer, primary_key=True, autoincrement=True, comment="汇总ID")
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, comment="用户ID")
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), nullable=False, comment="账户ID")
+    period_type = Column(Enum(HistorySummaryPeriod, native_enum=False, values_callable=lambda x: [e.value for e in x]), nullable=False, comment="汇总周期")
+    period_start = Column(Date, nullable=False, comment="周期开始日期")
+    period_end = Column(Date, nullable=False, comment="周期结束日期")
+
+    # 周期边界余额
+    amount_before = Column(Numeric(12, 2), nullable=False, comment="周期内首条变化前余额")
+    amount_after = Column(Numeric(12, 2), nullable=False, comment="周期内末条变化后余额")
+
+    # 按变化类型汇总的金额
+    transaction_income = Column(Numeric(12, 2), nullable=False, default=0, comment="交易收入合计")
+    transaction_expense = Column(Numeric(12, 2), nullable=False, default=0, comment="交易支出合计（正数）")
+    transfer_in = Column(Numeric(12, 2), nullable=False, default=0, comment="转入合计")
+    transfer_out = Column(Numeric(12, 2), nullable=False, default=0, comment="转出合计（正数）")
+    other_change = Column(Numeric(12, 2), nullable=False, default=0, comment="初始/调整/修正净额")
+    change_count = Column(Integer, nullable=False, default=0, comment="汇总的原始记录数")
+
+    first_change_at = Column(DateTime(timezone=True), comment="周期内首条记录时间")
+    last_change_at = Column(DateTime(timezone=True), comment="周期内末条记录时间")
+    archive_file = Column(String(255), comment="原始记录归档文件（相对归档目录）")
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+    # 关系
+    account = relationship("Account")
+
+    __table_args__ = (
+        UniqueConstraint('account_id', 'period_type', 'period_start', name='uk_balance_history_summary'),
+    )
+
     def __repr__(self):
-        return f"<AccountBalanceHistory(id={self.id}, account_id={self.account_id}, change_type='{self.change_type}', change_amount={self.change_amount})>"
\ No newline at end of file
+        return f"<AccountBalanceHistorySummary(account_id={self.account_id}, period_start={self.period_start}, change_count={self.change_count})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float, JSON, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float, JSON, Text, Numeric
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.config.database import Base
@@ -41,6 +41,25 @@ class BalanceVerification(Base):
     def __repr__(self):
         return f"<BalanceVerification(id={self.id}, account_id={self.account_id}, valid={self.is_valid})>"
 
+class AccountBalanceChecksum(Base):
+    """账户余额校验和表：按交易增量维护的预期余额，用于常量时间的余额漂移检查"""
+    __tablename__ = "account_balance_checksums"
+
+    id = Column(Integer, primary_key=True, autoincrement=True, comment="校验和ID")
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, comment="用户ID")
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), nullable=False, unique=True, comment="账户ID")
+    expected_balance = Column(Numeric(12, 2), nullable=False, comment="预期余额（初始余额 + 交易增量）")
+    last_drift = Column(Numeric(12, 2), nullable=False, default=0, comment="最近一次检查的漂移金额")
+    last_checked_at = Column(DateTime(timezone=True), comment="最近检查时间")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+    # 关系
+    account = relationship("Account")
+
+    def __repr__(self):
+        return f"<AccountBalanceChecksum(account_id={self.account_id}, expected_balance={self.expected_balance})>"
+
 class UserPreference(Base):
     """用户偏好表"""
     __tablename__ = "user_preferences"
@@ -51,6 +70,7 @@ class UserPreference(Base):
     # 导入设置
     auto_categorize_enabled = Column(Boolean, default=True, comment="是否启用自动分类")
     balance_verification_enabled = Column(Boolean, default=True, comment="是否启用余额校验")
+    tolerance = Column(Float, default=0.01, comment="余额校验容差")
     duplicate_threshold_days = Column(Integer, default=7, comment="重复记录阈值天数")
     learning_enabled = Column(Boolean, default=True, comment="是否启用学习")
 
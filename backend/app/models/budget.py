@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Boolean, DateTime, Enum, Numeric, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, Numeric, ForeignKey, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.config.database import Base
@@ -20,6 +20,8 @@ class Budget(Base):
     month = Column(Integer, comment="月份(月度预算时使用)")
     alert_threshold = Column(Integer, default=80, comment="预警阈值(百分比)")
     is_enabled = Column(Boolean, default=True, comment="是否启用")
+    spent_amount = Column(Numeric(12, 2), nullable=False, default=0, server_default="0", comment="已消费金额(随交易写入累加)")
+    alert_status = Column(String(20), nullable=False, default="normal", server_default="normal", comment="当前预警状态: normal/warning/exceeded")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
 
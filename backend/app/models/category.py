@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, ForeignKey, PrimaryKeyConstraint, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.config.database import Base
@@ -28,4 +28,20 @@ class Category(Base):
     children = relationship("Category", backref="parent", remote_side=[id])
 
     def __repr__(self):
-        return f"<Category(id={self.id}, name='{self.name}', type='{self.type}')>"
\ No newline at end of file
+        return f"<Category(id={self.id}, name='{self.name}', type='{self.type}')>"
+
+class CategoryClosure(Base):
+    """分类闭包表：每个分类与其自身及全部祖先各一行，用于子树汇总"""
+    __tablename__ = "category_closure"
+
+    ancestor_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), nullable=False, comment="祖先分类ID")
+    descendant_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), nullable=False, comment="后代分类ID")
+    depth = Column(Integer, nullable=False, default=0, comment="层级距离(0表示自身)")
+
+    __table_args__ = (
+        PrimaryKeyConstraint('ancestor_id', 'descendant_id', name='pk_category_closure'),
+        Index('idx_category_closure_descendant', 'descendant_id', 'ancestor_id'),
+    )
+
+    def __repr__(self):
+        return f"<CategoryClosure(ancestor_id={self.ancestor_id}, descendant_id={self.descendant_id}, depth={self.depth})>"
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float, Text, Enum, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.config.database import Base
+from app.models.category import CategoryType
 
 class CategorySuggestion(Base):
     """分类建议表"""
@@ -10,6 +11,7 @@ class CategorySuggestion(Base):
     id = Column(Integer, primary_key=True, autoincrement=True, comment="建议ID")
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, comment="用户ID")
     merchant_name = Column(String(200), nullable=False, comment="商户名称")
+    merchant_id = Column(Integer, ForeignKey("merchants.id", ondelete="SET NULL"), index=True, comment="规范商户ID")
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=False, comment="建议分类ID")
 
     # 置信度和统计
@@ -30,6 +32,7 @@ class CategorySuggestion(Base):
     # 关系
     user = relationship("User")
     category = relationship("Category")
+    merchant = relationship("Merchant")
 
     def __repr__(self):
         return f"<CategorySuggestion(id={self.id}, merchant='{self.merchant_name}', confidence={self.confidence})>"
@@ -64,4 +67,41 @@ class LearningRecord(Base):
     suggestion = relationship("CategorySuggestion")
 
     def __repr__(self):
-        return f"<LearningRecord(id={self.id}, type='{self.feedback_type}', accuracy={self.learning_accuracy})>"
\ No newline at end of file
+        return f"<LearningRecord(id={self.id}, type='{self.feedback_type}', accuracy={self.learning_accuracy})>"
+
+class CategoryRule(Base):
+    """用户自定义分类关键词规则表"""
+    __tablename__ = "category_rules"
+
+    id = Column(Integer, primary_key=True, autoincrement=True, comment="规则ID")
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, comment="用户ID")
+    keyword = Column(String(100), nullable=False, comment="关键词(小写)")
+    category_type = Column(Enum(CategoryType, native_enum=False, values_callable=lambda x: [e.value for e in x]), nullable=False, comment="分类类型: 收入/支出")
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), nullable=False, comment="分类ID")
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'category_type', 'keyword', name='uq_category_rule_keyword'),
+    )
+
+    # 关系
+    category = relationship("Category")
+
+    def __repr__(self):
+        return f"<CategoryRule(id={self.id}, keyword='{self.keyword}', category_id={self.category_id})>"
+
+class LearningWatermark(Base):
+    """用户交易学习进度表（增量学习的水位线）"""
+    __tablename__ = "learning_watermarks"
+
+    id = Column(Integer, primary_key=True, autoincrement=True, comment="水位线ID")
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, unique=True, comment="用户ID")
+    last_updated_at = Column(DateTime(timezone=True), comment="已处理交易的最大更新时间")
+    last_transaction_id = Column(Integer, default=0, comment="同一更新时间下已处理的最大交易ID")
+    processed_count = Column(Integer, default=0, comment="累计处理交易数")
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+    def __repr__(self):
+        return f"<LearningWatermark(user_id={self.user_id}, last_updated_at={self.last_updated_at}, last_transaction_id={self.last_transaction_id})>"
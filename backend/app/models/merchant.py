@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.config.database import Base
+
+class Merchant(Base):
+    """规范商户表（系统级，账单中同一商户的不同写法归并到同一条记录）"""
+    __tablename__ = "merchants"
+
+    id = Column(Integer, primary_key=True, autoincrement=True, comment="商户ID")
+    name_key = Column(String(200), nullable=False, unique=True, comment="规范化名称键")
+    display_name = Column(String(200), nullable=False, comment="展示名称")
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+
+    def __repr__(self):
+        return f"<Merchant(id={self.id}, name='{self.display_name}')>"
@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, String, DateTime, Enum, JSON, Text, ForeignKey, Index
+from app.config.database import Base
+import enum
+
+class OutboxStatus(str, enum.Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+class NotificationOutbox(Base):
+    """通知发件箱：提醒触发时批量写入，由投递任务分批发送"""
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True, comment="通知ID")
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, comment="用户ID")
+    reminder_id = Column(Integer, ForeignKey("reminders.id", ondelete="SET NULL"), comment="来源提醒ID")
+    channel = Column(String(20), nullable=False, default="in_app", comment="投递渠道")
+    payload = Column(JSON, nullable=False, comment="通知内容")
+    status = Column(Enum(OutboxStatus, native_enum=False, values_callable=lambda x: [e.value for e in x]), nullable=False, default=OutboxStatus.PENDING, comment="状态: 待发送/已发送/失败")
+    attempts = Column(Integer, nullable=False, default=0, comment="已尝试次数")
+    next_attempt_at = Column(DateTime, nullable=False, comment="下次尝试时间")
+    last_error = Column(Text, comment="最近一次失败原因")
+    created_at = Column(DateTime, nullable=False, comment="创建时间")
+    sent_at = Column(DateTime, comment="发送时间")
+
+    __table_args__ = (
+        Index('idx_outbox_pending', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f"<NotificationOutbox(id={self.id}, user_id={self.user_id}, status='{self.status}')>"
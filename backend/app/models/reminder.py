@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, ForeignKey, Numeric, Text, Time
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, ForeignKey, Numeric, Text, Time, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.config.database import Base
@@ -24,6 +24,7 @@ class Reminder(Base):
     amount = Column(Numeric(10, 2), comment="固定金额提醒")
     is_enabled = Column(Boolean, default=True, comment="是否启用")
     last_reminded_at = Column(DateTime(timezone=True), comment="最后提醒时间")
+    next_fire_at = Column(DateTime, comment="下次触发时间(调度索引)")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
 
@@ -31,5 +32,9 @@ class Reminder(Base):
     user = relationship("User", back_populates="reminders")
     category = relationship("Category")
 
+    __table_args__ = (
+        Index('idx_reminder_due', 'is_enabled', 'next_fire_at'),
+    )
+
     def __repr__(self):
         return f"<Reminder(id={self.id}, type='{self.type}', title='{self.title}', is_enabled={self.is_enabled})>"
\ No newline at end of file
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.sql import func
+from app.config.database import Base
+
+class SchedulerLease(Base):
+    """后台任务租约：多个 worker 中只有持有未过期租约的一个执行该任务"""
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String(100), primary_key=True, comment="任务名称")
+    owner = Column(String(100), nullable=False, comment="持有者(主机:进程:随机串)")
+    expires_at = Column(DateTime, nullable=False, comment="租约过期时间")
+    acquired_at = Column(DateTime, comment="本次持有开始时间")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+    def __repr__(self):
+        return f"<SchedulerLease(name='{self.name}', owner='{self.owner}', expires_at={self.expires_at})>"
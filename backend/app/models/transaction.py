@@ -35,8 +35,10 @@ class Transaction(Base):
     wechat_transaction_id = Column(String(100), unique=True, comment="微信交易ID(防止重复导入)")
     original_category = Column(String(100), comment="原始分类(如微信分类)")
     merchant_name = Column(String(200), comment="商户名称")
+    merchant_id = Column(Integer, ForeignKey("merchants.id", ondelete="SET NULL"), index=True, comment="规范商户ID")
     pay_method = Column(String(50), comment="支付方式")
     is_repeated = Column(Boolean, default=False, comment="是否重复交易")
+    import_log_id = Column(Integer, ForeignKey("import_logs.id", ondelete="SET NULL"), index=True, comment="导入批次ID")
 
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
@@ -44,6 +46,7 @@ class Transaction(Base):
     # 关系
     user = relationship("User", back_populates="transactions")
     category = relationship("Category", back_populates="transactions")
+    merchant = relationship("Merchant")
     account = relationship("Account", foreign_keys=[account_id], back_populates="transactions_from")
     to_account = relationship("Account", foreign_keys=[to_account_id], back_populates="transactions_to")
     balance_history = relationship("AccountBalanceHistory", back_populates="transaction")
@@ -64,4 +64,11 @@ class AccountTransfer(BaseModel):
 class AccountWithStats(AccountResponse):
     """带统计信息的账户"""
     recent_transactions: Optional[int] = Field(None, description="最近交易次数")
-    avg_transaction: Optional[Decimal] = Field(None, description="平均交易金额")
\ No newline at end of file
+    avg_transaction: Optional[Decimal] = Field(None, description="平均交易金额")
+    transfer_in: Optional[Decimal] = Field(None, description="转入总额")
+    transfer_out: Optional[Decimal] = Field(None, description="转出总额")
+
+class AccountWithStatsListResponse(BaseModel):
+    """带统计信息的账户列表"""
+    accounts: List[AccountWithStats] = Field(..., description="账户列表")
+    total: int = Field(..., description="总数量")
\ No newline at end of file
@@ -34,6 +34,7 @@ class ReminderResponse(ReminderBase):
     id: int
     user_id: int
     last_reminded_at: Optional[datetime] = None
+    next_fire_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
 
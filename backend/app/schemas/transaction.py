@@ -43,6 +43,7 @@ class TransactionResponse(TransactionBase):
     wechat_transaction_id: Optional[str] = Field(None, description="微信交易ID")
     original_category: Optional[str] = Field(None, description="原始分类")
     merchant_name: Optional[str] = Field(None, description="商户名称")
+    merchant_id: Optional[int] = Field(None, description="规范商户ID")
     pay_method: Optional[str] = Field(None, description="支付方式")
     is_repeated: bool = Field(..., description="是否重复交易")
     created_at: datetime = Field(..., description="创建时间")
@@ -1,14 +1,83 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_
-from typing import Optional, List
+from sqlalchemy import desc, func, case, insert
+from typing import Optional, List, Dict, Any
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from app.models.account import Account
-from app.models.transaction import Transaction, TransactionType
-from app.models.account_balance_history import AccountBalanceHistory, BalanceChangeType
+from app.models.account_balance_history import (
+    AccountBalanceHistory, BalanceChangeType, AccountBalanceHistorySummary
+)
 from app.core.exceptions import NotFoundError, ValidationError
 
+class BalanceHistoryRecorder:
+    """
+    余额历史工作单元
+
+    在一次请求或一批导入中收集余额历史，flush 时一次批量插入，
+    不单独提交，随调用方事务一起提交或回滚。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.entries: List[Dict[str, Any]] = []
+
+    def add(
+        self,
+        account: Account,
+        change_type: BalanceChangeType,
+        amount_before: Decimal,
+        amount_after: Decimal,
+        change_amount: Decimal,
+        description: Optional[str] = None,
+        transaction_id: Optional[int] = None,
+        reference_id: Optional[str] = None
+    ) -> None:
+        """
+        记录一条余额变化（暂存，flush 时写入）
+
+        Args:
+            account: 账户（调用方已加载，不再重复查询）
+            change_type: 变化类型
+            amount_before: 变化前余额
+            amount_after: 变化后余额
+            change_amount: 变化金额
+            description: 描述
+            transaction_id: 关联交易ID
+            reference_id: 参考ID
+        """
+        if amount_after != amount_before + change_amount:
+            raise ValidationError("余额变化不一致")
+
+        self.entries.append({
+            "user_id": account.user_id,
+            "account_id": account.id,
+            "transaction_id": transaction_id,
+            "change_type": change_type,
+            "amount_before": amount_before,
+            "amount_after": amount_after,
+            "change_amount": change_amount,
+            "description": description,
+            "reference_id": reference_id,
+            "created_at": datetime.now()
+        })
+
+    def flush(self) -> int:
+        """
+        批量写入暂存的余额历史（不提交）
+
+        Returns:
+            写入条数
+        """
+        if not self.entries:
+            return 0
+
+        count = len(self.entries)
+        self.db.execute(insert(AccountBalanceHistory), self.entries)
+        self.entries = []
+        return count
+
+
 class AccountBalanceHistoryService:
     def __init__(self, db: Session):
         self.db = db
@@ -136,121 +205,188 @@ class AccountBalanceHistoryService:
 
         return query.order_by(desc(AccountBalanceHistory.created_at)).offset(offset).limit(limit).all()
 
-    def record_initial_balance(self, account_id: int) -> AccountBalanceHistory:
+    def get_account_history_entries(
+        self,
+        user_id: int,
+        account_id: int,
+        limit: int = 50,
+        offset: int = 0,
+        change_type: Optional[BalanceChangeType] = None
+    ) -> List[Dict[str, Any]]:
         """
-        记录账户初始余额
+        获取账户余额历史（明细 + 已压缩的汇总行）
+
+        按时间倒序先返回明细记录，翻到明细末尾后接着返回汇总行；
+        按变化类型过滤时只返回明细。
 
         Args:
+            user_id: 用户ID
             account_id: 账户ID
+            limit: 限制数量
+            offset: 偏移量
+            change_type: 变化类型过滤
 
         Returns:
-            余额历史记录
+            历史记录字典列表
         """
-        account = self.db.query(Account).filter(Account.id == account_id).first()
-        if not account:
-            raise NotFoundError("账户不存在")
+        histories = self.get_account_balance_history(user_id, account_id, limit, offset, change_type)
+        entries = [self._history_entry(history) for history in histories]
+        if change_type or len(entries) >= limit:
+            return entries
 
-        return self.record_balance_change(
-            account_id=account_id,
-            change_type=BalanceChangeType.INITIAL,
-            amount_before=Decimal('0'),
-            amount_after=account.balance,
-            change_amount=account.balance,
-            description=f"账户 {account.name} 初始余额"
+        summary_query = self.db.query(AccountBalanceHistorySummary).filter(
+            AccountBalanceHistorySummary.account_id == account_id
+        )
+        return entries + self._summary_entries(
+            summary_query, account_id=account_id, limit=limit, offset=offset, fetched=len(entries)
         )
 
-    def record_transaction_change(self, transaction: Transaction) -> Optional[AccountBalanceHistory]:
+    def get_user_history_entries(
+        self,
+        user_id: int,
+        limit: int = 100,
+        offset: int = 0,
+        change_type: Optional[BalanceChangeType] = None
+    ) -> List[Dict[str, Any]]:
         """
-        记录交易引起的余额变化
+        获取用户所有账户的余额历史（明细 + 已压缩的汇总行）
 
         Args:
-            transaction: 交易记录
+            user_id: 用户ID
+            limit: 限制数量
+            offset: 偏移量
+            change_type: 变化类型过滤
 
         Returns:
-            余额历史记录
+            历史记录字典列表
         """
-        account = transaction.account
-
-        # 计算交易对账户余额的影响
-        if transaction.type == TransactionType.INCOME:
-            change_amount = transaction.amount
-            description = f"收入: {transaction.remark or transaction.category.name}"
-        elif transaction.type == TransactionType.EXPENSE:
-            change_amount = -transaction.amount
-            description = f"支出: {transaction.remark or transaction.category.name}"
-        elif transaction.type == TransactionType.TRANSFER:
-            # 转账会在transfer_between_accounts中特殊处理
-            if transaction.to_account_id:
-                change_amount = -transaction.amount  # 转出
-                description = f"转出至: {transaction.to_account.name if transaction.to_account else '未知账户'}"
-            else:
-                return None
-        else:
-            return None
+        histories = self.get_user_balance_history(user_id, limit, offset, change_type)
+        entries = [self._history_entry(history, with_account_name=True) for history in histories]
+        if change_type or len(entries) >= limit:
+            return entries
 
-        # 记录余额变化
-        return self.record_balance_change(
-            account_id=account.id,
-            change_type=BalanceChangeType.TRANSACTION,
-            amount_before=account.balance - change_amount,
-            amount_after=account.balance,
-            change_amount=change_amount,
-            description=description,
-            transaction_id=transaction.id
+        summary_query = self.db.query(AccountBalanceHistorySummary).filter(
+            AccountBalanceHistorySummary.user_id == user_id
+        )
+        return entries + self._summary_entries(
+            summary_query, user_id=user_id, limit=limit, offset=offset,
+            fetched=len(entries), with_account_name=True
         )
 
-    def record_transfer_changes(
+    def _summary_entries(
         self,
-        from_account_id: int,
-        to_account_id: int,
-        amount: Decimal,
-        transaction_id: Optional[int] = None,
-        reference_id: Optional[str] = None
-    ) -> tuple[AccountBalanceHistory, AccountBalanceHistory]:
+        summary_query,
+        limit: int,
+        offset: int,
+        fetched: int,
+        user_id: Optional[int] = None,
+        account_id: Optional[int] = None,
+        with_account_name: bool = False
+    ) -> List[Dict[str, Any]]:
+        """明细不足一页时，按剩余偏移量和数量取汇总行"""
+        if fetched > 0:
+            summary_offset = 0
+        else:
+            # 本页没有明细：偏移量需扣除明细总数
+            detail_query = self.db.query(func.count(AccountBalanceHistory.id))
+            if account_id:
+                detail_query = detail_query.filter(AccountBalanceHistory.account_id == account_id)
+            if user_id:
+                detail_query = detail_query.filter(AccountBalanceHistory.user_id == user_id)
+            summary_offset = max(offset - detail_query.scalar(), 0)
+
+        summaries = summary_query.order_by(
+            desc(AccountBalanceHistorySummary.period_start),
+            desc(AccountBalanceHistorySummary.id)
+        ).offset(summary_offset).limit(limit - fetched).all()
+
+        return [self._summary_entry(summary, with_account_name) for summary in summaries]
+
+    def _history_entry(self, history: AccountBalanceHistory, with_account_name: bool = False) -> Dict[str, Any]:
+        """明细记录转换为响应字典"""
+        entry = {
+            "id": history.id,
+            "account_id": history.account_id,
+            "transaction_id": history.transaction_id,
+            "change_type": history.change_type,
+            "amount_before": float(history.amount_before),
+            "amount_after": float(history.amount_after),
+            "change_amount": float(history.change_amount),
+            "description": history.description,
+            "reference_id": history.reference_id,
+            "created_at": history.created_at,
+            "is_summary": False
+        }
+        if with_account_name:
+            entry["account_name"] = history.account.name if history.account else None
+        return entry
+
+    def _summary_entry(self, summary: AccountBalanceHistorySummary, with_account_name: bool = False) -> Dict[str, Any]:
+        """汇总行转换为与明细一致的响应字典"""
+        entry = {
+            "id": None,
+            "summary_id": summary.id,
+            "account_id": summary.account_id,
+            "transaction_id": None,
+            "change_type": "summary",
+            "amount_before": float(summary.amount_before),
+            "amount_after": float(summary.amount_after),
+            "change_amount": float(summary.amount_after - summary.amount_before),
+            "description": f"{summary.period_start} 至 {summary.period_end} 余额变化汇总（{summary.change_count} 条）",
+            "reference_id": summary.archive_file,
+            "created_at": summary.last_change_at,
+            "is_summary": True,
+            "period_start": summary.period_start,
+            "period_end": summary.period_end,
+            "change_count": summary.change_count
+        }
+        if with_account_name:
+            entry["account_name"] = summary.account.name if summary.account else None
+        return entry
+
+    def get_history_summary(self, user_id: int, account_id: int, summary_id: int) -> AccountBalanceHistorySummary:
         """
-        记录转账的余额变化
+        获取单条余额历史汇总
 
         Args:
-            from_account_id: 转出账户ID
-            to_account_id: 转入账户ID
-            amount: 转账金额
-            transaction_id: 交易ID
-            reference_id: 参考ID
+            user_id: 用户ID
+            account_id: 账户ID
+            summary_id: 汇总ID
 
         Returns:
-            转出和转入的余额历史记录
+            汇总记录
         """
-        from_account = self.db.query(Account).filter(Account.id == from_account_id).first()
-        to_account = self.db.query(Account).filter(Account.id == to_account_id).first()
+        summary = self.db.query(AccountBalanceHistorySummary).filter(
+            AccountBalanceHistorySummary.id == summary_id,
+            AccountBalanceHistorySummary.account_id == account_id,
+            AccountBalanceHistorySummary.user_id == user_id
+        ).first()
+        if not summary:
+            raise NotFoundError("余额历史汇总不存在")
+        return summary
 
-        if not from_account or not to_account:
-            raise NotFoundError("账户不存在")
+    def record_initial_balance(self, account_id: int) -> AccountBalanceHistory:
+        """
+        记录账户初始余额
 
-        # 记录转出账户余额变化
-        from_history = self.record_balance_change(
-            account_id=from_account_id,
-            change_type=BalanceChangeType.TRANSFER_OUT,
-            amount_before=from_account.balance + amount,
-            amount_after=from_account.balance,
-            change_amount=-amount,
-            description=f"转账转出至 {to_account.name}",
-            transaction_id=transaction_id,
-            reference_id=reference_id
-        )
+        Args:
+            account_id: 账户ID
 
-        # 记录转入账户余额变化
-        to_history = self.record_balance_change(
-            account_id=to_account_id,
-            change_type=BalanceChangeType.TRANSFER_IN,
-            amount_before=to_account.balance - amount,
-            amount_after=to_account.balance,
-            change_amount=amount,
-            description=f"从 {from_account.name} 转入",
-            transaction_id=transaction_id,
-            reference_id=reference_id
-        )
+        Returns:
+            余额历史记录
+        """
+        account = self.db.query(Account).filter(Account.id == account_id).first()
+        if not account:
+            raise NotFoundError("账户不存在")
 
-        return from_history, to_history
+        return self.record_balance_change(
+            account_id=account_id,
+            change_type=BalanceChangeType.INITIAL,
+            amount_before=Decimal('0'),
+            amount_after=account.balance,
+            change_amount=account.balance,
+            description=f"账户 {account.name} 初始余额"
+        )
 
     def get_balance_statistics(
         self,
@@ -278,42 +414,102 @@ class AccountBalanceHistoryService:
         if not account:
             raise NotFoundError("账户不存在")
 
-        from datetime import datetime, timedelta
-
         start_date = datetime.now() - timedelta(days=days)
 
-        # 查询指定时间段内的余额变化
-        histories = self.db.query(AccountBalanceHistory).filter(
-            and_(
-                AccountBalanceHistory.account_id == account_id,
-                AccountBalanceHistory.created_at >= start_date
-            )
+        # 明细部分：按 (日期, 变化类型, 变化方向) 一次分组聚合，同时取余额最值
+        change = AccountBalanceHistory.change_amount
+        day_column = func.date(AccountBalanceHistory.created_at)
+        sign_column = case((change > 0, 1), (change < 0, -1), else_=0)
+        detail_rows = self.db.query(
+            day_column,
+            AccountBalanceHistory.change_type,
+            sign_column,
+            func.sum(change),
+            func.count(AccountBalanceHistory.id),
+            func.min(AccountBalanceHistory.amount_before),
+            func.max(AccountBalanceHistory.amount_before),
+            func.min(AccountBalanceHistory.amount_after),
+            func.max(AccountBalanceHistory.amount_after)
+        ).filter(
+            AccountBalanceHistory.account_id == account_id,
+            AccountBalanceHistory.created_at >= start_date
+        ).group_by(day_column, AccountBalanceHistory.change_type, sign_column).all()
+
+        # 已压缩部分：开始日期之后的汇总行
+        summaries = self.db.query(AccountBalanceHistorySummary).filter(
+            AccountBalanceHistorySummary.account_id == account_id,
+            AccountBalanceHistorySummary.period_start >= start_date.date()
         ).all()
 
-        # 统计各类变化
-        total_income = Decimal('0')
-        total_expense = Decimal('0')
-        transfer_in = Decimal('0')
-        transfer_out = Decimal('0')
-
-        for history in histories:
-            if history.change_type == BalanceChangeType.TRANSACTION:
-                if history.change_amount > 0:
-                    total_income += history.change_amount
-                else:
-                    total_expense += abs(history.change_amount)
-            elif history.change_type == BalanceChangeType.TRANSFER_IN:
-                transfer_in += history.change_amount
-            elif history.change_type == BalanceChangeType.TRANSFER_OUT:
-                transfer_out += abs(history.change_amount)
-
+        totals = {key: Decimal("0") for key in ("income", "expense", "transfer_in", "transfer_out")}
+        change_count = 0
+        balances: List[Decimal] = []
+        daily: Dict[str, Dict[str, Any]] = {}
+
+        def day_bucket(day) -> Dict[str, Any]:
+            key = day.isoformat() if hasattr(day, "isoformat") else str(day)[:10]
+            if key not in daily:
+                daily[key] = {"net_change": Decimal("0"), "income": Decimal("0"),
+                              "expense": Decimal("0"), "change_count": 0}
+            return daily[key]
+
+        for day, change_type, sign, amount, count, min_before, max_before, min_after, max_after in detail_rows:
+            amount = Decimal(amount or 0)
+            bucket = day_bucket(day)
+            bucket["net_change"] += amount
+            bucket["change_count"] += count
+            change_count += count
+            balances.extend(Decimal(value) for value in (min_before, max_before, min_after, max_after))
+
+            if change_type == BalanceChangeType.TRANSACTION and sign > 0:
+                totals["income"] += amount
+                bucket["income"] += amount
+            elif change_type == BalanceChangeType.TRANSACTION and sign < 0:
+                totals["expense"] -= amount
+                bucket["expense"] -= amount
+            elif change_type == BalanceChangeType.TRANSFER_IN:
+                totals["transfer_in"] += amount
+            elif change_type == BalanceChangeType.TRANSFER_OUT:
+                totals["transfer_out"] -= amount
+
+        for summary in summaries:
+            bucket = day_bucket(summary.period_start)
+            bucket["net_change"] += Decimal(summary.amount_after) - Decimal(summary.amount_before)
+            bucket["income"] += Decimal(summary.transaction_income)
+            bucket["expense"] += Decimal(summary.transaction_expense)
+            bucket["change_count"] += summary.change_count
+            change_count += summary.change_count
+            totals["income"] += Decimal(summary.transaction_income)
+            totals["expense"] += Decimal(summary.transaction_expense)
+            totals["transfer_in"] += Decimal(summary.transfer_in)
+            totals["transfer_out"] += Decimal(summary.transfer_out)
+            balances.extend([Decimal(summary.amount_before), Decimal(summary.amount_after)])
+
+        # 按日补齐序列，没有变化的日期记为 0
+        daily_series = []
+        current = start_date.date()
+        while current <= datetime.now().date():
+            bucket = daily.get(current.isoformat())
+            daily_series.append({
+                "date": current.isoformat(),
+                "net_change": float(bucket["net_change"]) if bucket else 0.0,
+                "income": float(bucket["income"]) if bucket else 0.0,
+                "expense": float(bucket["expense"]) if bucket else 0.0,
+                "change_count": bucket["change_count"] if bucket else 0
+            })
+            current += timedelta(days=1)
+
+        current_balance = Decimal(account.balance or 0)
         return {
-            "current_balance": float(account.balance),
+            "current_balance": float(current_balance),
             "period_days": days,
-            "total_income": float(total_income),
-            "total_expense": float(total_expense),
-            "transfer_in": float(transfer_in),
-            "transfer_out": float(transfer_out),
-            "net_change": float(total_income - total_expense),
-            "change_count": len(histories)
+            "total_income": float(totals["income"]),
+            "total_expense": float(totals["expense"]),
+            "transfer_in": float(totals["transfer_in"]),
+            "transfer_out": float(totals["transfer_out"]),
+            "net_change": float(totals["income"] - totals["expense"]),
+            "change_count": change_count,
+            "min_balance": float(min(balances + [current_balance])),
+            "max_balance": float(max(balances + [current_balance])),
+            "daily_series": daily_series
         }
\ No newline at end of file
@@ -1,13 +1,19 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, desc
-from typing import Optional, List
+from sqlalchemy import and_, or_, func, desc, select, union_all, literal, case, null
+from typing import Optional, List, Dict, Iterable
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
+import pandas as pd
 
 from app.models.account import Account, AccountType
 from app.models.transaction import Transaction, TransactionType, TransactionSource
 from app.schemas.account import AccountCreate, AccountUpdate, AccountTransfer, AccountWithStats
 from app.core.exceptions import ValidationError, NotFoundError
 from app.services.account_balance_history_service import AccountBalanceHistoryService
+from app.services.ledger_hooks import on_transactions_changed
+from app.services.balance_drift_service import BalanceDriftService
+from app.services.category_closure_service import CategoryClosureService
+from app.utils.ledger import ledger_legs
 
 class AccountService:
     def __init__(self, db: Session):
@@ -48,6 +54,8 @@ class AccountService:
         )
 
         self.db.add(account)
+        self.db.flush()
+        BalanceDriftService(self.db).init_account(account)
         self.db.commit()
         self.db.refresh(account)
 
@@ -152,9 +160,16 @@ class AccountService:
 
         # 更新字段
         update_data = account_data.model_dump(exclude_unset=True)
+        previous_initial = Decimal(account.initial_balance or 0)
         for field, value in update_data.items():
             setattr(account, field, value)
 
+        # 初始余额变化会改变预期余额
+        if update_data.get("initial_balance") is not None:
+            BalanceDriftService(self.db).apply_deltas({
+                account.id: Decimal(update_data["initial_balance"]) - previous_initial
+            })
+
         self.db.commit()
         self.db.refresh(account)
 
@@ -201,25 +216,123 @@ class AccountService:
             带统计信息的账户
         """
         account = self.get_account(user_id, account_id)
+        stats = self.get_accounts_stats(user_id, [account_id])
 
-        # 统计交易信息
-        expense_stats = self.db.query(
-            func.count(Transaction.id).label('count'),
-            func.sum(Transaction.amount).label('total')
-        ).filter(
-            Transaction.account_id == account_id,
-            Transaction.type == TransactionType.EXPENSE
-        ).first()
+        return self._build_account_with_stats(account, stats.get(account_id))
 
-        income_stats = self.db.query(
-            func.count(Transaction.id).label('count'),
-            func.sum(Transaction.amount).label('total')
-        ).filter(
-            Transaction.account_id == account_id,
-            Transaction.type == TransactionType.INCOME
-        ).first()
+    def get_accounts_with_stats(
+        self,
+        user_id: int,
+        account_type: Optional[AccountType] = None,
+        is_enabled: Optional[bool] = None
+    ) -> List[AccountWithStats]:
+        """
+        获取用户全部账户及其统计信息
+
+        账户列表和统计各一次查询，查询次数与账户数量无关。
+
+        Args:
+            user_id: 用户ID
+            account_type: 账户类型
+            is_enabled: 是否启用
+
+        Returns:
+            带统计信息的账户列表
+        """
+        accounts = self.get_accounts(user_id, account_type, is_enabled)
+        if not accounts:
+            return []
+
+        stats = self.get_accounts_stats(user_id, [account.id for account in accounts])
+
+        return [
+            self._build_account_with_stats(account, stats.get(account.id))
+            for account in accounts
+        ]
+
+    def get_accounts_stats(
+        self,
+        user_id: int,
+        account_ids: Optional[Iterable[int]] = None
+    ) -> Dict[int, dict]:
+        """
+        一次分组查询统计各账户的收支和转账
+
+        交易按 account_id（转出方/收支方）和 to_account_id（转入方）
+        展开为两路 UNION ALL 后按账户分组汇总。
+
+        Args:
+            user_id: 用户ID
+            account_ids: 账户ID范围（为空时统计全部账户）
+
+        Returns:
+            {账户ID: 统计信息}
+        """
+        account_ids = list(account_ids) if account_ids is not None else None
+
+        outgoing = select(
+            Transaction.account_id.label("account_id"),
+            Transaction.type.label("type"),
+            Transaction.amount.label("amount"),
+            literal(1).label("is_source")
+        ).where(Transaction.user_id == user_id)
+
+        incoming = select(
+            Transaction.to_account_id.label("account_id"),
+            Transaction.type.label("type"),
+            Transaction.amount.label("amount"),
+            literal(0).label("is_source")
+        ).where(
+            Transaction.user_id == user_id,
+            Transaction.type == TransactionType.TRANSFER,
+            Transaction.to_account_id.isnot(None)
+        )
+
+        if account_ids is not None:
+            outgoing = outgoing.where(Transaction.account_id.in_(account_ids))
+            incoming = incoming.where(Transaction.to_account_id.in_(account_ids))
+
+        legs = union_all(outgoing, incoming).subquery()
+
+        def leg_sum(transaction_type: TransactionType, is_source: int):
+            return func.coalesce(func.sum(case(
+                (and_(legs.c.type == transaction_type, legs.c.is_source == is_source), legs.c.amount),
+                else_=0
+            )), 0)
+
+        rows = self.db.query(
+            legs.c.account_id,
+            func.count().label("transaction_count"),
+            leg_sum(TransactionType.INCOME, 1).label("total_income"),
+            leg_sum(TransactionType.EXPENSE, 1).label("total_expense"),
+            leg_sum(TransactionType.TRANSFER, 0).label("transfer_in"),
+            leg_sum(TransactionType.TRANSFER, 1).label("transfer_out")
+        ).group_by(legs.c.account_id).all()
+
+        return {
+            row.account_id: {
+                "transaction_count": row.transaction_count,
+                "total_income": float(row.total_income),
+                "total_expense": float(row.total_expense),
+                "transfer_in": float(row.transfer_in),
+                "transfer_out": float(row.transfer_out),
+            }
+            for row in rows
+        }
+
+    def _build_account_with_stats(self, account: Account, stats: Optional[dict]) -> AccountWithStats:
+        """
+        组装带统计信息的账户响应
+
+        Args:
+            account: 账户
+            stats: 统计信息（无交易时为None）
+
+        Returns:
+            带统计信息的账户
+        """
+        stats = stats or {}
 
-        # 构建响应数据
         account_dict = {
             "id": account.id,
             "user_id": account.user_id,
@@ -234,27 +347,130 @@ class AccountService:
             "description": account.description,
             "created_at": account.created_at,
             "updated_at": account.updated_at,
-            "transaction_count": (expense_stats.count or 0) + (income_stats.count or 0),
-            "total_expense": float(expense_stats.total) if expense_stats and expense_stats.total else 0,
-            "total_income": float(income_stats.total) if income_stats and income_stats.total else 0,
+            "transaction_count": stats.get("transaction_count", 0),
+            "total_income": stats.get("total_income", 0),
+            "total_expense": stats.get("total_expense", 0),
+            "transfer_in": stats.get("transfer_in", 0),
+            "transfer_out": stats.get("transfer_out", 0),
         }
 
         return AccountWithStats(**account_dict)
 
+    def get_net_worth_series(
+        self,
+        user_id: int,
+        start_date: date,
+        end_date: date,
+        granularity: str = "day"
+    ) -> dict:
+        """
+        获取净资产时间序列（总额及各账户余额）
+
+        一次分组查询取出区间内每个账户每日的余额变化，区间之前的变化合并为一行作为起点，
+        再由 pandas 累加得到每日余额，不逐笔回放交易。
+
+        Args:
+            user_id: 用户ID
+            start_date: 开始日期
+            end_date: 结束日期
+            granularity: day 按日 / month 按月（取月末余额）
+
+        Returns:
+            账户列表与余额序列
+        """
+        if start_date > end_date:
+            raise ValidationError("开始日期不能晚于结束日期")
+        if granularity not in ("day", "month"):
+            raise ValidationError("granularity 只支持 day 或 month")
+
+        accounts = self.db.query(Account).filter(
+            Account.user_id == user_id
+        ).order_by(Account.id).all()
+        if not accounts:
+            return {"granularity": granularity, "accounts": [], "series": []}
+
+        start_at = datetime.combine(start_date, time.min)
+        legs = ledger_legs(
+            Transaction.user_id == user_id,
+            Transaction.transaction_date < datetime.combine(end_date + timedelta(days=1), time.min)
+        )
+        # 开始日期之前的变化归入 day 为空的起点行
+        day_column = case(
+            (legs.c.transaction_date < start_at, null()),
+            else_=func.date(legs.c.transaction_date)
+        ).label("day")
+        rows = self.db.execute(
+            select(legs.c.account_id, day_column, func.sum(legs.c.delta).label("delta"))
+            .group_by(legs.c.account_id, day_column)
+        ).all()
+
+        account_ids = [account.id for account in accounts]
+        seed = pd.Series(
+            [float(account.initial_balance or 0) for account in accounts],
+            index=account_ids
+        )
+        deltas = pd.DataFrame(rows, columns=["account_id", "day", "delta"])
+        deltas = deltas[deltas["account_id"].isin(account_ids)]
+        deltas["delta"] = deltas["delta"].astype(float)
+
+        before = deltas[deltas["day"].isna()].groupby("account_id")["delta"].sum()
+        seed = seed.add(before, fill_value=0)
+
+        in_range = deltas[deltas["day"].notna()].copy()
+        in_range["day"] = pd.to_datetime(in_range["day"])
+        days = pd.date_range(start_date, end_date, freq="D")
+        daily = (
+            in_range.pivot_table(index="day", columns="account_id", values="delta", aggfunc="sum")
+            .reindex(index=days, columns=account_ids, fill_value=0)
+            .fillna(0)
+        )
+        balances = daily.cumsum() + seed
+
+        if granularity == "month":
+            balances = balances.groupby(balances.index.to_period("M")).last()
+            labels = [str(period) for period in balances.index]
+        else:
+            labels = [day.strftime("%Y-%m-%d") for day in balances.index]
+
+        balances = balances.round(2)
+        totals = balances.sum(axis=1).round(2)
+        series = [
+            {
+                "date": label,
+                "total": float(total),
+                "balances": {int(account_id): float(value) for account_id, value in row.items()}
+            }
+            for label, total, (_, row) in zip(labels, totals, balances.iterrows())
+        ]
+
+        return {
+            "granularity": granularity,
+            "start_date": start_date,
+            "end_date": end_date,
+            "accounts": [
+                {"id": account.id, "name": account.name, "type": account.type}
+                for account in accounts
+            ],
+            "series": series
+        }
+
     def transfer_between_accounts(
         self,
         user_id: int,
         transfer_data: AccountTransfer
-    ) -> tuple[Transaction, Transaction, Account, Account]:
+    ) -> tuple[Transaction, Account, Account]:
         """
         账户间转账
 
+        一笔转账只记录一条交易（account_id 转出、to_account_id 转入），
+        双方余额及余额历史由交易写入钩子按账本口径更新。
+
         Args:
             user_id: 用户ID
             transfer_data: 转账数据
 
         Returns:
-            转出交易、转入交易、转出账户、转入账户
+            转账交易、转出账户、转入账户
         """
         # 验证账户存在
         from_account = self.get_account(user_id, transfer_data.from_account_id)
@@ -268,8 +484,8 @@ class AccountService:
         if float(from_account.balance) < float(transfer_data.amount):
             raise ValidationError("转出账户余额不足")
 
-        # 创建转出交易记录
-        from_transaction = Transaction(
+        # 创建转账交易记录
+        transaction = Transaction(
             user_id=user_id,
             type=TransactionType.TRANSFER,
             amount=transfer_data.amount,
@@ -282,48 +498,16 @@ class AccountService:
             source=TransactionSource.MANUAL
         )
 
-        # 创建转入交易记录
-        to_transaction = Transaction(
-            user_id=user_id,
-            type=TransactionType.TRANSFER,
-            amount=transfer_data.amount,
-            category_id=self._get_transfer_category_id(user_id),
-            account_id=transfer_data.to_account_id,
-            to_account_id=transfer_data.from_account_id,
-            transaction_date=transfer_data.transaction_date or func.now(),
-            remark=transfer_data.remark or f"从 {from_account.name} 转入",
-            source=TransactionSource.MANUAL
-        )
-
-        # 更新账户余额
-        from_account.balance -= transfer_data.amount
-        to_account.balance += transfer_data.amount
-
         # 保存到数据库
-        self.db.add(from_transaction)
-        self.db.add(to_transaction)
+        self.db.add(transaction)
+        on_transactions_changed(self.db, added=[transaction])
         self.db.commit()
 
-        self.db.refresh(from_transaction)
-        self.db.refresh(to_transaction)
+        self.db.refresh(transaction)
         self.db.refresh(from_account)
         self.db.refresh(to_account)
 
-        # 记录余额变化历史
-        balance_service = AccountBalanceHistoryService(self.db)
-        try:
-            # 记录转出和转入的余额变化
-            balance_service.record_transfer_changes(
-                from_account_id=transfer_data.from_account_id,
-                to_account_id=transfer_data.to_account_id,
-                amount=transfer_data.amount,
-                transaction_id=from_transaction.id
-            )
-        except Exception:
-            # 如果记录历史失败，不影响转账
-            pass
-
-        return from_transaction, to_transaction, from_account, to_account
+        return transaction, from_account, to_account
 
     def get_account_summary(self, user_id: int) -> dict:
         """
@@ -385,6 +569,8 @@ class AccountService:
                 color="#BDC3C7"
             )
             self.db.add(category)
+            self.db.flush()
+            CategoryClosureService(self.db).add_category(category)
             self.db.commit()
             self.db.refresh(category)
 
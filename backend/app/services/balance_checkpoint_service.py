@@ -0,0 +1,294 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, or_
+from typing import Optional, List, Dict, Tuple, Iterable
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
+from bisect import bisect_right
+from collections import defaultdict
+
+from app.models.account import Account
+from app.models.transaction import Transaction
+from app.models.account_balance_checkpoint import AccountBalanceCheckpoint, CheckpointPeriod
+from app.core.exceptions import NotFoundError
+from app.config.settings import settings
+from app.utils.ledger import transaction_deltas, ledger_legs
+
+
+def period_end(day: date, period: CheckpointPeriod) -> date:
+    """返回日期所在周期的最后一天"""
+    if period == CheckpointPeriod.DAY:
+        return day
+    next_month = day.replace(day=28) + timedelta(days=4)
+    return next_month.replace(day=1) - timedelta(days=1)
+
+
+def last_closed_period_end(today: date, period: CheckpointPeriod) -> date:
+    """返回最近一个已结束周期的最后一天"""
+    if period == CheckpointPeriod.DAY:
+        return today - timedelta(days=1)
+    return today.replace(day=1) - timedelta(days=1)
+
+
+def _to_date(value) -> date:
+    """统一日期类型（部分数据库的 DATE() 返回字符串）"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+class BalanceCheckpointService:
+    """
+    账户余额检查点服务
+
+    检查点保存账户在某日结束时的余额（按账本口径：初始余额 + 交易分录），
+    查询任意时点余额时只需从最近检查点起扫描有限的交易。
+    """
+
+    def __init__(self, db: Session, period: Optional[CheckpointPeriod] = None):
+        self.db = db
+        self.period = period or CheckpointPeriod(settings.balance_checkpoint_period)
+
+    def get_balance_as_of(self, user_id: int, account_id: int, as_of: datetime) -> dict:
+        """
+        查询账户在指定时点的余额
+
+        Args:
+            user_id: 用户ID
+            account_id: 账户ID
+            as_of: 查询时点（包含该时点的交易）
+
+        Returns:
+            余额及所用检查点信息
+        """
+        account = self.db.query(Account).filter(
+            Account.id == account_id,
+            Account.user_id == user_id
+        ).first()
+        if not account:
+            raise NotFoundError("账户不存在")
+
+        # 检查点覆盖到 checkpoint_date 当天结束，需不晚于查询时点
+        checkpoint = self.db.query(AccountBalanceCheckpoint).filter(
+            AccountBalanceCheckpoint.account_id == account_id,
+            AccountBalanceCheckpoint.period_type == self.period,
+            AccountBalanceCheckpoint.checkpoint_date <= as_of.date() - timedelta(days=1)
+        ).order_by(AccountBalanceCheckpoint.checkpoint_date.desc()).first()
+
+        conditions = [
+            Transaction.user_id == user_id,
+            or_(Transaction.account_id == account_id, Transaction.to_account_id == account_id),
+            Transaction.transaction_date <= as_of
+        ]
+        if checkpoint:
+            base_balance = Decimal(checkpoint.balance)
+            conditions.append(
+                Transaction.transaction_date >= datetime.combine(
+                    checkpoint.checkpoint_date + timedelta(days=1), time.min
+                )
+            )
+        else:
+            base_balance = Decimal(account.initial_balance or 0)
+
+        legs = ledger_legs(*conditions)
+        delta, scanned = self.db.execute(
+            select(
+                func.coalesce(func.sum(legs.c.delta), 0),
+                func.count()
+            ).where(legs.c.account_id == account_id)
+        ).one()
+
+        return {
+            "account_id": account_id,
+            "as_of": as_of,
+            "balance": float(base_balance + Decimal(delta)),
+            "checkpoint_date": checkpoint.checkpoint_date if checkpoint else None,
+            "checkpoint_balance": float(checkpoint.balance) if checkpoint else None,
+            "scanned_entries": scanned
+        }
+
+    def apply_changes(self, added: Iterable = (), removed: Iterable = ()) -> None:
+        """
+        在调用方事务中按交易变化增量维护检查点（不提交）
+
+        新增交易的增量加到其日期及之后的检查点上，删除交易则反向扣回；
+        之后把涉及账户的检查点补齐到最近一个已结束周期。
+        调用前需 flush，使本次写入对补齐查询可见。
+
+        Args:
+            added: 新增（或修改后）的交易
+            removed: 删除（或修改前快照）的交易
+        """
+        deltas: Dict[int, List[Tuple[date, Decimal]]] = defaultdict(list)
+        for sign, transactions in ((1, added), (-1, removed)):
+            for transaction in transactions:
+                day = _to_date(transaction.transaction_date or datetime.now())
+                for account_id, delta in transaction_deltas(transaction):
+                    if account_id:
+                        deltas[account_id].append((day, delta * sign))
+
+        if not deltas:
+            return
+
+        self._apply_deltas(deltas)
+        # 会话不自动 flush，补齐时读取的最新检查点余额须包含刚累加的增量
+        self.db.flush()
+        self.ensure_checkpoints(list(deltas.keys()))
+
+    def _apply_deltas(self, deltas: Dict[int, List[Tuple[date, Decimal]]]) -> None:
+        """把按日的余额变化累加到受影响的检查点上"""
+        earliest = min(day for entries in deltas.values() for day, _ in entries)
+        checkpoints = self.db.query(AccountBalanceCheckpoint).filter(
+            AccountBalanceCheckpoint.account_id.in_(list(deltas.keys())),
+            AccountBalanceCheckpoint.checkpoint_date >= earliest
+        ).all()
+
+        # 每个账户按日期排序后做前缀和，检查点用二分取累计值
+        prefix: Dict[int, Tuple[List[date], List[Decimal]]] = {}
+        for account_id, entries in deltas.items():
+            entries.sort(key=lambda entry: entry[0])
+            days, sums, running = [], [], Decimal("0")
+            for day, delta in entries:
+                running += delta
+                days.append(day)
+                sums.append(running)
+            prefix[account_id] = (days, sums)
+
+        for checkpoint in checkpoints:
+            days, sums = prefix[checkpoint.account_id]
+            index = bisect_right(days, checkpoint.checkpoint_date)
+            if index:
+                checkpoint.balance = Decimal(checkpoint.balance) + sums[index - 1]
+
+    def ensure_checkpoints(self, account_ids: List[int], today: Optional[date] = None) -> int:
+        """
+        把账户检查点补齐到最近一个已结束周期（不提交）
+
+        Args:
+            account_ids: 账户ID列表
+            today: 当前日期，默认今天
+
+        Returns:
+            新建检查点数量
+        """
+        target = last_closed_period_end(today or date.today(), self.period)
+        latest = dict(self.db.query(
+            AccountBalanceCheckpoint.account_id,
+            func.max(AccountBalanceCheckpoint.checkpoint_date)
+        ).filter(
+            AccountBalanceCheckpoint.account_id.in_(account_ids),
+            AccountBalanceCheckpoint.period_type == self.period
+        ).group_by(AccountBalanceCheckpoint.account_id).all())
+
+        lagging = [
+            account_id for account_id in account_ids
+            if latest.get(account_id) is None or _to_date(latest[account_id]) < target
+        ]
+        if not lagging:
+            return 0
+
+        created = 0
+        accounts = self.db.query(Account).filter(Account.id.in_(lagging)).all()
+        for account in accounts:
+            after = _to_date(latest[account.id]) if latest.get(account.id) else None
+            if after:
+                start_balance = self.db.query(AccountBalanceCheckpoint.balance).filter(
+                    AccountBalanceCheckpoint.account_id == account.id,
+                    AccountBalanceCheckpoint.period_type == self.period,
+                    AccountBalanceCheckpoint.checkpoint_date == after
+                ).scalar()
+            else:
+                start_balance = account.initial_balance
+            created += self._build_checkpoints(account, Decimal(start_balance or 0), after, target)
+        return created
+
+    def _build_checkpoints(
+        self,
+        account: Account,
+        start_balance: Decimal,
+        after: Optional[date],
+        target: date
+    ) -> int:
+        """从 after（不含）起按日聚合交易，生成截至 target 的检查点"""
+        conditions = [
+            Transaction.user_id == account.user_id,
+            or_(Transaction.account_id == account.id, Transaction.to_account_id == account.id),
+            Transaction.transaction_date < datetime.combine(target + timedelta(days=1), time.min)
+        ]
+        if after:
+            conditions.append(
+                Transaction.transaction_date >= datetime.combine(after + timedelta(days=1), time.min)
+            )
+
+        legs = ledger_legs(*conditions)
+        day_column = func.date(legs.c.transaction_date)
+        daily = [
+            (_to_date(day), Decimal(delta))
+            for day, delta in self.db.execute(
+                select(day_column, func.sum(legs.c.delta))
+                .where(legs.c.account_id == account.id)
+                .group_by(day_column)
+                .order_by(day_column)
+            ).all()
+        ]
+
+        # 检查点日期：按月为每个月末；按日只记录有交易的日期，并始终包含 target
+        if self.period == CheckpointPeriod.MONTH:
+            first = after + timedelta(days=1) if after else (daily[0][0] if daily else target)
+            ends = []
+            current = period_end(first, self.period)
+            while current <= target:
+                ends.append(current)
+                current = period_end(current + timedelta(days=1), self.period)
+        else:
+            ends = sorted({day for day, _ in daily} | {target})
+
+        balance = start_balance
+        index = 0
+        checkpoints = []
+        for end in ends:
+            while index < len(daily) and daily[index][0] <= end:
+                balance += daily[index][1]
+                index += 1
+            checkpoints.append(AccountBalanceCheckpoint(
+                user_id=account.user_id,
+                account_id=account.id,
+                period_type=self.period,
+                checkpoint_date=end,
+                balance=balance
+            ))
+
+        self.db.add_all(checkpoints)
+        return len(checkpoints)
+
+    def rebuild(self, user_id: Optional[int] = None, account_id: Optional[int] = None) -> Dict[str, int]:
+        """
+        按交易数据重建检查点（逐账户提交）
+
+        Args:
+            user_id: 仅重建指定用户
+            account_id: 仅重建指定账户
+
+        Returns:
+            重建的账户数与检查点数
+        """
+        query = self.db.query(Account)
+        if user_id:
+            query = query.filter(Account.user_id == user_id)
+        if account_id:
+            query = query.filter(Account.id == account_id)
+
+        target = last_closed_period_end(date.today(), self.period)
+        result = {"accounts": 0, "checkpoints": 0}
+        for account in query.order_by(Account.id).all():
+            self.db.query(AccountBalanceCheckpoint).filter(
+                AccountBalanceCheckpoint.account_id == account.id
+            ).delete(synchronize_session=False)
+            result["checkpoints"] += self._build_checkpoints(
+                account, Decimal(account.initial_balance or 0), None, target
+            )
+            result["accounts"] += 1
+            self.db.commit()
+
+        return result
@@ -0,0 +1,196 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, or_, update
+from typing import Optional, Dict, Any
+from datetime import datetime
+from decimal import Decimal
+
+from app.models.account import Account
+from app.models.transaction import Transaction
+from app.models.balance_verification import BalanceVerification, AccountBalanceChecksum
+from app.utils.ledger import ledger_legs
+
+
+class BalanceDriftService:
+    """
+    账户余额漂移监控
+
+    每个账户维护一个校验和（预期余额 = 初始余额 + 交易增量），由交易写入钩子
+    与账户余额同步累加。定时检查只比较校验和与 Account.balance，每个账户常量开销，
+    不再重新扫描交易；只有出现新的漂移时才写入 BalanceVerification 记录。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def apply_deltas(self, changed: Dict[int, Decimal]) -> None:
+        """
+        累加账户预期余额（在调用方事务中执行，不提交）
+
+        Args:
+            changed: 账户ID -> 预期余额变化
+        """
+        for account_id, delta in changed.items():
+            if delta:
+                self.db.execute(
+                    update(AccountBalanceChecksum)
+                    .where(AccountBalanceChecksum.account_id == account_id)
+                    .values(expected_balance=AccountBalanceChecksum.expected_balance + delta)
+                )
+
+    def init_account(self, account: Account) -> None:
+        """
+        为新账户创建校验和（不提交）
+
+        Args:
+            account: 已 flush 的新账户
+        """
+        self.db.add(AccountBalanceChecksum(
+            user_id=account.user_id,
+            account_id=account.id,
+            expected_balance=account.initial_balance or 0,
+            last_drift=0
+        ))
+
+    def realign(self, balances: Dict[int, Decimal]) -> None:
+        """
+        全量对账修正后，把校验和对齐到修正后的余额（不提交）
+
+        Args:
+            balances: 账户ID -> 修正后的余额
+        """
+        for account_id, balance in balances.items():
+            self.db.execute(
+                update(AccountBalanceChecksum)
+                .where(AccountBalanceChecksum.account_id == account_id)
+                .values(expected_balance=balance, last_drift=0)
+            )
+
+    def seed_missing(self, user_id: Optional[int] = None) -> int:
+        """
+        为尚无校验和的账户按交易记录计算初始值（一次分组查询）
+
+        Args:
+            user_id: 仅处理指定用户
+
+        Returns:
+            新建校验和数量
+        """
+        conditions = [Transaction.user_id == user_id] if user_id else []
+        legs = ledger_legs(*conditions)
+        ledger = select(
+            legs.c.account_id,
+            func.sum(legs.c.delta).label("delta")
+        ).group_by(legs.c.account_id).subquery("ledger")
+
+        query = select(
+            Account.id,
+            Account.user_id,
+            Account.initial_balance,
+            func.coalesce(ledger.c.delta, 0).label("delta")
+        ).outerjoin(
+            ledger, ledger.c.account_id == Account.id
+        ).outerjoin(
+            AccountBalanceChecksum, AccountBalanceChecksum.account_id == Account.id
+        ).where(AccountBalanceChecksum.id.is_(None))
+        if user_id:
+            query = query.where(Account.user_id == user_id)
+
+        rows = self.db.execute(query).all()
+        self.db.add_all([
+            AccountBalanceChecksum(
+                user_id=row.user_id,
+                account_id=row.id,
+                expected_balance=Decimal(row.initial_balance or 0) + Decimal(row.delta),
+                last_drift=0
+            )
+            for row in rows
+        ])
+        self.db.commit()
+        return len(rows)
+
+    def check(self, tolerance: float = 0.01, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        检查余额漂移：比较校验和与账户余额，新出现或金额变化的漂移写入校验记录
+
+        Args:
+            tolerance: 容差（元）
+            user_id: 仅检查指定用户
+
+        Returns:
+            检查结果
+        """
+        seeded = self.seed_missing(user_id)
+        checked_at = datetime.now()
+        threshold = Decimal(str(tolerance))
+        difference = Account.balance - AccountBalanceChecksum.expected_balance
+
+        # 只取出有漂移或上次有漂移（可能已恢复）的账户
+        query = self.db.query(AccountBalanceChecksum, Account.balance, Account.name).join(
+            Account, Account.id == AccountBalanceChecksum.account_id
+        ).filter(
+            or_(
+                func.abs(difference) > threshold,
+                AccountBalanceChecksum.last_drift != 0
+            )
+        )
+        if user_id:
+            query = query.filter(AccountBalanceChecksum.user_id == user_id)
+
+        drifted = []
+        recorded = 0
+        resolved = 0
+        for checksum, balance, account_name in query.all():
+            actual = Decimal(balance or 0)
+            expected = Decimal(checksum.expected_balance)
+            drift = actual - expected
+            last_drift = Decimal(checksum.last_drift or 0)
+
+            if abs(drift) <= threshold:
+                checksum.last_drift = 0
+                resolved += 1
+                continue
+
+            drifted.append({
+                "account_id": checksum.account_id,
+                "user_id": checksum.user_id,
+                "account_name": account_name,
+                "expected_balance": float(expected),
+                "actual_balance": float(actual),
+                "drift": float(drift)
+            })
+
+            if abs(drift - last_drift) > threshold:
+                self.db.add(BalanceVerification(
+                    user_id=checksum.user_id,
+                    account_id=checksum.account_id,
+                    expected_balance=float(expected),
+                    actual_balance=float(actual),
+                    difference=float(abs(drift)),
+                    is_valid=False,
+                    tolerance=tolerance,
+                    verification_method="drift_monitor",
+                    verification_details={
+                        "drift": float(drift),
+                        "previous_drift": float(last_drift),
+                        "checked_at": checked_at.isoformat()
+                    },
+                    correction_suggestions="账户余额与交易记录不一致，可执行余额对账修正"
+                ))
+                checksum.last_drift = drift
+                recorded += 1
+
+        scope = update(AccountBalanceChecksum).values(last_checked_at=checked_at)
+        if user_id:
+            scope = scope.where(AccountBalanceChecksum.user_id == user_id)
+        accounts_checked = self.db.execute(scope).rowcount
+
+        self.db.commit()
+
+        return {
+            "checked_at": checked_at.isoformat(),
+            "accounts_checked": accounts_checked,
+            "seeded": seeded,
+            "drifted": drifted,
+            "recorded": recorded,
+            "resolved": resolved
+        }
@@ -0,0 +1,289 @@
+from sqlalchemy.orm import Session
+from typing import Optional, List, Dict, Any
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
+import gzip
+import json
+import os
+
+from app.models.account_balance_history import (
+    AccountBalanceHistory, BalanceChangeType,
+    AccountBalanceHistorySummary, HistorySummaryPeriod
+)
+from app.config.settings import settings
+
+
+def summary_period_bounds(day: date, period: HistorySummaryPeriod) -> tuple[date, date]:
+    """返回日期所在汇总周期的开始和结束日期"""
+    if period == HistorySummaryPeriod.DAY:
+        return day, day
+    start = day.replace(day=1)
+    end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+
+def _record_key(record: Dict[str, Any]) -> tuple:
+    """归档明细的去重键（自增 ID 在部分数据库重启后可能复用，带上创建时间）"""
+    return record["id"], record["created_at"]
+
+
+class BalanceHistoryCompactionService:
+    """
+    余额历史压缩服务
+
+    把早于保留期限的 account_balance_history 记录按账户、按日/月折叠为汇总行
+    （保留周期边界的 amount_before/amount_after），原始记录写入 gzip JSONL 归档文件
+    的临时副本，从明细表删除并提交成功后才替换正式文件；归档按明细 (id, created_at) 去重，
+    提交失败后重新压缩不会重复写入。
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        period: Optional[HistorySummaryPeriod] = None,
+        archive_path: Optional[str] = None
+    ):
+        self.db = db
+        self.period = period or HistorySummaryPeriod(settings.balance_history_summary_period)
+        self.archive_path = archive_path or settings.balance_history_archive_path
+
+    def get_horizon(self, retention_days: Optional[int] = None, now: Optional[datetime] = None) -> datetime:
+        """
+        计算压缩边界：早于该时间的记录会被压缩，边界对齐到周期开始，只折叠完整周期
+
+        Args:
+            retention_days: 明细保留天数
+            now: 当前时间
+
+        Returns:
+            压缩边界时间
+        """
+        days = settings.balance_history_retention_days if retention_days is None else retention_days
+        cutoff = (now or datetime.now()) - timedelta(days=days)
+        start, _ = summary_period_bounds(cutoff.date(), self.period)
+        return datetime.combine(start, time.min)
+
+    def compact(
+        self,
+        retention_days: Optional[int] = None,
+        user_id: Optional[int] = None,
+        account_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        压缩余额历史（逐账户提交）
+
+        Args:
+            retention_days: 明细保留天数，默认取配置
+            user_id: 仅压缩指定用户
+            account_id: 仅压缩指定账户
+
+        Returns:
+            压缩结果统计
+        """
+        horizon = self.get_horizon(retention_days)
+
+        query = self.db.query(AccountBalanceHistory.account_id).filter(
+            AccountBalanceHistory.created_at < horizon
+        )
+        if user_id:
+            query = query.filter(AccountBalanceHistory.user_id == user_id)
+        if account_id:
+            query = query.filter(AccountBalanceHistory.account_id == account_id)
+        account_ids = [row[0] for row in query.distinct().all()]
+
+        result = {
+            "horizon": horizon.isoformat(),
+            "accounts": 0,
+            "archived_rows": 0,
+            "summaries": 0
+        }
+        for current_account_id in account_ids:
+            archived, summaries = self._compact_account(current_account_id, horizon)
+            result["accounts"] += 1
+            result["archived_rows"] += archived
+            result["summaries"] += summaries
+
+        return result
+
+    def _compact_account(self, account_id: int, horizon: datetime) -> tuple[int, int]:
+        """压缩单个账户早于边界的历史记录"""
+        rows = self.db.query(AccountBalanceHistory).filter(
+            AccountBalanceHistory.account_id == account_id,
+            AccountBalanceHistory.created_at < horizon
+        ).order_by(AccountBalanceHistory.created_at, AccountBalanceHistory.id).all()
+        if not rows:
+            return 0, 0
+
+        groups: Dict[date, List[AccountBalanceHistory]] = {}
+        for row in rows:
+            period_start, _ = summary_period_bounds(row.created_at.date(), self.period)
+            groups.setdefault(period_start, []).append(row)
+
+        archive_files: Dict[date, tuple[str, str]] = {}
+        try:
+            # 先写归档临时文件，确保删除明细前原始数据已落盘
+            for period_start, group in groups.items():
+                archive_files[period_start] = self._archive_rows(group[0].user_id, account_id, period_start, group)
+
+            existing = {
+                summary.period_start: summary
+                for summary in self.db.query(AccountBalanceHistorySummary).filter(
+                    AccountBalanceHistorySummary.account_id == account_id,
+                    AccountBalanceHistorySummary.period_type == self.period,
+                    AccountBalanceHistorySummary.period_start.in_(list(groups.keys()))
+                ).all()
+            }
+
+            for period_start, group in groups.items():
+                summary = existing.get(period_start)
+                if summary is None:
+                    _, period_end = summary_period_bounds(period_start, self.period)
+                    summary = AccountBalanceHistorySummary(
+                        user_id=group[0].user_id,
+                        account_id=account_id,
+                        period_type=self.period,
+                        period_start=period_start,
+                        period_end=period_end,
+                        amount_before=group[0].amount_before,
+                        amount_after=group[-1].amount_after,
+                        transaction_income=0,
+                        transaction_expense=0,
+                        transfer_in=0,
+                        transfer_out=0,
+                        other_change=0,
+                        change_count=0,
+                        first_change_at=group[0].created_at,
+                        last_change_at=group[-1].created_at
+                    )
+                    self.db.add(summary)
+                self._fold_into_summary(summary, group)
+                summary.archive_file = archive_files[period_start][0]
+
+            ids = [row.id for row in rows]
+            for i in range(0, len(ids), 1000):
+                self.db.query(AccountBalanceHistory).filter(
+                    AccountBalanceHistory.id.in_(ids[i:i + 1000])
+                ).delete(synchronize_session=False)
+
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            for _, temp_path in archive_files.values():
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            raise
+
+        for relative_path, temp_path in archive_files.values():
+            os.replace(temp_path, os.path.join(self.archive_path, relative_path))
+
+        return len(rows), len(groups)
+
+    def _fold_into_summary(self, summary: AccountBalanceHistorySummary, group: List[AccountBalanceHistory]) -> None:
+        """把一组明细累加进汇总行，边界余额按时间先后取首尾"""
+        first, last = group[0], group[-1]
+        if summary.change_count and summary.first_change_at and summary.first_change_at > first.created_at:
+            summary.amount_before = first.amount_before
+            summary.first_change_at = first.created_at
+        if summary.change_count and summary.last_change_at and summary.last_change_at <= last.created_at:
+            summary.amount_after = last.amount_after
+            summary.last_change_at = last.created_at
+
+        totals = {
+            "transaction_income": Decimal("0"),
+            "transaction_expense": Decimal("0"),
+            "transfer_in": Decimal("0"),
+            "transfer_out": Decimal("0"),
+            "other_change": Decimal("0")
+        }
+        for row in group:
+            change = Decimal(row.change_amount)
+            if row.change_type == BalanceChangeType.TRANSACTION:
+                if change > 0:
+                    totals["transaction_income"] += change
+                else:
+                    totals["transaction_expense"] += -change
+            elif row.change_type == BalanceChangeType.TRANSFER_IN:
+                totals["transfer_in"] += change
+            elif row.change_type == BalanceChangeType.TRANSFER_OUT:
+                totals["transfer_out"] += -change
+            else:
+                totals["other_change"] += change
+
+        for field, value in totals.items():
+            setattr(summary, field, Decimal(getattr(summary, field) or 0) + value)
+        summary.change_count = (summary.change_count or 0) + len(group)
+
+    def _archive_rows(
+        self,
+        user_id: int,
+        account_id: int,
+        period_start: date,
+        rows: List[AccountBalanceHistory]
+    ) -> tuple[str, str]:
+        """
+        生成归档文件的临时副本：已有内容加上归档中尚未出现的明细（按 _record_key 去重）
+
+        Returns:
+            (相对归档目录的文件路径, 临时文件路径)
+        """
+        key = period_start.isoformat() if self.period == HistorySummaryPeriod.DAY else period_start.strftime("%Y-%m")
+        relative_path = os.path.join(str(user_id), str(account_id), f"{key}.jsonl.gz")
+        file_path = os.path.join(self.archive_path, relative_path)
+        temp_path = file_path + ".tmp"
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        # 上次提交后未及替换的临时文件包含已删除明细，先恢复为正式文件；重复的明细随后去掉
+        if os.path.exists(temp_path):
+            os.replace(temp_path, file_path)
+
+        archived = set()
+        with gzip.open(temp_path, "wt", encoding="utf-8") as f:
+            for record in self._read_records(file_path):
+                if _record_key(record) not in archived:
+                    archived.add(_record_key(record))
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            for row in rows:
+                record = {
+                    "id": row.id,
+                    "user_id": row.user_id,
+                    "account_id": row.account_id,
+                    "transaction_id": row.transaction_id,
+                    "change_type": row.change_type.value if row.change_type else None,
+                    "amount_before": str(row.amount_before),
+                    "amount_after": str(row.amount_after),
+                    "change_amount": str(row.change_amount),
+                    "description": row.description,
+                    "reference_id": row.reference_id,
+                    "created_at": row.created_at.isoformat() if row.created_at else None
+                }
+                if _record_key(record) not in archived:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        return relative_path, temp_path
+
+    def read_archive(self, archive_file: str) -> List[Dict[str, Any]]:
+        """
+        读取归档文件中的原始明细
+
+        Args:
+            archive_file: 汇总行记录的归档文件路径
+
+        Returns:
+            明细记录列表
+        """
+        seen = set()
+        records = []
+        for record in self._read_records(os.path.join(self.archive_path, archive_file)):
+            if _record_key(record) not in seen:
+                seen.add(_record_key(record))
+                records.append(record)
+        return records
+
+    @staticmethod
+    def _read_records(file_path: str) -> List[Dict[str, Any]]:
+        """读取归档文件的全部行，文件不存在时为空"""
+        if not os.path.exists(file_path):
+            return []
+
+        with gzip.open(file_path, "rt", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,216 @@
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import select, func
+from typing import List, Dict, Any
+from datetime import datetime
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app.config.database import SessionLocal
+from app.models.user import User
+from app.models.account import Account
+from app.models.transaction import Transaction
+from app.models.account_balance_history import AccountBalanceHistory, BalanceChangeType
+from app.utils.ledger import ledger_legs
+from app.services.balance_drift_service import BalanceDriftService
+
+
+class BalanceReconciliationService:
+    """
+    账户余额对账服务
+
+    按账本口径（初始余额 + 全部交易分录）重新计算每个账户的余额，
+    与 Account.balance 比较并报告差异，可选通过 CORRECTION 余额历史修正。
+    """
+
+    def __init__(self, db: Session, session_factory: sessionmaker = SessionLocal):
+        self.db = db
+        self.session_factory = session_factory
+
+    def reconcile_user(self, user_id: int, fix: bool = False, tolerance: float = 0.01) -> Dict[str, Any]:
+        """
+        对账单个用户的全部账户
+
+        Args:
+            user_id: 用户ID
+            fix: 是否修正差异
+            tolerance: 容差（元）
+
+        Returns:
+            对账结果
+        """
+        return self._reconcile_users(self.db, [user_id], fix, tolerance)
+
+    def reconcile_all(
+        self,
+        fix: bool = False,
+        tolerance: float = 0.01,
+        chunk_size: int = 200,
+        max_workers: int = 4
+    ) -> Dict[str, Any]:
+        """
+        对账全部用户（按用户分块并行，每个分块独立会话和事务）
+
+        Args:
+            fix: 是否修正差异
+            tolerance: 容差（元）
+            chunk_size: 每个分块的用户数
+            max_workers: 并行线程数
+
+        Returns:
+            汇总结果
+        """
+        started_at = datetime.now()
+        user_ids = [row[0] for row in self.db.query(User.id).order_by(User.id).all()]
+        chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+
+        summary = {
+            "started_at": started_at.isoformat(),
+            "users_checked": 0,
+            "accounts_checked": 0,
+            "discrepancy_count": 0,
+            "fixed_count": 0,
+            "discrepancies": [],
+            "errors": []
+        }
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._reconcile_chunk, chunk, fix, tolerance): chunk
+                for chunk in chunks
+            }
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    summary["errors"].append({
+                        "user_ids": [chunk[0], chunk[-1]],
+                        "error": str(e)
+                    })
+                    continue
+
+                summary["users_checked"] += len(chunk)
+                summary["accounts_checked"] += result["accounts_checked"]
+                summary["discrepancy_count"] += len(result["discrepancies"])
+                summary["fixed_count"] += result["fixed_count"]
+                summary["discrepancies"].extend(result["discrepancies"])
+
+        summary["finished_at"] = datetime.now().isoformat()
+        return summary
+
+    def _reconcile_chunk(self, user_ids: List[int], fix: bool, tolerance: float) -> Dict[str, Any]:
+        """在独立会话中对账一个用户分块"""
+        db = self.session_factory()
+        try:
+            return self._reconcile_users(db, user_ids, fix, tolerance)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _reconcile_users(
+        self,
+        db: Session,
+        user_ids: List[int],
+        fix: bool,
+        tolerance: float
+    ) -> Dict[str, Any]:
+        """
+        对账一组用户：一次分组查询得到每个账户的账本余额
+
+        Args:
+            db: 数据库会话
+            user_ids: 用户ID列表
+            fix: 是否修正差异
+            tolerance: 容差（元）
+
+        Returns:
+            对账结果
+        """
+        legs = ledger_legs(Transaction.user_id.in_(user_ids))
+        deltas = (
+            select(legs.c.account_id, func.sum(legs.c.delta).label("delta"))
+            .group_by(legs.c.account_id)
+            .subquery("account_deltas")
+        )
+        rows = db.execute(
+            select(
+                Account.id,
+                Account.user_id,
+                Account.name,
+                Account.balance,
+                Account.initial_balance,
+                func.coalesce(deltas.c.delta, 0).label("delta")
+            )
+            .outerjoin(deltas, deltas.c.account_id == Account.id)
+            .where(Account.user_id.in_(user_ids))
+            .order_by(Account.id)
+        ).all()
+
+        discrepancies = []
+        threshold = Decimal(str(tolerance))
+        for row in rows:
+            actual = Decimal(row.balance or 0)
+            expected = Decimal(row.initial_balance or 0) + Decimal(row.delta)
+            difference = actual - expected
+            if abs(difference) > threshold:
+                discrepancies.append({
+                    "account_id": row.id,
+                    "user_id": row.user_id,
+                    "account_name": row.name,
+                    "actual_balance": float(actual),
+                    "expected_balance": float(expected),
+                    "difference": float(difference)
+                })
+
+        fixed_count = 0
+        if fix and discrepancies:
+            fixed_count = self._apply_corrections(db, discrepancies)
+
+        return {
+            "accounts_checked": len(rows),
+            "discrepancies": discrepancies,
+            "fixed_count": fixed_count
+        }
+
+    def _apply_corrections(self, db: Session, discrepancies: List[Dict[str, Any]]) -> int:
+        """
+        把账户余额修正为账本余额，并写入 CORRECTION 余额历史
+
+        按差额修正（而不是直接写入对账时的账本余额），对账期间并发写入的交易不会被覆盖。
+        """
+        reference_id = f"reconcile-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        accounts = {
+            account.id: account
+            for account in db.query(Account).filter(
+                Account.id.in_([item["account_id"] for item in discrepancies])
+            ).populate_existing().with_for_update().all()
+        }
+
+        histories = []
+        for item in discrepancies:
+            account = accounts.get(item["account_id"])
+            if not account:
+                continue
+
+            before = Decimal(account.balance or 0)
+            after = before - Decimal(str(item["difference"]))
+            account.balance = after
+            histories.append(AccountBalanceHistory(
+                user_id=account.user_id,
+                account_id=account.id,
+                change_type=BalanceChangeType.CORRECTION,
+                amount_before=before,
+                amount_after=after,
+                change_amount=after - before,
+                description="余额对账修正：按初始余额与交易记录重新计算",
+                reference_id=reference_id
+            ))
+
+        db.add_all(histories)
+        BalanceDriftService(db).realign({
+            history.account_id: history.amount_after for history in histories
+        })
+        db.commit()
+        return len(histories)
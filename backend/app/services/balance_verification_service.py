@@ -1,16 +1,16 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func, desc
+from sqlalchemy import and_, func, desc, select, case
 from typing import List, Optional, Dict
 from datetime import datetime, timedelta
 import json
 
 from app.models.account import Account
-from app.models.transaction import Transaction, TransactionType
+from app.models.transaction import Transaction
 from app.models.import_log import ImportLog
 from app.models.balance_verification import BalanceVerification, UserPreference
 from app.models.user import User
-from app.models.account_balance_history import AccountBalanceHistory
 from app.core.exceptions import NotFoundError, ValidationError
+from app.utils.ledger import ledger_legs
 
 class BalanceVerificationService:
     def __init__(self, db: Session):
@@ -24,6 +24,9 @@ class BalanceVerificationService:
         """
         导入后验证账户余额
 
+        受影响账户由本次导入的交易确定；每个账户的导入金额与账本余额
+        通过一次按账户分组的查询得到，不逐账户查询。
+
         Args:
             import_log_id: 导入日志ID
             tolerance: 容差范围
@@ -38,20 +41,16 @@ class BalanceVerificationService:
         if not import_log:
             raise NotFoundError("导入日志不存在")
 
-        # 获取导入期间影响的账户
-        affected_accounts = self._get_affected_accounts(import_log_id)
+        rows = self._get_import_balance_rows(import_log)
 
         verification_results = []
-        all_valid = True
-
-        for account in affected_accounts:
-            # 计算预期余额
-            expected_balance = self._calculate_expected_balance(
-                account.id, import_log.started_at
-            )
+        invalid_account_ids = []
+        verifications = {}
 
-            # 获取实际余额
-            actual_balance = float(account.balance)
+        for row in rows:
+            # 预期余额：初始余额 + 账本上全部交易的余额变化
+            expected_balance = float(row.initial_balance or 0) + float(row.ledger_net)
+            actual_balance = float(row.balance or 0)
 
             # 计算差异
             difference = abs(expected_balance - actual_balance)
@@ -61,7 +60,7 @@ class BalanceVerificationService:
             verification = BalanceVerification(
                 user_id=import_log.user_id,
                 import_log_id=import_log_id,
-                account_id=account.id,
+                account_id=row.id,
                 expected_balance=expected_balance,
                 actual_balance=actual_balance,
                 difference=difference,
@@ -69,145 +68,153 @@ class BalanceVerificationService:
                 tolerance=tolerance,
                 verification_method="import_check",
                 verification_details={
-                    "import_time": import_log.started_at.isoformat(),
+                    "import_time": import_log.started_at.isoformat() if import_log.started_at else None,
                     "tolerance": tolerance,
-                    "expected_calculation": self._get_balance_calculation_details(
-                        account.id, import_log.started_at
-                    )
+                    "expected_calculation": {
+                        "initial_balance": float(row.initial_balance or 0),
+                        "ledger_net_change": float(row.ledger_net),
+                        "import_transaction_count": row.import_count,
+                        "import_inflow": float(row.import_inflow),
+                        "import_outflow": float(row.import_outflow),
+                        "import_net_change": float(row.import_net),
+                        "calculated_at": datetime.now().isoformat()
+                    }
                 }
             )
-
-            self.db.add(verification)
+            verifications[row.id] = verification
 
             if not is_valid:
-                all_valid = False
-                # 添加不匹配详情
-                verification.mismatch_details = self._analyze_mismatch(
-                    account.id, expected_balance, actual_balance
-                )
+                invalid_account_ids.append(row.id)
 
             verification_results.append({
-                "account_id": account.id,
-                "account_name": account.name,
+                "account_id": row.id,
+                "account_name": row.name,
                 "expected_balance": expected_balance,
                 "actual_balance": actual_balance,
                 "difference": difference,
                 "is_valid": is_valid
             })
 
+        # 不匹配账户的近期交易一次批量取出
+        if invalid_account_ids:
+            recent = self._get_recent_transactions(invalid_account_ids)
+            for account_id in invalid_account_ids:
+                verification = verifications[account_id]
+                verification.mismatch_details = self._analyze_mismatch(
+                    verification.expected_balance,
+                    verification.actual_balance,
+                    recent.get(account_id, [])
+                )
+
+        self.db.add_all(verifications.values())
         self.db.commit()
 
         return {
             "import_log_id": import_log_id,
             "verification_time": datetime.now().isoformat(),
             "tolerance": tolerance,
-            "all_valid": all_valid,
-            "affected_accounts": len(affected_accounts),
+            "all_valid": not invalid_account_ids,
+            "affected_accounts": len(rows),
             "results": verification_results,
-            "invalid_count": len([r for r in verification_results if not r["is_valid"]])
+            "invalid_count": len(invalid_account_ids)
         }
 
-    def _get_affected_accounts(self, import_log_id: int) -> List[Account]:
+    def _get_import_balance_rows(self, import_log: ImportLog) -> list:
         """
-        获取受导入影响的账户
+        按账户汇总本次导入的交易，并附带账户的账本余额（一次查询）
 
         Args:
-            import_log_id: 导入日志ID
+            import_log: 导入日志
 
         Returns:
-            账户列表
+            每个受影响账户一行：账户信息、导入笔数/流入/流出/净额、账本净变化
         """
-        # 这里简化处理，实际应该根据导入的交易记录来确定影响的账户
-        # 返回所有启用账户作为默认
-        return self.db.query(Account).filter(
-            Account.is_enabled == True
+        imported_legs = ledger_legs(Transaction.import_log_id == import_log.id)
+        imported = select(
+            imported_legs.c.account_id,
+            func.count().label("import_count"),
+            func.sum(case((imported_legs.c.delta > 0, imported_legs.c.delta), else_=0)).label("import_inflow"),
+            func.sum(case((imported_legs.c.delta < 0, -imported_legs.c.delta), else_=0)).label("import_outflow"),
+            func.sum(imported_legs.c.delta).label("import_net")
+        ).group_by(imported_legs.c.account_id).subquery("imported")
+
+        all_legs = ledger_legs(Transaction.user_id == import_log.user_id)
+        ledger = select(
+            all_legs.c.account_id,
+            func.sum(all_legs.c.delta).label("ledger_net")
+        ).group_by(all_legs.c.account_id).subquery("ledger")
+
+        return self.db.execute(
+            select(
+                Account.id,
+                Account.name,
+                Account.balance,
+                Account.initial_balance,
+                imported.c.import_count,
+                imported.c.import_inflow,
+                imported.c.import_outflow,
+                imported.c.import_net,
+                func.coalesce(ledger.c.ledger_net, 0).label("ledger_net")
+            )
+            .join(imported, imported.c.account_id == Account.id)
+            .outerjoin(ledger, ledger.c.account_id == Account.id)
+            .order_by(Account.id)
         ).all()
 
-    def _calculate_expected_balance(
-        self,
-        account_id: int,
-        import_time: datetime
-    ) -> float:
-        """
-        计算预期余额
-
-        Args:
-            account_id: 账户ID
-            import_time: 导入时间
-
-        Returns:
-            预期余额
-        """
-        # 获取导入前的余额历史
-        last_balance_before_import = self.db.query(func.max(
-            AccountBalanceHistory.amount_after
-        )).filter(
-            AccountBalanceHistory.account_id == account_id,
-            AccountBalanceHistory.created_at < import_time
-        ).scalar()
-
-        if last_balance_before_import is not None:
-            return float(last_balance_before_import)
-
-        # 如果没有历史记录，使用账户初始余额
-        account = self.db.query(Account).filter(
-            Account.id == account_id
-        ).first()
-
-        return float(account.initial_balance) if account else 0.0
-
-    def _get_balance_calculation_details(
-        self,
-        account_id: int,
-        import_time: datetime
-    ) -> Dict:
+    def _get_recent_transactions(self, account_ids: List[int], days: int = 7, limit: int = 10) -> Dict[int, List[Dict]]:
         """
-        获取余额计算详情
+        批量获取多个账户最近的交易（每个账户最多 limit 条）
 
         Args:
-            account_id: 账户ID
-            import_time: 导入时间
+            account_ids: 账户ID列表
+            days: 最近天数
+            limit: 每个账户条数
 
         Returns:
-            计算详情
+            账户ID -> 交易列表
         """
-        # 获取导入时间点前的所有相关交易
-        transactions = self.db.query(Transaction).filter(
-            Transaction.account_id == account_id,
-            Transaction.transaction_date < import_time
-        ).order_by(
-            Transaction.transaction_date.desc()
-        ).all()
-
-        income_total = sum(
-            t.amount for t in transactions if t.type == TransactionType.INCOME
-        )
-        expense_total = sum(
-            t.amount for t in transactions if t.type == TransactionType.EXPENSE
-        )
-
-        return {
-            "transaction_count": len(transactions),
-            "income_total": income_total,
-            "expense_total": expense_total,
-            "net_change": income_total - expense_total,
-            "initial_balance": 0.0,  # 需要从账户历史中获取
-            "calculated_at": datetime.now().isoformat()
-        }
+        row_number = func.row_number().over(
+            partition_by=Transaction.account_id,
+            order_by=Transaction.transaction_date.desc()
+        ).label("row_number")
+        ranked = select(
+            Transaction.account_id,
+            Transaction.transaction_date,
+            Transaction.type,
+            Transaction.amount,
+            Transaction.merchant_name,
+            row_number
+        ).where(
+            Transaction.account_id.in_(account_ids),
+            Transaction.transaction_date >= datetime.now() - timedelta(days=days)
+        ).subquery("ranked")
+
+        recent: Dict[int, List[Dict]] = {}
+        for row in self.db.execute(
+            select(ranked).where(ranked.c.row_number <= limit)
+            .order_by(ranked.c.account_id, ranked.c.transaction_date.desc())
+        ).all():
+            recent.setdefault(row.account_id, []).append({
+                "date": row.transaction_date.isoformat(),
+                "type": row.type,
+                "amount": float(row.amount),
+                "merchant": row.merchant_name
+            })
+        return recent
 
     def _analyze_mismatch(
         self,
-        account_id: int,
         expected_balance: float,
-        actual_balance: float
+        actual_balance: float,
+        recent_transactions: List[Dict]
     ) -> List[Dict]:
         """
         分析余额不匹配的原因
 
         Args:
-            account_id: 账户ID
             expected_balance: 预期余额
             actual_balance: 实际余额
+            recent_transactions: 该账户最近的交易
 
         Returns:
             不匹配详情列表
@@ -242,26 +249,12 @@ class BalanceVerificationService:
                     ]
                 })
 
-            # 检查最近的交易记录
-            recent_transactions = self.db.query(Transaction).filter(
-                Transaction.account_id == account_id,
-                Transaction.transaction_date >= datetime.now() - timedelta(days=7)
-            ).order_by(
-                Transaction.transaction_date.desc()
-            ).limit(10).all()
-
+            # 最近的交易记录
             if recent_transactions:
                 mismatches.append({
                     "type": "recent_transactions_review",
                     "description": "建议检查最近7天的交易记录",
-                    "recent_transactions": [
-                        {
-                            "date": t.transaction_date.isoformat(),
-                            "type": t.type,
-                            "amount": float(t.amount),
-                            "merchant": t.merchant_name
-                        } for t in recent_transactions
-                    ]
+                    "recent_transactions": recent_transactions
                 })
 
         return mismatches
@@ -337,7 +330,9 @@ class BalanceVerificationService:
         """
         start_date = datetime.now() - timedelta(days=days)
 
-        verifications = self.db.query(BalanceVerification).filter(
+        rows = self.db.query(BalanceVerification, Account.name).outerjoin(
+            Account, Account.id == BalanceVerification.account_id
+        ).filter(
             BalanceVerification.user_id == user_id,
             BalanceVerification.created_at >= start_date
         ).order_by(
@@ -345,14 +340,10 @@ class BalanceVerificationService:
         ).all()
 
         history = []
-        for verification in verifications:
-            account = self.db.query(Account).filter(
-                Account.id == verification.account_id
-            ).first()
-
+        for verification, account_name in rows:
             history.append({
                 "id": verification.id,
-                "account_name": account.name if account else "Unknown",
+                "account_name": account_name or "Unknown",
                 "expected_balance": verification.expected_balance,
                 "actual_balance": verification.actual_balance,
                 "difference": verification.difference,
@@ -0,0 +1,461 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, extract, and_, or_
+from typing import List, Dict, Tuple, Any, Iterable, Optional
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from collections import defaultdict
+import calendar
+import numpy as np
+
+from app.models.budget import Budget, PeriodType
+from app.models.transaction import Transaction, TransactionType
+from app.models.category import CategoryClosure
+from app.core.events import queue_event
+from app.services.category_closure_service import CategoryClosureService
+
+# 预警状态严重程度，状态升级时才推送预警
+STATUS_LEVELS = {"normal": 0, "warning": 1, "exceeded": 2}
+
+# 预测时当月节奏相对历史的缩放范围，避免月初少量数据导致极端外推
+PACE_RATIO_RANGE = (0.5, 2.0)
+
+
+def budget_period_range(budget: Budget) -> Tuple[datetime, datetime]:
+    """返回预算周期的开始时间（含）和结束时间（不含）"""
+    if budget.period_type == PeriodType.MONTHLY and budget.month:
+        start_date = datetime(budget.year, budget.month, 1)
+        if budget.month == 12:
+            end_date = datetime(budget.year + 1, 1, 1)
+        else:
+            end_date = datetime(budget.year, budget.month + 1, 1)
+    else:  # YEARLY
+        start_date = datetime(budget.year, 1, 1)
+        end_date = datetime(budget.year + 1, 1, 1)
+    return start_date, end_date
+
+
+def calculate_percentage(actual: Decimal, budget: Decimal) -> float:
+    """计算预算使用百分比"""
+    if budget == 0:
+        return 0.0
+    return round(float(actual / budget * 100), 2)
+
+
+def get_budget_status(percentage: float, alert_threshold: int) -> str:
+    """获取预算状态"""
+    if percentage >= 100:
+        return "exceeded"  # 超支
+    elif percentage >= alert_threshold:
+        return "warning"    # 预警
+    else:
+        return "normal"     # 正常
+
+
+class BudgetService:
+    """
+    预算执行计算
+
+    一批预算的实际支出由一次分组查询得到：按用户、分类、年、月汇总支出，
+    分类预算经分类闭包表包含整棵子树（父分类预算计入子分类支出），
+    总预算（category_id 为空）取该用户全部分类，年度预算再把十二个月相加。
+
+    每个预算另有消费计数器（spent_amount / alert_status），由交易写入钩子
+    在同一事务中累加；状态升级为预警或超支时登记推送事件，提交后发给客户端。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_spending(self, budgets: Iterable[Budget]) -> Dict[int, Decimal]:
+        """
+        计算一批预算各自的实际支出
+
+        Args:
+            budgets: 预算列表
+
+        Returns:
+            预算ID -> 实际支出
+        """
+        budgets = list(budgets)
+        if not budgets:
+            return {}
+
+        ranges = [budget_period_range(budget) for budget in budgets]
+        by_category, overall = self._grouped_spending(
+            budgets,
+            min(start for start, _ in ranges),
+            max(end for _, end in ranges)
+        )
+
+        spending = {}
+        for budget in budgets:
+            if budget.period_type == PeriodType.MONTHLY and budget.month:
+                months = [budget.month]
+            else:
+                months = range(1, 13)
+            if budget.category_id:
+                total = sum(
+                    (by_category[(budget.user_id, budget.category_id, budget.year, month)] for month in months),
+                    Decimal("0")
+                )
+            else:
+                total = sum(
+                    (overall[(budget.user_id, budget.year, month)] for month in months),
+                    Decimal("0")
+                )
+            spending[budget.id] = total
+
+        return spending
+
+    def _grouped_spending(
+        self,
+        budgets: List[Budget],
+        start: datetime,
+        end: datetime,
+        by_day: bool = False
+    ) -> Tuple[Dict[tuple, Decimal], Dict[tuple, Decimal]]:
+        """
+        一次分组查询汇总预算涉及的支出，分类通过闭包表汇总到预算分类（含子分类）
+
+        交易按 category_closure 外连接到预算分类的祖先行：同一交易可能同时计入
+        父分类和祖父分类的预算；没有预算祖先的交易只用于总预算。
+
+        Returns:
+            ({(用户, 预算分类, 年, 月[, 日]): 支出}, {(用户, 年, 月[, 日]): 全部分类支出})
+        """
+        user_ids = {budget.user_id for budget in budgets}
+        budget_categories = {budget.category_id for budget in budgets if budget.category_id}
+        has_total = any(budget.category_id is None for budget in budgets)
+
+        period_columns = [
+            extract("year", Transaction.transaction_date),
+            extract("month", Transaction.transaction_date)
+        ]
+        if by_day:
+            period_columns.append(extract("day", Transaction.transaction_date))
+
+        query = self.db.query(
+            Transaction.user_id,
+            Transaction.category_id,
+            CategoryClosure.ancestor_id,
+            *period_columns,
+            func.sum(Transaction.amount)
+        ).outerjoin(
+            CategoryClosure,
+            and_(
+                CategoryClosure.descendant_id == Transaction.category_id,
+                CategoryClosure.ancestor_id.in_(budget_categories)
+            )
+        ).filter(
+            Transaction.type == TransactionType.EXPENSE,
+            Transaction.user_id.in_(user_ids),
+            Transaction.transaction_date >= start,
+            Transaction.transaction_date < end
+        )
+        # 没有总预算时只需要预算分类子树内的支出
+        if not has_total:
+            query = query.filter(CategoryClosure.ancestor_id.isnot(None))
+
+        by_category: Dict[tuple, Decimal] = defaultdict(Decimal)
+        overall: Dict[tuple, Decimal] = defaultdict(Decimal)
+        counted = set()
+        for user_id, category_id, ancestor_id, *period, amount in query.group_by(
+            Transaction.user_id, Transaction.category_id, CategoryClosure.ancestor_id, *period_columns
+        ).all():
+            period = tuple(int(value) for value in period)
+            amount = Decimal(amount or 0)
+            if ancestor_id is not None:
+                by_category[(user_id, ancestor_id, *period)] += amount
+            # 多个预算祖先会产生重复行，总支出每个分类只计一次
+            if (user_id, category_id, period) not in counted:
+                counted.add((user_id, category_id, period))
+                overall[(user_id, *period)] += amount
+
+        return by_category, overall
+
+    def evaluate(self, budgets: Iterable[Budget]) -> List[Dict[str, Any]]:
+        """
+        计算一批预算的执行情况
+
+        Args:
+            budgets: 预算列表
+
+        Returns:
+            每个预算的实际支出、剩余、使用百分比和状态（与输入顺序一致）
+        """
+        budgets = list(budgets)
+        spending = self.get_spending(budgets)
+
+        results = []
+        for budget in budgets:
+            actual_spending = spending.get(budget.id, Decimal("0"))
+            percentage = calculate_percentage(actual_spending, budget.amount)
+            results.append({
+                "budget": budget,
+                "actual_spending": actual_spending,
+                "remaining": budget.amount - actual_spending,
+                "percentage": percentage,
+                "status": get_budget_status(percentage, budget.alert_threshold)
+            })
+        return results
+
+    def forecast(
+        self,
+        budgets: Iterable[Budget],
+        year: int,
+        month: int,
+        history_months: int = 3,
+        today: Optional[date] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        预测月度预算的月末支出及超支日期
+
+        一次分组查询取出本月和前 N 个月按日的支出，用 NumPy 一次性为全部预算构造
+        日支出矩阵：历史月份的平均累计曲线给出剩余天数的支出节奏，再按本月
+        至今支出与历史同期的比例缩放；没有历史数据时按本月日均支出外推。
+
+        Args:
+            budgets: 预算列表（仅处理该月的月度预算）
+            year: 年份
+            month: 月份
+            history_months: 参考的历史月份数
+            today: 当前日期，默认今天
+
+        Returns:
+            每个预算的预测结果
+        """
+        budgets = [
+            budget for budget in budgets
+            if budget.period_type == PeriodType.MONTHLY and budget.year == year and budget.month == month
+        ]
+        if not budgets:
+            return []
+
+        today = today or date.today()
+        days_in_month = calendar.monthrange(year, month)[1]
+        if (today.year, today.month) > (year, month):
+            elapsed = days_in_month
+        elif (today.year, today.month) < (year, month):
+            elapsed = 0
+        else:
+            elapsed = today.day
+
+        # 月份序号：0..N-1 为历史月份，N 为预测月份
+        month_keys = []
+        for offset in range(history_months, -1, -1):
+            index = year * 12 + (month - 1) - offset
+            month_keys.append((index // 12, index % 12 + 1))
+        month_index = {key: i for i, key in enumerate(month_keys)}
+        start = datetime(*month_keys[0], 1)
+        # 本月只取已过去的天数
+        cutoff = datetime(year, month, 1) + timedelta(days=elapsed)
+
+        by_category, overall = self._grouped_spending(budgets, start, cutoff, by_day=True)
+        rows = [(user_id, category_id, *period, amount) for (user_id, category_id, *period), amount in by_category.items()]
+        rows += [(user_id, -1, *period, amount) for (user_id, *period), amount in overall.items()]
+
+        # 支出矩阵：(用户, 分类) x 月份 x 日，分类已包含子分类，-1 表示全部分类
+        keys = sorted({(row[0], row[1]) for row in rows})
+        key_index = {key: i for i, key in enumerate(keys)}
+        daily = np.zeros((len(keys), len(month_keys), 31))
+        if rows:
+            np.add.at(
+                daily,
+                (
+                    np.array([key_index[(row[0], row[1])] for row in rows]),
+                    np.array([month_index[(row[2], row[3])] for row in rows]),
+                    np.array([row[4] - 1 for row in rows])
+                ),
+                np.array([float(row[5]) for row in rows])
+            )
+
+        # 预算 x (用户, 分类) 的归属矩阵
+        key_users = np.array([key[0] for key in keys], dtype=np.int64)
+        key_categories = np.array([key[1] for key in keys], dtype=np.int64)
+        budget_users = np.array([budget.user_id or 0 for budget in budgets], dtype=np.int64)
+        budget_categories = np.array([budget.category_id or -1 for budget in budgets], dtype=np.int64)
+        membership = (key_users[None, :] == budget_users[:, None]) & (
+            key_categories[None, :] == budget_categories[:, None]
+        )
+        series = np.tensordot(membership.astype(float), daily, axes=1)
+
+        history = np.cumsum(series[:, :history_months, :], axis=2)
+        history_totals = history[:, :, -1]
+        used = history_totals > 0
+        used_count = used.sum(axis=1)
+        profile = (history * used[:, :, None]).sum(axis=1) / np.maximum(used_count, 1)[:, None]
+
+        current = np.cumsum(series[:, history_months, :days_in_month], axis=1)
+        spent = current[:, elapsed - 1] if elapsed else np.zeros(len(budgets))
+        profile_today = profile[:, elapsed - 1] if elapsed else np.zeros(len(budgets))
+        pace = np.where(
+            profile_today > 0,
+            np.clip(spent / np.where(profile_today > 0, profile_today, 1), *PACE_RATIO_RANGE),
+            1.0
+        )
+
+        days = np.arange(1, days_in_month + 1)
+        from_history = spent[:, None] + pace[:, None] * (profile[:, :days_in_month] - profile_today[:, None])
+        run_rate = spent / elapsed if elapsed else np.zeros(len(budgets))
+        from_run_rate = spent[:, None] + run_rate[:, None] * (days - elapsed)[None, :]
+        has_history = used_count > 0
+        projected = np.where(has_history[:, None], from_history, from_run_rate)
+        projected = np.where(days[None, :] <= elapsed, current, projected)
+
+        amounts = np.array([float(budget.amount) for budget in budgets])
+        over = projected > amounts[:, None]
+        overrun_day = np.where(over.any(axis=1), over.argmax(axis=1) + 1, 0)
+
+        results = []
+        for i, budget in enumerate(budgets):
+            month_end = float(round(projected[i, -1], 2))
+            results.append({
+                "id": budget.id,
+                "category_id": budget.category_id,
+                "category_name": budget.category.name if budget.category else "总预算",
+                "budget_amount": float(budget.amount),
+                "actual_spending": float(round(spent[i], 2)),
+                "projected_spending": month_end,
+                "projected_remaining": round(float(budget.amount) - month_end, 2),
+                "projected_percentage": calculate_percentage(Decimal(str(month_end)), budget.amount),
+                "overrun_date": date(year, month, int(overrun_day[i])).isoformat() if overrun_day[i] else None,
+                "already_exceeded": bool(overrun_day[i] and overrun_day[i] <= elapsed),
+                "method": "history" if has_history[i] else "run_rate",
+                "history_months_used": int(used_count[i])
+            })
+
+        results.sort(key=lambda x: x["projected_percentage"], reverse=True)
+        return results
+
+    def refresh_counters(self, budgets: Iterable[Budget]) -> None:
+        """
+        按交易数据重新计算预算消费计数器（不提交，不推送预警）
+
+        Args:
+            budgets: 预算列表
+        """
+        budgets = list(budgets)
+        spending = self.get_spending(budgets)
+        for budget in budgets:
+            budget.spent_amount = spending.get(budget.id, Decimal("0"))
+            budget.alert_status = self._counter_status(budget)
+
+    def refresh_status(self, budget: Budget) -> None:
+        """预算金额或阈值变化后按计数器重新判定状态（不提交）"""
+        budget.alert_status = self._counter_status(budget)
+
+    def apply_changes(self, added: Iterable = (), removed: Iterable = ()) -> int:
+        """
+        在调用方事务中按支出交易变化累加预算计数器（不提交）
+
+        Args:
+            added: 新增（或修改后）的交易
+            removed: 删除（或修改前快照）的交易
+
+        Returns:
+            登记的预警数量
+        """
+        # (用户, 分类, 年, 月) -> 支出变化
+        deltas: Dict[tuple, Decimal] = defaultdict(Decimal)
+        for sign, transactions in ((1, added), (-1, removed)):
+            for transaction in transactions:
+                if transaction.type != TransactionType.EXPENSE:
+                    continue
+                day = transaction.transaction_date or datetime.now()
+                key = (transaction.user_id, transaction.category_id, day.year, day.month)
+                deltas[key] += Decimal(str(transaction.amount or 0)) * sign
+
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+
+        # 交易分类 -> 祖先分类（含自身），父分类预算同样计入
+        ancestors = CategoryClosureService(self.db).get_ancestors(key[1] for key in deltas)
+        budget_categories = set().union(*ancestors.values()) if ancestors else set()
+        budgets = self.db.query(Budget).filter(
+            Budget.user_id.in_({key[0] for key in deltas}),
+            Budget.year.in_({key[2] for key in deltas}),
+            or_(Budget.category_id.is_(None), Budget.category_id.in_(budget_categories))
+        ).populate_existing().with_for_update().all()
+
+        alerts = 0
+        for budget in budgets:
+            delta = sum(
+                (
+                    value for (user_id, category_id, year, month), value in deltas.items()
+                    if user_id == budget.user_id
+                    and year == budget.year
+                    and (budget.category_id is None or budget.category_id in ancestors.get(category_id, ()))
+                    and (budget.period_type != PeriodType.MONTHLY or not budget.month or month == budget.month)
+                ),
+                Decimal("0")
+            )
+            if not delta:
+                continue
+
+            previous_status = budget.alert_status or "normal"
+            budget.spent_amount = Decimal(budget.spent_amount or 0) + delta
+            budget.alert_status = self._counter_status(budget)
+            if budget.is_enabled and STATUS_LEVELS[budget.alert_status] > STATUS_LEVELS.get(previous_status, 0):
+                queue_event(self.db, budget.user_id, self._alert_payload(budget, previous_status))
+                alerts += 1
+
+        return alerts
+
+    def get_alerts(self, user_id: Optional[int] = None, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        读取当前周期处于预警或超支状态的预算（直接读取计数器）
+
+        Args:
+            user_id: 仅返回指定用户
+            now: 当前时间
+
+        Returns:
+            预警列表，按使用百分比降序
+        """
+        now = now or datetime.now()
+        query = self.db.query(Budget).filter(
+            Budget.year == now.year,
+            or_(
+                (Budget.month == now.month) & (Budget.period_type == PeriodType.MONTHLY),
+                Budget.period_type == PeriodType.YEARLY
+            ),
+            Budget.is_enabled == True,
+            Budget.alert_status.in_(["warning", "exceeded"])
+        )
+        if user_id:
+            query = query.filter(Budget.user_id == user_id)
+
+        alerts = [self._alert_entry(budget) for budget in query.all()]
+        alerts.sort(key=lambda x: x["percentage"], reverse=True)
+        return alerts
+
+    def _counter_status(self, budget: Budget) -> str:
+        percentage = calculate_percentage(Decimal(budget.spent_amount or 0), budget.amount)
+        return get_budget_status(percentage, budget.alert_threshold if budget.alert_threshold is not None else 80)
+
+    def _alert_entry(self, budget: Budget) -> Dict[str, Any]:
+        spent = Decimal(budget.spent_amount or 0)
+        return {
+            "id": budget.id,
+            "category_id": budget.category_id,
+            "category_name": budget.category.name if budget.category else "总预算",
+            "budget_amount": float(budget.amount),
+            "actual_spending": float(spent),
+            "percentage": calculate_percentage(spent, budget.amount),
+            "status": budget.alert_status,
+            "remaining": float(budget.amount - spent),
+            "alert_threshold": budget.alert_threshold,
+            "period_type": budget.period_type.value,
+            "year": budget.year,
+            "month": budget.month
+        }
+
+    def _alert_payload(self, budget: Budget, previous_status: str) -> Dict[str, Any]:
+        payload = self._alert_entry(budget)
+        payload.update({
+            "event": "budget_alert",
+            "previous_status": previous_status,
+            "triggered_at": datetime.now().isoformat()
+        })
+        return payload
@@ -0,0 +1,148 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, literal, or_
+from typing import Dict, Set, Iterable, Optional
+
+from app.models.category import Category, CategoryClosure
+
+
+class CategoryClosureService:
+    """
+    分类闭包表维护
+
+    category_closure 为每个分类保存自身（depth=0）及全部祖先的行，
+    汇总父分类时只需按 ancestor_id 连接一次，不必沿 parent_id 逐层递归。
+    分类创建、移动、删除时由 CategoryService 调用对应方法同步维护。
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def add_category(self, category: Category) -> None:
+        """
+        为新分类写入闭包行（不提交）
+
+        Args:
+            category: 已 flush 的新分类
+        """
+        self.db.add(CategoryClosure(ancestor_id=category.id, descendant_id=category.id, depth=0))
+        if category.parent_id:
+            self.db.flush()
+            self.db.execute(
+                insert(CategoryClosure).from_select(
+                    ["ancestor_id", "descendant_id", "depth"],
+                    select(
+                        CategoryClosure.ancestor_id,
+                        literal(category.id),
+                        CategoryClosure.depth + 1
+                    ).where(CategoryClosure.descendant_id == category.parent_id)
+                )
+            )
+
+    def move_category(self, category_id: int, new_parent_id: Optional[int]) -> None:
+        """
+        分类更换父分类后，移动其整棵子树的闭包行（不提交）
+
+        先删除子树与原祖先之间的行，再写入新父分类的祖先与子树的笛卡尔积。
+        调用方需保证新父分类不在该分类的子树中。
+
+        Args:
+            category_id: 被移动的分类ID
+            new_parent_id: 新父分类ID，None 表示移到顶层
+        """
+        subtree = self.get_descendants(category_id)
+        old_ancestors = [
+            row[0] for row in self.db.query(CategoryClosure.ancestor_id).filter(
+                CategoryClosure.descendant_id == category_id,
+                CategoryClosure.depth > 0
+            ).all()
+        ]
+        if old_ancestors:
+            self.db.query(CategoryClosure).filter(
+                CategoryClosure.descendant_id.in_(list(subtree)),
+                CategoryClosure.ancestor_id.in_(old_ancestors)
+            ).delete(synchronize_session=False)
+
+        if new_parent_id is None:
+            return
+        new_ancestors = self.db.query(CategoryClosure.ancestor_id, CategoryClosure.depth).filter(
+            CategoryClosure.descendant_id == new_parent_id
+        ).all()
+        rows = [
+            {"ancestor_id": ancestor_id, "descendant_id": descendant_id, "depth": ancestor_depth + depth + 1}
+            for ancestor_id, ancestor_depth in new_ancestors
+            for descendant_id, depth in subtree.items()
+        ]
+        for i in range(0, len(rows), 1000):
+            self.db.execute(insert(CategoryClosure), rows[i:i + 1000])
+
+    def remove_category(self, category_id: int) -> None:
+        """
+        删除分类的闭包行（不提交，数据库外键级联之外的显式清理）
+
+        Args:
+            category_id: 分类ID
+        """
+        self.db.query(CategoryClosure).filter(
+            or_(CategoryClosure.ancestor_id == category_id, CategoryClosure.descendant_id == category_id)
+        ).delete(synchronize_session=False)
+
+    def rebuild(self) -> int:
+        """
+        按 parent_id 重建整张闭包表（不提交）
+
+        Returns:
+            写入的行数
+        """
+        parents = dict(self.db.query(Category.id, Category.parent_id).all())
+
+        rows = []
+        for category_id in parents:
+            # 沿父链向上，遇到缺失或成环的父分类即停止
+            seen = set()
+            current, depth = category_id, 0
+            while current is not None and current in parents and current not in seen:
+                seen.add(current)
+                rows.append({"ancestor_id": current, "descendant_id": category_id, "depth": depth})
+                current, depth = parents[current], depth + 1
+
+        self.db.query(CategoryClosure).delete(synchronize_session=False)
+        for i in range(0, len(rows), 1000):
+            self.db.execute(insert(CategoryClosure), rows[i:i + 1000])
+        return len(rows)
+
+    def get_ancestors(self, category_ids: Iterable[Optional[int]]) -> Dict[int, Set[int]]:
+        """
+        查询分类的祖先集合（包含自身）
+
+        Args:
+            category_ids: 分类ID列表
+
+        Returns:
+            分类ID -> 祖先分类ID集合
+        """
+        category_ids = {category_id for category_id in category_ids if category_id is not None}
+        ancestors: Dict[int, Set[int]] = {category_id: {category_id} for category_id in category_ids}
+        if not category_ids:
+            return ancestors
+
+        for descendant_id, ancestor_id in self.db.query(
+            CategoryClosure.descendant_id, CategoryClosure.ancestor_id
+        ).filter(CategoryClosure.descendant_id.in_(category_ids)).all():
+            ancestors[descendant_id].add(ancestor_id)
+        return ancestors
+
+    def get_descendants(self, category_id: int) -> Dict[int, int]:
+        """
+        查询分类的子树（包含自身）
+
+        Args:
+            category_id: 分类ID
+
+        Returns:
+            后代分类ID -> 层级距离
+        """
+        descendants = dict(self.db.query(CategoryClosure.descendant_id, CategoryClosure.depth).filter(
+            CategoryClosure.ancestor_id == category_id
+        ).all())
+        descendants.setdefault(category_id, 0)
+        return descendants
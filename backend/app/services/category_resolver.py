@@ -0,0 +1,147 @@
+"""
+分类解析
+
+分类按名称和类型的查找在智能分类、导入、规则建议中逐行发生。CategoryResolver
+一次加载全部分类并按 (名称, 类型) 建立索引，之后的查找都在内存中完成。
+解析器按会话和用户缓存在 session.info 中，同一导入批次内共享；任何会话提交了
+分类写入后全局版本号递增，各解析器在下一次查找时重新加载。
+"""
+
+import itertools
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.category import Category, CategoryType
+from app.models.transaction import TransactionType
+
+RESOLVERS_KEY = "category_resolvers"
+
+_version_lock = threading.Lock()
+_version_counter = itertools.count(1)
+_category_version = 0
+
+
+def invalidate_category_resolvers() -> None:
+    """分类写入提交后调用，使所有解析器在下一次查找时重新加载"""
+    global _category_version
+    with _version_lock:
+        _category_version = next(_version_counter)
+
+
+class CategoryResolver:
+    """按名称/类型/ID 在内存中查找分类"""
+
+    def __init__(self, db: Session, user_id: Optional[int] = None):
+        self.db = db
+        self.user_id = user_id
+        self._version: Optional[int] = None
+        self._by_id: Dict[int, Category] = {}
+        self._by_name: Dict[Tuple[str, CategoryType], Category] = {}
+        self._ordered: List[Category] = []
+
+    @classmethod
+    def for_session(cls, db: Session, user_id: Optional[int] = None) -> "CategoryResolver":
+        """
+        获取会话内共享的解析器
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+
+        Returns:
+            解析器
+        """
+        resolvers = db.info.setdefault(RESOLVERS_KEY, {})
+        resolver = resolvers.get(user_id)
+        if resolver is None:
+            resolver = resolvers[user_id] = cls(db, user_id)
+        return resolver
+
+    def _ensure_loaded(self) -> None:
+        if self._version == _category_version:
+            return
+        version = _category_version
+
+        # 分类是系统级的,没有user_id字段；同名同类型时用户自建分类优先于系统分类
+        categories = self.db.query(Category).order_by(
+            Category.is_system.asc(),
+            Category.sort_order.asc(),
+            Category.id.asc()
+        ).all()
+
+        self._by_id = {category.id: category for category in categories}
+        self._by_name = {}
+        for category in categories:
+            self._by_name.setdefault((category.name, category.type), category)
+        self._ordered = categories
+        self._version = version
+
+    def get(self, category_id: Optional[int]) -> Optional[Category]:
+        """按ID查找分类"""
+        if category_id is None:
+            return None
+        self._ensure_loaded()
+        return self._by_id.get(category_id)
+
+    def find(self, name: str, category_type: CategoryType) -> Optional[Category]:
+        """
+        按名称和类型查找分类
+
+        Args:
+            name: 分类名称
+            category_type: 分类类型
+
+        Returns:
+            分类，不存在时为 None
+        """
+        self._ensure_loaded()
+        return self._by_name.get((name, CategoryType(category_type)))
+
+    def find_first(self, names: Iterable[str], category_type: CategoryType) -> Optional[Category]:
+        """按顺序返回第一个存在的分类"""
+        for name in names:
+            category = self.find(name, category_type)
+            if category:
+                return category
+        return None
+
+    def find_containing(
+        self,
+        fragments: Iterable[str],
+        category_type: Optional[CategoryType] = None
+    ) -> Optional[Category]:
+        """
+        查找名称包含任一片段的分类
+
+        Args:
+            fragments: 名称片段
+            category_type: 分类类型，None 表示不限
+
+        Returns:
+            第一个匹配的分类
+        """
+        self._ensure_loaded()
+        fragments = [fragment.lower() for fragment in fragments]
+        for category in self._ordered:
+            if category_type is not None and category.type != category_type:
+                continue
+            name = (category.name or "").lower()
+            if any(fragment in name for fragment in fragments):
+                return category
+        return None
+
+    def get_default(self, transaction_type: TransactionType) -> Optional[Category]:
+        """
+        获取导入时未匹配到分类的默认分类
+
+        Args:
+            transaction_type: 交易类型
+
+        Returns:
+            “其他支出/其他收入”，没有时取同类型的“其他”
+        """
+        if transaction_type == TransactionType.EXPENSE:
+            return self.find_first(["其他支出", "其他"], CategoryType.EXPENSE)
+        return self.find_first(["其他收入", "其他"], CategoryType.INCOME)
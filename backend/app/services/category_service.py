@@ -1,12 +1,42 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, desc
-from typing import Optional, List
+from sqlalchemy import func, desc, event
+from typing import Optional, List, Dict, Any
 from decimal import Decimal
 
-from app.models.category import Category, CategoryType
+from app.models.category import Category, CategoryType, CategoryClosure
 from app.models.transaction import Transaction, TransactionType
+from app.models.budget import Budget
 from app.schemas.category import CategoryCreate, CategoryUpdate, CategoryWithStats
 from app.core.exceptions import ValidationError, NotFoundError
+from app.core.cache import TTLCache
+from app.services.category_closure_service import CategoryClosureService
+from app.services.category_resolver import invalidate_category_resolvers
+from app.services.budget_service import BudgetService
+
+CATEGORY_WRITES_KEY = "category_writes"
+
+
+# 分类树缓存：当前进程提交分类写入后整体失效，其他进程的写入依赖过期时间兜底
+category_tree_cache = TTLCache(ttl_seconds=300)
+
+
+@event.listens_for(Session, "before_flush")
+def _track_category_writes(session: Session, flush_context, instances) -> None:
+    if any(isinstance(obj, (Category, CategoryClosure)) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info[CATEGORY_WRITES_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_category_tree(session: Session) -> None:
+    if session.info.pop(CATEGORY_WRITES_KEY, False):
+        category_tree_cache.clear()
+        invalidate_category_resolvers()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_category_writes(session: Session) -> None:
+    session.info.pop(CATEGORY_WRITES_KEY, None)
+
 
 class CategoryService:
     def __init__(self, db: Session):
@@ -23,9 +53,8 @@ class CategoryService:
         Returns:
             创建的分类
         """
-        # 检查分类名称是否已存在
+        # 检查分类名称是否已存在（分类是系统级的,没有user_id字段）
         existing_category = self.db.query(Category).filter(
-            Category.user_id == user_id,
             Category.name == category_data.name,
             Category.type == category_data.type
         ).first()
@@ -33,22 +62,20 @@ class CategoryService:
         if existing_category:
             raise ValidationError("相同类型的分类名称已存在")
 
-        # 如果设置了父分类，验证父分类存在且属于同一用户
+        # 如果设置了父分类，验证父分类存在
         if category_data.parent_id:
             parent_category = self.db.query(Category).filter(
-                Category.id == category_data.parent_id,
-                Category.user_id == user_id
+                Category.id == category_data.parent_id
             ).first()
             if not parent_category:
                 raise ValidationError("父分类不存在或无权访问")
 
         # 创建分类
-        category = Category(
-            user_id=user_id,
-            **category_data.model_dump()
-        )
+        category = Category(**category_data.model_dump())
 
         self.db.add(category)
+        self.db.flush()
+        CategoryClosureService(self.db).add_category(category)
         self.db.commit()
         self.db.refresh(category)
 
@@ -65,12 +92,8 @@ class CategoryService:
         Returns:
             分类信息
         """
-        category = self.db.query(Category).filter(
-            Category.id == category_id,
-            and_(
-                or_(Category.user_id == user_id, Category.is_system == True)
-            )
-        ).first()
+        # 分类是系统级的,没有user_id字段
+        category = self.db.query(Category).filter(Category.id == category_id).first()
 
         if not category:
             raise NotFoundError("分类不存在")
@@ -123,9 +146,9 @@ class CategoryService:
         user_id: int,
         category_type: Optional[CategoryType] = None,
         include_system: bool = True
-    ) -> List[Category]:
+    ) -> List[Dict[str, Any]]:
         """
-        获取分类树
+        获取分类树（带缓存，分类写入后失效）
 
         Args:
             user_id: 用户ID
@@ -133,29 +156,31 @@ class CategoryService:
             include_system: 是否包含系统分类
 
         Returns:
-            分类树列表
+            顶层分类列表，每个节点的 children 为子分类列表（调用方不应修改）
         """
-        # 获取所有分类
+        cache_key = (category_type, include_system)
+        tree = category_tree_cache.get(cache_key)
+        if tree is not None:
+            return tree
+
         categories = self.get_categories(
             user_id=user_id,
             category_type=category_type,
             include_system=include_system
         )
 
-        # 构建树形结构
-        category_dict = {cat.id: cat for cat in categories}
-        root_categories = []
-
+        # 构建树形结构（父分类不在结果中的视为顶层）
+        nodes = {category.id: self._category_to_dict(category, children=[]) for category in categories}
+        tree = []
         for category in categories:
-            if category.parent_id and category.parent_id in category_dict:
-                parent = category_dict[category.parent_id]
-                if not hasattr(parent, 'children'):
-                    parent.children = []
-                parent.children.append(category)
+            node = nodes[category.id]
+            if category.parent_id and category.parent_id in nodes:
+                nodes[category.parent_id]["children"].append(node)
             else:
-                root_categories.append(category)
+                tree.append(node)
 
-        return root_categories
+        category_tree_cache.set(cache_key, tree)
+        return tree
 
     def update_category(
         self,
@@ -176,28 +201,49 @@ class CategoryService:
         """
         category = self.get_category(user_id, category_id)
 
-        # 不能修改系统分类的核心信息
-        if category.is_system:
-            if category_data.type and category_data.type != category.type:
-                raise ValidationError("不能修改系统分类的类型")
-
         # 检查名称是否与其他分类重复
         if category_data.name:
             existing_category = self.db.query(Category).filter(
                 Category.id != category_id,
-                Category.user_id == user_id,
                 Category.name == category_data.name,
-                Category.type == (category_data.type or category.type)
+                Category.type == category.type
             ).first()
 
             if existing_category:
                 raise ValidationError("相同类型的分类名称已存在")
 
-        # 更新字段
         update_data = category_data.model_dump(exclude_unset=True)
+        closure_service = CategoryClosureService(self.db)
+
+        # 更换父分类时不能移动到自身或子分类下
+        parent_changed = "parent_id" in update_data and update_data["parent_id"] != category.parent_id
+        if parent_changed and update_data["parent_id"] is not None:
+            parent_category = self.db.query(Category).filter(
+                Category.id == update_data["parent_id"]
+            ).first()
+            if not parent_category:
+                raise ValidationError("父分类不存在或无权访问")
+            if parent_category.id in closure_service.get_descendants(category_id):
+                raise ValidationError("不能将分类移动到自身或其子分类下")
+
+        old_parent_id = category.parent_id
+
+        # 更新字段
         for field, value in update_data.items():
             setattr(category, field, value)
 
+        if parent_changed:
+            self.db.flush()
+            closure_service.move_category(category_id, category.parent_id)
+
+            # 新旧祖先分类上的预算汇总范围变了，重算其消费计数器
+            affected = set()
+            for ancestors in closure_service.get_ancestors([old_parent_id, category.parent_id]).values():
+                affected |= ancestors
+            if affected:
+                budgets = self.db.query(Budget).filter(Budget.category_id.in_(affected)).all()
+                BudgetService(self.db).refresh_counters(budgets)
+
         self.db.commit()
         self.db.refresh(category)
 
@@ -236,67 +282,39 @@ class CategoryService:
         if transaction_count > 0:
             raise ValidationError("存在关联交易，不能删除")
 
+        CategoryClosureService(self.db).remove_category(category_id)
         self.db.delete(category)
         self.db.commit()
 
         return True
 
-    def get_category_with_stats(self, user_id: int, category_id: int) -> CategoryWithStats:
+    def get_category_with_stats(
+        self,
+        user_id: int,
+        category_id: int,
+        include_descendants: bool = False
+    ) -> CategoryWithStats:
         """
         获取带统计信息的分类
 
         Args:
             user_id: 用户ID
             category_id: 分类ID
+            include_descendants: 是否汇总全部子分类的交易
 
         Returns:
             带统计信息的分类
         """
         category = self.get_category(user_id, category_id)
-
-        # 统计交易信息
-        expense_stats = self.db.query(
-            func.count(Transaction.id).label('count'),
-            func.sum(Transaction.amount).label('total')
-        ).filter(
-            Transaction.category_id == category_id,
-            Transaction.type == TransactionType.EXPENSE
-        ).first()
-
-        income_stats = self.db.query(
-            func.count(Transaction.id).label('count'),
-            func.sum(Transaction.amount).label('total')
-        ).filter(
-            Transaction.category_id == category_id,
-            Transaction.type == TransactionType.INCOME
-        ).first()
-
-        # 构建响应数据
-        category_dict = {
-            "id": category.id,
-            "user_id": category.user_id,
-            "name": category.name,
-            "type": category.type,
-            "icon": category.icon,
-            "color": category.color,
-            "parent_id": category.parent_id,
-            "sort_order": category.sort_order,
-            "is_system": category.is_system,
-            "created_at": category.created_at,
-            "updated_at": category.updated_at,
-            "expense_count": expense_stats.count if expense_stats else 0,
-            "expense_amount": float(expense_stats.total) if expense_stats and expense_stats.total else 0,
-            "income_count": income_stats.count if income_stats else 0,
-            "income_amount": float(income_stats.total) if income_stats and income_stats.total else 0,
-        }
-
-        return CategoryWithStats(**category_dict)
+        stats = self._get_usage_stats(user_id, [category.id], include_descendants)
+        return self._build_category_stats(category, stats.get(category.id))
 
     def get_categories_with_usage_stats(
         self,
         user_id: int,
         category_type: Optional[CategoryType] = None,
-        limit: int = 10
+        limit: int = 10,
+        include_descendants: bool = False
     ) -> List[CategoryWithStats]:
         """
         获取带使用统计的分类列表
@@ -305,16 +323,18 @@ class CategoryService:
             user_id: 用户ID
             category_type: 分类类型
             limit: 返回数量限制
+            include_descendants: 父分类是否汇总全部子分类的交易
 
         Returns:
             带统计信息的分类列表
         """
         categories = self.get_categories(user_id, category_type)
+        stats = self._get_usage_stats(user_id, [category.id for category in categories], include_descendants)
 
-        categories_with_stats = []
-        for category in categories:
-            stats = self.get_category_with_stats(user_id, category.id)
-            categories_with_stats.append(stats)
+        categories_with_stats = [
+            self._build_category_stats(category, stats.get(category.id))
+            for category in categories
+        ]
 
         # 按使用频率排序
         categories_with_stats.sort(
@@ -324,6 +344,86 @@ class CategoryService:
 
         return categories_with_stats[:limit]
 
+    def _get_usage_stats(
+        self,
+        user_id: int,
+        category_ids: List[int],
+        include_descendants: bool = False
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        按分类和交易类型一次分组统计用户的交易次数和金额
+
+        Args:
+            user_id: 用户ID
+            category_ids: 分类ID列表
+            include_descendants: 是否经闭包表把子分类的交易汇总到各分类
+
+        Returns:
+            分类ID -> {expense_count, expense_amount, income_count, income_amount}
+        """
+        if not category_ids:
+            return {}
+
+        if include_descendants:
+            group_key = CategoryClosure.ancestor_id
+            query = self.db.query(
+                group_key.label('category_id'),
+                Transaction.type,
+                func.count(Transaction.id).label('count'),
+                func.sum(Transaction.amount).label('total')
+            ).join(
+                CategoryClosure, CategoryClosure.descendant_id == Transaction.category_id
+            ).filter(CategoryClosure.ancestor_id.in_(category_ids))
+        else:
+            group_key = Transaction.category_id
+            query = self.db.query(
+                group_key,
+                Transaction.type,
+                func.count(Transaction.id).label('count'),
+                func.sum(Transaction.amount).label('total')
+            ).filter(Transaction.category_id.in_(category_ids))
+
+        rows = query.filter(
+            Transaction.user_id == user_id,
+            Transaction.type.in_([TransactionType.EXPENSE, TransactionType.INCOME])
+        ).group_by(group_key, Transaction.type).all()
+
+        stats: Dict[int, Dict[str, Any]] = {}
+        for row in rows:
+            prefix = "expense" if row.type == TransactionType.EXPENSE else "income"
+            entry = stats.setdefault(row.category_id, {})
+            entry[f"{prefix}_count"] = row.count
+            entry[f"{prefix}_amount"] = float(row.total) if row.total else 0
+        return stats
+
+    def _build_category_stats(self, category: Category, stats: Optional[Dict[str, Any]]) -> CategoryWithStats:
+        """组装带统计信息的分类"""
+        stats = stats or {}
+        return CategoryWithStats(
+            **self._category_to_dict(category),
+            expense_count=stats.get("expense_count", 0),
+            expense_amount=stats.get("expense_amount", 0),
+            income_count=stats.get("income_count", 0),
+            income_amount=stats.get("income_amount", 0)
+        )
+
+    def _category_to_dict(self, category: Category, **extra: Any) -> Dict[str, Any]:
+        """分类基础字段"""
+        return {
+            "id": category.id,
+            "user_id": None,  # 分类是系统级的,没有user_id
+            "name": category.name,
+            "type": category.type,
+            "icon": category.icon,
+            "color": category.color,
+            "parent_id": category.parent_id,
+            "sort_order": category.sort_order,
+            "is_system": category.is_system,
+            "created_at": category.created_at,
+            "updated_at": category.updated_at,
+            **extra
+        }
+
     def init_system_categories(self, user_id: int) -> List[Category]:
         """
         初始化系统分类
@@ -377,6 +477,10 @@ class CategoryService:
                 created_categories.append(category)
 
         if created_categories:
+            self.db.flush()
+            closure_service = CategoryClosureService(self.db)
+            for category in created_categories:
+                closure_service.add_category(category)
             self.db.commit()
             for category in created_categories:
                 self.db.refresh(category)
@@ -14,8 +14,10 @@ from app.schemas.import_log import (
 )
 from app.services.wechat_bill_service import WeChatBillService
 from app.services.intelligent_category_service import IntelligentCategoryService
+from app.services.category_resolver import CategoryResolver
 from app.services.transaction_service import TransactionService
 from app.services.account_service import AccountService
+from app.services.ledger_hooks import on_transactions_changed
 from app.core.exceptions import ValidationError, NotFoundError
 
 class ImportService:
@@ -126,6 +128,7 @@ class ImportService:
         success_count = 0
         failed_count = 0
         errors = []
+        imported = []
 
         # 获取默认账户
         default_account = None
@@ -187,10 +190,12 @@ class ImportService:
                     original_category=transaction_data.get('original_category'),
                     merchant_name=transaction_data.get('merchant_name'),
                     pay_method=transaction_data.get('pay_method'),
-                    is_repeated=transaction_data.get('is_potential_duplicate', False)
+                    is_repeated=transaction_data.get('is_potential_duplicate', False),
+                    import_log_id=import_log_id
                 )
 
                 self.db.add(transaction)
+                imported.append(transaction)
                 success_count += 1
 
             except Exception as e:
@@ -204,6 +209,7 @@ class ImportService:
 
         # 提交所有成功的交易
         if success_count > 0:
+            on_transactions_changed(self.db, added=imported, reference_id=f"import-{import_log_id}")
             self.db.commit()
 
         return success_count, failed_count, errors
@@ -236,24 +242,10 @@ class ImportService:
 
     def _get_default_category(self, user_id: int, transaction_type: TransactionType) -> Category:
         """获取默认分类"""
-        category_name = "其他支出" if transaction_type == TransactionType.EXPENSE else "其他收入"
-        category_type = "expense" if transaction_type == TransactionType.EXPENSE else "income"
-
-        category = self.db.query(Category).filter(
-            Category.user_id == user_id,
-            Category.name == category_name,
-            Category.type == category_type
-        ).first()
-
-        if not category:
-            # 如果没有其他分类，查找系统分类
-            category = self.db.query(Category).filter(
-                Category.is_system == True,
-                Category.name == category_name,
-                Category.type == category_type
-            ).first()
+        category = CategoryResolver.for_session(self.db, user_id).get_default(transaction_type)
 
         if not category:
+            category_name = "其他支出" if transaction_type == TransactionType.EXPENSE else "其他收入"
             raise ValidationError(f"未找到默认分类: {category_name}")
 
         return category
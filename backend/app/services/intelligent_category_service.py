@@ -1,11 +1,115 @@
 import re
-from typing import Dict, List, Optional, Tuple
+import threading
+from typing import Dict, List, Optional, Tuple, Any
 from collections import defaultdict
 
 from app.models.category import CategoryType
 from app.models.transaction import TransactionType
 from sqlalchemy.orm import Session
 from app.models.category import Category
+from app.models.category_suggestion import CategoryRule
+from app.core.cache import TTLCache
+from app.core.exceptions import ValidationError, NotFoundError
+from app.utils.keyword_matcher import KeywordMatcher
+from app.services.category_resolver import CategoryResolver
+
+# 基于商户名称的关键词映射（系统规则）
+MERCHANT_KEYWORDS: Dict[CategoryType, Dict[str, List[str]]] = {
+    CategoryType.EXPENSE: {
+        # 餐饮类
+        "餐饮": [
+            "餐厅", "饭店", "酒楼", "食堂", "面馆", "粥店", "烧烤", "火锅",
+            "麦当劳", "肯德基", "汉堡王", "必胜客", "星巴克", "瑞幸咖啡", "喜茶",
+            "奶茶", "咖啡", "果汁", "饮料", "零食", "小吃", "快餐", "外卖",
+            "美团", "饿了么", "盒马", "叮咚买菜", "每日优鲜"
+        ],
+        "超市": [
+            "超市", "便利店", "沃尔玛", "家乐福", "大润发", "永辉超市", "物美",
+            "7-11", "全家", "罗森", "喜士多", "美宜佳"
+        ],
+        # 交通类
+        "交通": [
+            "滴滴", "曹操", "神州", "首汽", "出租车", "网约车", "公交", "地铁",
+            "火车", "高铁", "飞机", "携程", "去哪儿", "飞猪", "高德地图",
+            "百度地图", "加油", "停车费", "过路费", "打车", "租车"
+        ],
+        # 购物类
+        "购物": [
+            "淘宝", "天猫", "京东", "拼多多", "苏宁", "国美", "亚马逊", "唯品会",
+            "衣服", "鞋帽", "化妆品", "护肤品", "电子产品", "家电", "家具",
+            "百货", "商场", "购物", "服装", "手机", "电脑", "相机"
+        ],
+        # 娱乐类
+        "娱乐": [
+            "电影", "KTV", "酒吧", "游戏", "视频", "音乐", "书店", "运动",
+            "健身房", "游泳", "瑜伽", "舞蹈", "演唱会", "展览", "博物馆"
+        ],
+        # 医疗类
+        "医疗": [
+            "医院", "诊所", "药店", "体检", "看病", "拿药", "医疗", "健康",
+            "挂号费", "诊金", "药费", "体检费"
+        ],
+        # 教育类
+        "教育": [
+            "学费", "培训", "课程", "书籍", "文具", "考试", "考证",
+            "新东方", "学而思", "作业帮", "猿辅导", "腾讯课堂"
+        ],
+        # 居住类
+        "居住": [
+            "房租", "物业", "水电", "燃气", "宽带", "话费", "网费",
+            "装修", "家具", "家电维修", "物业费", "水费", "电费"
+        ]
+    },
+
+    # 收入类
+    CategoryType.INCOME: {
+        "工资": [
+            "工资", "薪金", "薪水", "年终奖", "绩效", "补贴", "津贴"
+        ],
+        "投资收益": [
+            "理财", "基金", "股票", "债券", "收益", "分红", "利息"
+        ],
+        "礼金": [
+            "红包", "礼金", "转账", "还款", "退款", "奖金"
+        ]
+    }
+}
+
+# 用户自定义规则每命中一个关键词的得分（系统规则为 1），优先于系统规则
+CUSTOM_RULE_WEIGHT = 3
+# 关键词与整段文本完全相同时的加分
+EXACT_MATCH_BONUS = 2
+
+# 系统规则自动机按分类类型编译一次；用户规则自动机缓存，add_custom_rule 后失效
+_system_matchers: Dict[CategoryType, KeywordMatcher] = {}
+_system_matchers_lock = threading.Lock()
+custom_rule_matchers = TTLCache(ttl_seconds=300)
+
+
+def get_system_matcher(category_type: CategoryType) -> KeywordMatcher:
+    """
+    获取系统规则的关键词自动机，值为 (规则顺序, 分类名称)
+
+    Args:
+        category_type: 分类类型
+
+    Returns:
+        关键词自动机
+    """
+    matcher = _system_matchers.get(category_type)
+    if matcher is None:
+        with _system_matchers_lock:
+            matcher = _system_matchers.get(category_type)
+            if matcher is None:
+                rules = MERCHANT_KEYWORDS.get(category_type, {})
+                matcher = KeywordMatcher(
+                    (keyword, (rank, category_name))
+                    for rank, (category_name, keywords) in enumerate(rules.items())
+                    for keyword in keywords
+                )
+                _system_matchers[category_type] = matcher
+    return matcher
+
 
 class IntelligentCategoryService:
     """智能分类服务"""
@@ -17,84 +121,7 @@ class IntelligentCategoryService:
     def _initialize_rules(self):
         """初始化分类规则"""
         # 基于商户名称的关键词映射
-        self.merchant_keywords = {
-            # 餐饮类
-            CategoryType.EXPENSE: {
-                "餐饮": [
-                    "餐厅", "饭店", "酒楼", "食堂", "餐厅", "面馆", "粥店", "烧烤", "火锅",
-                    "麦当劳", "肯德基", "汉堡王", "必胜客", "星巴克", "瑞幸咖啡", "喜茶",
-                    "奶茶", "咖啡", "果汁", "饮料", "零食", "小吃", "快餐", "外卖",
-                    "美团", "饿了么", "盒马", "叮咚买菜", "每日优鲜"
-                ],
-                "超市": [
-                    "超市", "便利店", "沃尔玛", "家乐福", "大润发", "永辉超市", "物美",
-                    "7-11", "全家", "罗森", "喜士多", "美宜佳"
-                ]
-            },
-
-            # 交通类
-            CategoryType.EXPENSE: {
-                "交通": [
-                    "滴滴", "曹操", "神州", "首汽", "出租车", "网约车", "公交", "地铁",
-                    "火车", "高铁", "飞机", "携程", "去哪儿", "飞猪", "高德地图",
-                    "百度地图", "加油", "停车费", "过路费", "打车", "租车"
-                ]
-            },
-
-            # 购物类
-            CategoryType.EXPENSE: {
-                "购物": [
-                    "淘宝", "天猫", "京东", "拼多多", "苏宁", "国美", "亚马逊", "唯品会",
-                    "衣服", "鞋帽", "化妆品", "护肤品", "电子产品", "家电", "家具",
-                    "百货", "商场", "购物", "服装", "手机", "电脑", "相机"
-                ]
-            },
-
-            # 娱乐类
-            CategoryType.EXPENSE: {
-                "娱乐": [
-                    "电影", "KTV", "酒吧", "游戏", "视频", "音乐", "书店", "运动",
-                    "健身房", "游泳", "瑜伽", "舞蹈", "演唱会", "展览", "博物馆"
-                ]
-            },
-
-            # 医疗类
-            CategoryType.EXPENSE: {
-                "医疗": [
-                    "医院", "诊所", "药店", "体检", "看病", "拿药", "医疗", "健康",
-                    "挂号费", "诊金", "药费", "体检费"
-                ]
-            },
-
-            # 教育类
-            CategoryType.EXPENSE: {
-                "教育": [
-                    "学费", "培训", "课程", "书籍", "文具", "考试", "考证",
-                    "新东方", "学而思", "作业帮", "猿辅导", "腾讯课堂"
-                ]
-            },
-
-            # 居住类
-            CategoryType.EXPENSE: {
-                "居住": [
-                    "房租", "物业", "水电", "燃气", "宽带", "话费", "网费",
-                    "装修", "家具", "家电维修", "物业费", "水费", "电费"
-                ]
-            },
-
-            # 收入类
-            CategoryType.INCOME: {
-                "工资": [
-                    "工资", "薪金", "薪水", "年终奖", "绩效", "补贴", "津贴"
-                ],
-                "投资收益": [
-                    "理财", "基金", "股票", "债券", "收益", "分红", "利息"
-                ],
-                "礼金": [
-                    "红包", "礼金", "转账", "还款", "退款", "奖金"
-                ]
-            }
-        }
+        self.merchant_keywords = MERCHANT_KEYWORDS
 
         # 支付方式映射
         self.payment_method_mapping = {
@@ -143,59 +170,87 @@ class IntelligentCategoryService:
 
     def _categorize_expense(self, search_text: str, user_id: Optional[int] = None) -> Optional[Category]:
         """分类支出交易"""
-        rules = self.merchant_keywords.get(CategoryType.EXPENSE, {})
-
-        # 计算每个类别的匹配分数
-        category_scores = {}
-
-        for category_name, keywords in rules.items():
-            score = 0
-            for keyword in keywords:
-                if keyword.lower() in search_text:
-                    score += 1
-                    # 完全匹配加分
-                    if keyword.lower() == search_text.strip():
-                        score += 2
-
-            if score > 0:
-                category_scores[category_name] = score
-
-        if not category_scores:
-            return None
-
-        # 选择得分最高的类别
-        best_category = max(category_scores.items(), key=lambda x: x[1])[0]
-
-        # 查找对应的分类
-        return self._find_category_by_name(best_category, CategoryType.EXPENSE, user_id)
+        return self._categorize(search_text, CategoryType.EXPENSE, user_id)
 
     def _categorize_income(self, search_text: str, user_id: Optional[int] = None) -> Optional[Category]:
         """分类收入交易"""
-        rules = self.merchant_keywords.get(CategoryType.INCOME, {})
-
-        # 计算每个类别的匹配分数
-        category_scores = {}
-
-        for category_name, keywords in rules.items():
-            score = 0
-            for keyword in keywords:
-                if keyword.lower() in search_text:
-                    score += 1
-                    # 完全匹配加分
-                    if keyword.lower() == search_text.strip():
-                        score += 2
-
-            if score > 0:
-                category_scores[category_name] = score
+        return self._categorize(search_text, CategoryType.INCOME, user_id)
 
+    def _categorize(self, search_text: str, category_type: CategoryType, user_id: Optional[int] = None) -> Optional[Category]:
+        """按关键词得分选择最佳分类"""
+        category_scores = self._score_categories(search_text, category_type, user_id)
         if not category_scores:
             return None
 
         # 选择得分最高的类别
-        best_category = max(category_scores.items(), key=lambda x: x[1])[0]
+        return self._resolve_target(category_scores[0]["target"], category_type, user_id)
+
+    def _score_categories(
+        self,
+        search_text: str,
+        category_type: CategoryType,
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        一次扫描文本，计算各分类的关键词匹配得分
+
+        Args:
+            search_text: 小写的搜索文本
+            category_type: 分类类型
+            user_id: 用户ID（叠加用户自定义规则）
 
-        # 查找对应的分类
-        return self._find_category_by_name(best_category, CategoryType.INCOME, user_id)
+        Returns:
+            按得分降序的 {target, score, matched_keywords} 列表，
+            target 为 ("name", 分类名称)（系统规则）或 ("id", 分类ID)（用户规则）
+        """
+        exact_text = search_text.strip()
+        # target -> [得分, 规则顺序, 命中关键词]
+        category_scores: Dict[Tuple[str, Any], List[Any]] = {}
+
+        def collect(matcher: KeywordMatcher, weight: int, custom: bool) -> None:
+            for keyword, values in matcher.find_keywords(search_text):
+                score = weight + (EXACT_MATCH_BONUS if keyword == exact_text else 0)
+                for value in values:
+                    # 用户规则排在同分的系统规则之前
+                    target, rank = (("id", value), -1) if custom else (("name", value[1]), value[0])
+                    entry = category_scores.setdefault(target, [0, rank, []])
+                    entry[0] += score
+                    entry[2].append(keyword)
+
+        collect(get_system_matcher(category_type), 1, custom=False)
+        if user_id:
+            collect(self._get_custom_matcher(user_id, category_type), CUSTOM_RULE_WEIGHT, custom=True)
+
+        ranked = sorted(category_scores.items(), key=lambda item: (-item[1][0], item[1][1]))
+        return [
+            {"target": target, "score": score, "matched_keywords": matched_keywords}
+            for target, (score, _, matched_keywords) in ranked
+        ]
+
+    def _get_custom_matcher(self, user_id: int, category_type: CategoryType) -> KeywordMatcher:
+        """获取用户自定义规则的关键词自动机（值为分类ID），没有规则时为空自动机"""
+        cache_key = (user_id, category_type)
+        matcher = custom_rule_matchers.get(cache_key)
+        if matcher is None:
+            rules = self.db.query(CategoryRule.keyword, CategoryRule.category_id).filter(
+                CategoryRule.user_id == user_id,
+                CategoryRule.category_type == category_type
+            ).order_by(CategoryRule.id).all()
+            matcher = KeywordMatcher((keyword, category_id) for keyword, category_id in rules)
+            custom_rule_matchers.set(cache_key, matcher)
+        return matcher
+
+    def _resolve_target(
+        self,
+        target: Tuple[str, Any],
+        category_type: CategoryType,
+        user_id: Optional[int] = None
+    ) -> Optional[Category]:
+        """把规则目标转换为分类对象"""
+        kind, value = target
+        if kind == "id":
+            return CategoryResolver.for_session(self.db, user_id).get(value)
+        return self._find_category_by_name(value, category_type, user_id)
 
     def _find_category_by_name(
         self,
@@ -203,30 +258,8 @@ class IntelligentCategoryService:
         category_type: CategoryType,
         user_id: Optional[int] = None
     ) -> Optional[Category]:
-        """查找分类"""
-        query = self.db.query(Category).filter(
-            Category.name == category_name,
-            Category.type == category_type
-        )
-
-        if user_id:
-            # 优先查找用户自定义分类
-            query = query.filter(Category.user_id == user_id)
-            category = query.first()
-            if category:
-                return category
-
-            # 如果没有用户分类，查找系统分类
-            query = self.db.query(Category).filter(
-                Category.name == category_name,
-                Category.type == category_type,
-                Category.is_system == True
-            )
-        else:
-            # 只查找系统分类
-            query = query.filter(Category.is_system == True)
-
-        return query.first()
+        """查找分类（优先用户自定义分类，其次系统分类；从会话内共享的分类索引中查找）"""
+        return CategoryResolver.for_session(self.db, user_id).find(category_name, category_type)
 
     def suggest_category(
         self,
@@ -256,51 +289,19 @@ class IntelligentCategoryService:
 
         # 根据交易类型选择规则
         if transaction_type == TransactionType.EXPENSE:
-            rules = self.merchant_keywords.get(CategoryType.EXPENSE, {})
+            category_type = CategoryType.EXPENSE
         elif transaction_type == TransactionType.INCOME:
-            rules = self.merchant_keywords.get(CategoryType.INCOME, {})
+            category_type = CategoryType.INCOME
         else:
             return []
 
-        # 计算所有类别的匹配分数
-        category_scores = {}
-
-        for category_name, keywords in rules.items():
-            score = 0
-            matched_keywords = []
-
-            for keyword in keywords:
-                if keyword.lower() in search_text:
-                    score += 1
-                    matched_keywords.append(keyword)
-                    # 完全匹配加分
-                    if keyword.lower() == search_text.strip():
-                        score += 2
-
-            if score > 0:
-                category_scores[category_name] = {
-                    "score": score,
-                    "matched_keywords": matched_keywords
-                }
-
-        if not category_scores:
-            return []
-
-        # 按分数排序
-        sorted_categories = sorted(
-            category_scores.items(),
-            key=lambda x: x[1]["score"],
-            reverse=True
-        )[:limit]
+        # 计算所有类别的匹配分数并排序
+        sorted_categories = self._score_categories(search_text, category_type, user_id)[:limit]
 
         # 构建建议结果
         suggestions = []
-        for category_name, score_info in sorted_categories:
-            category = self._find_category_by_name(
-                category_name,
-                CategoryType.EXPENSE if transaction_type == TransactionType.EXPENSE else CategoryType.INCOME,
-                user_id
-            )
+        for score_info in sorted_categories:
+            category = self._resolve_target(score_info["target"], category_type, user_id)
 
             if category:
                 suggestions.append({
@@ -396,7 +397,7 @@ class IntelligentCategoryService:
         keywords: List[str],
         category_id: int,
         transaction_type: TransactionType
-    ):
+    ) -> int:
         """
         添加自定义分类规则
 
@@ -405,7 +406,48 @@ class IntelligentCategoryService:
             keywords: 关键词列表
             category_id: 分类ID
             transaction_type: 交易类型
+
+        Returns:
+            新增的规则数量
         """
-        # 这里需要实现自定义规则的保存和加载
-        # 暂时不实现，实际项目中需要创建规则表
-        pass
\ No newline at end of file
+        category = self.db.query(Category).filter(Category.id == category_id).first()
+        if not category:
+            raise NotFoundError("分类不存在")
+
+        if transaction_type == TransactionType.EXPENSE:
+            category_type = CategoryType.EXPENSE
+        elif transaction_type == TransactionType.INCOME:
+            category_type = CategoryType.INCOME
+        else:
+            raise ValidationError("转账交易不支持分类规则")
+        if category.type != category_type:
+            raise ValidationError("分类类型与交易类型不一致")
+
+        keywords = {keyword.strip().lower() for keyword in keywords if keyword and keyword.strip()}
+        if not keywords:
+            return 0
+
+        # 已存在的关键词改为指向新分类
+        existing = {
+            rule.keyword: rule for rule in self.db.query(CategoryRule).filter(
+                CategoryRule.user_id == user_id,
+                CategoryRule.category_type == category_type,
+                CategoryRule.keyword.in_(keywords)
+            ).all()
+        }
+        created = 0
+        for keyword in keywords:
+            if keyword in existing:
+                existing[keyword].category_id = category_id
+            else:
+                self.db.add(CategoryRule(
+                    user_id=user_id,
+                    keyword=keyword,
+                    category_type=category_type,
+                    category_id=category_id
+                ))
+                created += 1
+        self.db.commit()
+
+        custom_rule_matchers.invalidate(lambda key: key[0] == user_id)
+        return created
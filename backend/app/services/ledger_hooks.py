@@ -0,0 +1,143 @@
+"""
+交易写入钩子
+
+所有新增、修改、删除交易的路径（手工记账、批量导入）在提交前调用，
+在同一事务中维护账户余额、余额历史及依赖交易数据的派生表。
+"""
+
+from sqlalchemy.orm import Session
+from typing import Iterable, Dict, Optional
+from decimal import Decimal
+from collections import defaultdict
+
+from app.models.account import Account
+from app.models.transaction import TransactionType
+from app.models.account_balance_history import BalanceChangeType
+from app.services.account_balance_history_service import BalanceHistoryRecorder
+from app.services.balance_checkpoint_service import BalanceCheckpointService
+from app.services.balance_drift_service import BalanceDriftService
+from app.services.budget_service import BudgetService
+from app.utils.ledger import transaction_deltas
+
+
+def on_transactions_changed(
+    db: Session,
+    added: Iterable = (),
+    removed: Iterable = (),
+    recorder: Optional[BalanceHistoryRecorder] = None,
+    reference_id: Optional[str] = None
+) -> None:
+    """
+    交易变化后维护派生数据（不提交，由调用方统一提交）
+
+    Args:
+        db: 数据库会话
+        added: 新增或修改后的交易
+        removed: 已删除的交易或修改前的快照（见 app.utils.ledger.snapshot_transaction）
+        recorder: 余额历史工作单元；传入时由调用方负责 flush，否则本次调用结束前写入
+        reference_id: 写入余额历史的参考ID（如导入批次）
+    """
+    added = [t for t in added if t is not None]
+    removed = [t for t in removed if t is not None]
+    if not added and not removed:
+        return
+
+    db.flush()
+    own_recorder = recorder is None
+    recorder = recorder or BalanceHistoryRecorder(db)
+    changed = apply_account_balances(db, added, removed, recorder, reference_id)
+    BalanceDriftService(db).apply_deltas(changed)
+    BalanceCheckpointService(db).apply_changes(added, removed)
+    BudgetService(db).apply_changes(added, removed)
+    if own_recorder:
+        recorder.flush()
+
+
+def _history_change(transaction, delta: Decimal, reversal: bool, updated: bool) -> tuple:
+    """确定一条余额变化对应的历史类型和描述"""
+    label = transaction.remark if getattr(transaction, "remark", None) else getattr(transaction, "merchant_name", None)
+    if reversal:
+        action = "修改交易" if updated else "删除交易"
+        return BalanceChangeType.ADJUSTMENT, f"{action} #{transaction.id}，冲销原余额变化"
+    if transaction.type == TransactionType.TRANSFER:
+        if delta < 0:
+            return BalanceChangeType.TRANSFER_OUT, f"转出: {label or '转账'}"
+        return BalanceChangeType.TRANSFER_IN, f"转入: {label or '转账'}"
+    prefix = "收入" if transaction.type == TransactionType.INCOME else "支出"
+    return BalanceChangeType.TRANSACTION, f"{prefix}: {label}" if label else prefix
+
+
+def apply_account_balances(
+    db: Session,
+    added: Iterable = (),
+    removed: Iterable = (),
+    recorder: Optional[BalanceHistoryRecorder] = None,
+    reference_id: Optional[str] = None
+) -> Dict[int, Decimal]:
+    """
+    按账本口径调整账户余额（Account.balance），并逐笔记录余额历史
+
+    受影响账户加行锁后按先冲销、再入账的顺序逐笔计算变化前后余额，
+    最后一次性写回余额，并发写入不会互相覆盖。
+
+    Args:
+        db: 数据库会话
+        added: 新增或修改后的交易
+        removed: 已删除的交易或修改前的快照
+        recorder: 余额历史工作单元，为空时不记录历史
+        reference_id: 余额历史参考ID
+
+    Returns:
+        各账户的余额变化
+    """
+    added = list(added)
+    added_ids = {transaction.id for transaction in added if transaction.id}
+    entries = []
+    for reversal, sign, transactions in ((True, -1, removed), (False, 1, added)):
+        for transaction in transactions:
+            for account_id, delta in transaction_deltas(transaction):
+                if account_id and delta != 0:
+                    entries.append((transaction, account_id, delta * sign, reversal))
+
+    if not entries:
+        return {}
+
+    accounts = {
+        account.id: account
+        for account in db.query(Account).filter(
+            Account.id.in_({account_id for _, account_id, _, _ in entries})
+        ).populate_existing().with_for_update().all()
+    }
+    running = {account_id: Decimal(account.balance or 0) for account_id, account in accounts.items()}
+
+    changed: Dict[int, Decimal] = defaultdict(Decimal)
+    for transaction, account_id, delta, reversal in entries:
+        account = accounts.get(account_id)
+        if account is None:
+            continue
+
+        before = running[account_id]
+        after = before + delta
+        running[account_id] = after
+        changed[account_id] += delta
+
+        if recorder is not None:
+            updated = transaction.id in added_ids
+            change_type, description = _history_change(transaction, delta, reversal, updated)
+            recorder.add(
+                account=account,
+                change_type=change_type,
+                amount_before=before,
+                amount_after=after,
+                change_amount=delta,
+                description=description,
+                # 已删除交易不再关联，避免外键指向不存在的记录
+                transaction_id=transaction.id if (not reversal or updated) else None,
+                reference_id=reference_id
+            )
+
+    for account_id, account in accounts.items():
+        account.balance = running[account_id]
+    db.flush()
+
+    return dict(changed)
@@ -0,0 +1,351 @@
+"""
+商户名称归并
+
+把账单中的原始商户名映射到规范商户ID：先按 app.utils.merchant_names 的规则得到规范化键，
+精确命中已有商户即返回；“品牌+地点+分店”形式的名称再依次用候选品牌键精确匹配；
+否则用字符二元组倒排索引召回候选，Jaccard 相似度达到阈值的视为同一商户。
+索引在进程内缓存，命中时为纯内存查找。
+
+交易和分类建议在 flush 前自动写入 merchant_id（见 _assign_merchant_ids），
+新商户随同一事务插入，提交后才加入进程索引，回滚则丢弃。
+"""
+
+import threading
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, inspect, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.models.category_suggestion import CategorySuggestion
+from app.models.merchant import Merchant
+from app.models.transaction import Transaction
+from app.utils.merchant_names import branch_brand_keys, clean_merchant_name, merchant_key, merchant_shingles
+
+# 二元组 Jaccard 相似度达到该值视为同一商户
+SIMILARITY_THRESHOLD = 0.8
+# 二元组少于该数量的短名称只做精确匹配
+MIN_FUZZY_SHINGLES = 3
+# 出现在过多商户中的二元组区分度低，不参与候选召回
+MAX_POSTING_SIZE = 500
+PENDING_MERCHANTS_KEY = "pending_merchants"
+
+# 进程内商户索引：本进程提交的新商户即时加入，其他进程新增的商户依赖过期重载
+merchant_index_cache = TTLCache(ttl_seconds=600)
+
+_merchant_key = lru_cache(maxsize=65536)(merchant_key)
+_branch_brand_keys = lru_cache(maxsize=65536)(lambda name: tuple(branch_brand_keys(name)))
+
+
+def _brand_keys(names: Iterable[str]) -> Tuple[str, ...]:
+    """同一规范化键的原始名称中，第一个带分店地点的名称的候选品牌键"""
+    for name in names:
+        brand_keys = _branch_brand_keys(name)
+        if brand_keys:
+            return brand_keys
+    return ()
+
+
+class MerchantIndex:
+    """规范商户的精确键与二元组倒排索引"""
+
+    def __init__(self, merchants: Iterable[Tuple[int, str]] = ()):
+        # 规范化键（含模糊命中过的别名）-> 商户ID
+        self._ids: Dict[str, int] = {}
+        self._shingles: Dict[int, FrozenSet[str]] = {}
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._lock = threading.Lock()
+        for merchant_id, key in merchants:
+            self.add(merchant_id, key)
+
+    def __len__(self) -> int:
+        return len(self._shingles)
+
+    def add(self, merchant_id: int, key: str) -> None:
+        """
+        加入规范商户（同一ID再次加入时只登记为别名）
+
+        Args:
+            merchant_id: 商户ID
+            key: 规范化键
+        """
+        with self._lock:
+            self._ids[key] = merchant_id
+            if merchant_id in self._shingles:
+                return
+            shingles = merchant_shingles(key)
+            self._shingles[merchant_id] = shingles
+            for shingle in shingles:
+                self._postings[shingle].append(merchant_id)
+
+    def items(self) -> List[Tuple[str, int]]:
+        """按加入顺序返回 键 -> 商户ID（每个ID的第一个键为规范键）"""
+        with self._lock:
+            return list(self._ids.items())
+
+    def lookup(self, key: str, brand_keys: Iterable[str] = ()) -> Optional[int]:
+        """
+        查找规范化键对应的商户
+
+        Args:
+            key: 规范化键
+            brand_keys: 候选品牌键（由长到短），精确命中其中之一即视为该品牌的分店
+
+        Returns:
+            商户ID，没有足够相似的商户时为 None
+        """
+        merchant_id = self._ids.get(key)
+        if merchant_id is not None or not key:
+            return merchant_id
+
+        for brand_key in brand_keys:
+            merchant_id = self._ids.get(brand_key)
+            if merchant_id is not None:
+                with self._lock:
+                    self._ids[key] = merchant_id
+                return merchant_id
+
+        shingles = merchant_shingles(key)
+        if len(shingles) < MIN_FUZZY_SHINGLES:
+            return None
+
+        overlaps: Counter = Counter()
+        for shingle in shingles:
+            posting = self._postings.get(shingle)
+            if posting and len(posting) <= MAX_POSTING_SIZE:
+                overlaps.update(posting)
+
+        # 交集至少达到 阈值 x 自身大小 才可能满足相似度
+        min_overlap = SIMILARITY_THRESHOLD * len(shingles)
+        best_id, best_score = None, SIMILARITY_THRESHOLD
+        for candidate, overlap in overlaps.items():
+            if overlap < min_overlap:
+                continue
+            score = overlap / (len(shingles) + len(self._shingles[candidate]) - overlap)
+            if score > best_score or (score == best_score and (best_id is None or candidate < best_id)):
+                best_id, best_score = candidate, score
+
+        if best_id is not None:
+            with self._lock:
+                self._ids[key] = best_id
+        return best_id
+
+
+def get_merchant_index(db: Session) -> MerchantIndex:
+    """获取进程内商户索引，缓存失效时一次查询重建"""
+    index = merchant_index_cache.get("index")
+    if index is None:
+        index = MerchantIndex(db.query(Merchant.id, Merchant.name_key).all())
+        merchant_index_cache.set("index", index)
+    return index
+
+
+class MerchantCanonicalizer:
+    """原始商户名 -> 规范商户ID"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def lookup(self, merchant_name: Optional[str]) -> Optional[int]:
+        """
+        查找商户（不新建）
+
+        Args:
+            merchant_name: 原始商户名称
+
+        Returns:
+            规范商户ID
+        """
+        return self.lookup_many([merchant_name]).get(merchant_name)
+
+    def lookup_many(self, merchant_names: Iterable[Optional[str]]) -> Dict[str, Optional[int]]:
+        """
+        批量查找商户（不新建），进程索引未命中的键合并为一次查询
+
+        Args:
+            merchant_names: 原始商户名称
+
+        Returns:
+            原始名称 -> 规范商户ID（未知商户为 None）
+        """
+        result, missing = self._lookup_cached(merchant_names)
+        if missing:
+            found = self._load_existing(missing)
+            for key, names in missing.items():
+                for name in names:
+                    result[name] = found.get(key)
+        return result
+
+    def resolve_many(self, merchant_names: Iterable[Optional[str]]) -> Dict[str, Optional[int]]:
+        """
+        批量解析商户，未知商户随当前事务新建
+
+        Args:
+            merchant_names: 原始商户名称
+
+        Returns:
+            原始名称 -> 规范商户ID
+        """
+        result, missing = self._lookup_cached(merchant_names)
+        if not missing:
+            return result
+
+        found = self._load_existing(missing)
+        new_keys = [key for key in missing if key not in found]
+        if new_keys:
+            found.update(self._create(new_keys, missing))
+
+        for key, names in missing.items():
+            for name in names:
+                result[name] = found.get(key)
+        return result
+
+    def _create(self, keys: List[str], names: Dict[str, List[str]]) -> Dict[str, int]:
+        """
+        新建商户：同批相似的键归并为一个商户，只插入每组的第一个键；
+        分店形式的键排在最后，以便归入同批出现的品牌
+
+        Args:
+            keys: 未知的规范化键
+            names: 规范化键 -> 原始名称
+
+        Returns:
+            规范化键 -> 商户ID
+        """
+        batch = MerchantIndex()
+        canonical_keys: List[str] = []
+        groups: Dict[str, str] = {}
+        brand_keys = {key: _brand_keys(names[key]) for key in keys}
+        for key in sorted(keys, key=lambda key: bool(brand_keys[key])):
+            position = batch.lookup(key, brand_keys[key])
+            if position is None:
+                position = len(canonical_keys)
+                batch.add(position, key)
+                canonical_keys.append(key)
+            groups[key] = canonical_keys[position]
+
+        # 并发插入同一键时忽略冲突，随后统一按键取回ID
+        self.db.connection().execute(
+            insert(Merchant.__table__).prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite"),
+            [{"name_key": key, "display_name": clean_merchant_name(names[key][0])[:200]} for key in canonical_keys]
+        )
+        created = self._load_by_keys(canonical_keys)
+
+        pending = self.db.info.setdefault(PENDING_MERCHANTS_KEY, MerchantIndex())
+        for key in canonical_keys:
+            if key in created:
+                pending.add(created[key], key)
+        result = {}
+        for key in keys:
+            merchant_id = created.get(groups[key])
+            if merchant_id is not None:
+                result[key] = merchant_id
+                pending.add(merchant_id, key)
+        return result
+
+    def assign(self, objects: Iterable) -> None:
+        """
+        为交易或分类建议写入 merchant_id
+
+        Args:
+            objects: 带 merchant_name / merchant_id 属性的对象
+        """
+        objects = list(objects)
+        merchant_ids = self.resolve_many(obj.merchant_name for obj in objects)
+        for obj in objects:
+            obj.merchant_id = merchant_ids.get(obj.merchant_name)
+
+    def _lookup_cached(
+        self,
+        merchant_names: Iterable[Optional[str]]
+    ) -> Tuple[Dict[str, Optional[int]], Dict[str, List[str]]]:
+        """在本事务新建的商户和进程索引中查找，返回已解析结果与未命中的 键 -> 原始名称"""
+        index = get_merchant_index(self.db)
+        pending = self.db.info.get(PENDING_MERCHANTS_KEY)
+        result: Dict[str, Optional[int]] = {}
+        missing: Dict[str, List[str]] = {}
+        for name in merchant_names:
+            if not name or name in result:
+                continue
+            key = _merchant_key(name)
+            merchant_id = None
+            if key:
+                brand_keys = _branch_brand_keys(name)
+                merchant_id = index.lookup(key, brand_keys)
+                if merchant_id is None and pending is not None:
+                    merchant_id = pending.lookup(key, brand_keys)
+            result[name] = merchant_id
+            if merchant_id is None and key:
+                missing.setdefault(key, []).append(name)
+        return result, missing
+
+    def _load_existing(self, missing: Dict[str, List[str]]) -> Dict[str, int]:
+        """
+        查询其他进程已提交的商户（含候选品牌键），并加入进程索引
+
+        Args:
+            missing: 未命中的规范化键 -> 原始名称
+
+        Returns:
+            规范化键 -> 商户ID
+        """
+        brand_keys = {key: _brand_keys(names) for key, names in missing.items()}
+        loaded = self._load_by_keys(list({
+            key: None for key in (*missing, *(k for keys in brand_keys.values() for k in keys))
+        }))
+        index = get_merchant_index(self.db)
+        for key, merchant_id in loaded.items():
+            index.add(merchant_id, key)
+
+        found: Dict[str, int] = {}
+        for key in missing:
+            merchant_id = loaded.get(key)
+            if merchant_id is None:
+                merchant_id = next((loaded[k] for k in brand_keys[key] if k in loaded), None)
+                if merchant_id is not None:
+                    index.add(merchant_id, key)
+            if merchant_id is not None:
+                found[key] = merchant_id
+        return found
+
+    def _load_by_keys(self, keys: List[str]) -> Dict[str, int]:
+        """按规范化键查询数据库中已有的商户（可能由其他进程创建）"""
+        found: Dict[str, int] = {}
+        for i in range(0, len(keys), 1000):
+            found.update(self.db.connection().execute(
+                select(Merchant.name_key, Merchant.id).where(Merchant.name_key.in_(keys[i:i + 1000]))
+            ).all())
+        return found
+
+
+def _merchant_name_changed(obj) -> bool:
+    state = inspect(obj)
+    if state.pending or state.transient:
+        return bool(obj.merchant_name) and obj.merchant_id is None
+    return state.attrs.merchant_name.history.has_changes()
+
+
+@event.listens_for(Session, "before_flush")
+def _assign_merchant_ids(session: Session, flush_context, instances) -> None:
+    changed = [
+        obj for obj in (*session.new, *session.dirty)
+        if isinstance(obj, (Transaction, CategorySuggestion)) and _merchant_name_changed(obj)
+    ]
+    if changed:
+        MerchantCanonicalizer(session).assign(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_new_merchants(session: Session) -> None:
+    created: Optional[MerchantIndex] = session.info.pop(PENDING_MERCHANTS_KEY, None)
+    index = merchant_index_cache.get("index") if created else None
+    if index is not None:
+        for key, merchant_id in created.items():
+            index.add(merchant_id, key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_new_merchants(session: Session) -> None:
+    session.info.pop(PENDING_MERCHANTS_KEY, None)
@@ -0,0 +1,454 @@
+"""
+商户分类器：按用户训练的多项式朴素贝叶斯
+
+特征为 merchant_name / remark / original_category 的字符 1~3 元组（按字段加前缀区分），
+训练数据为用户已分类的收支交易。计数以稀疏字典保存，便于用反馈增量更新；
+模型记录每条计入的交易及其分类，反馈只撤销确实计入过的样本，重复反馈不会重复计数。
+预测时编译为 类别×特征 的对数似然矩阵，整批交易分块向量化打分。
+模型以 JSON 保存在本地目录，进程内缓存；反馈更新在数据库提交后才写入文件。
+"""
+
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.core.cache import TTLCache
+from app.models.category import Category
+from app.models.transaction import Transaction, TransactionType
+
+NGRAM_RANGE = (1, 3)
+FEATURE_FIELDS = (("m", "merchant_name"), ("r", "remark"), ("o", "original_category"))
+# 训练时每 HOLDOUT_EVERY 条留出一条评估准确度
+HOLDOUT_EVERY = 5
+# 每块打分的特征总数上限，临时矩阵约为 类别数 x 该值 个 float32
+PREDICT_CHUNK_FEATURES = 32768
+PENDING_MODELS_KEY = "pending_classifier_models"
+
+# 已加载的模型：训练和反馈更新后直接替换/原地修改，其他进程的更新依赖过期后重新读取文件
+classifier_models = TTLCache(ttl_seconds=600)
+
+
+def extract_features(
+    merchant_name: Optional[str] = None,
+    remark: Optional[str] = None,
+    original_category: Optional[str] = None
+) -> List[str]:
+    """
+    提取字符 n-gram 特征（去重）
+
+    Returns:
+        形如 "m:星巴" 的特征列表
+    """
+    values = {"merchant_name": merchant_name, "remark": remark, "original_category": original_category}
+    features = {}
+    for prefix, field in FEATURE_FIELDS:
+        text = "".join((values[field] or "").lower().split())
+        for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+            for i in range(len(text) - n + 1):
+                features[f"{prefix}:{text[i:i + n]}"] = None
+    return list(features)
+
+
+def feature_fingerprint(features: List[str]) -> int:
+    """特征集合的指纹，用于判断撤销时交易内容是否与计入时一致"""
+    return zlib.crc32("\x00".join(sorted(features)).encode("utf-8"))
+
+
+def row_features(row: Dict[str, Any]) -> List[str]:
+    """从交易数据字典提取特征（导入数据的备注可能在 description 中）"""
+    return extract_features(
+        row.get("merchant_name"),
+        row.get("remark") or row.get("description"),
+        row.get("original_category")
+    )
+
+
+class NaiveBayesModel:
+    """多项式朴素贝叶斯（拉普拉斯平滑）"""
+
+    def __init__(self, user_id: int, alpha: float = 1.0):
+        self.user_id = user_id
+        self.alpha = alpha
+        self.version = 0
+        self.trained_at: Optional[str] = None
+        # 类别（分类ID）-> 分类类型、文档数、特征计数
+        self.class_types: Dict[int, str] = {}
+        self.doc_counts: Dict[int, int] = {}
+        self.feature_counts: Dict[int, Dict[str, int]] = {}
+        # 已计入的交易：交易ID -> (分类ID, 特征指纹)
+        self.labels: Dict[int, Tuple[int, int]] = {}
+        # 准确度：训练留出集 + 用户反馈（预测是否与用户确认的分类一致）
+        self.holdout_total = 0
+        self.holdout_correct = 0
+        self.feedback_total = 0
+        self.feedback_correct = 0
+        self._compiled: Optional[Tuple[Dict[str, int], np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[str]]] = None
+
+    @property
+    def model_version(self) -> str:
+        return f"nb-v{self.version}"
+
+    @property
+    def accuracy(self) -> Optional[float]:
+        total = self.holdout_total + self.feedback_total
+        if not total:
+            return None
+        return round((self.holdout_correct + self.feedback_correct) / total, 4)
+
+    @property
+    def sample_count(self) -> int:
+        return sum(self.doc_counts.values())
+
+    def fit(self, samples: Iterable[Tuple[int, List[str], int, str]]) -> None:
+        """
+        用样本重新训练
+
+        Args:
+            samples: (交易ID, 特征, 分类ID, 分类类型) 序列
+        """
+        self.class_types, self.doc_counts, self.feature_counts, self.labels = {}, {}, {}, {}
+        for transaction_id, features, category_id, category_type in samples:
+            self._add(features, category_id, category_type, 1)
+            self.labels[transaction_id] = (category_id, feature_fingerprint(features))
+        self.version += 1
+        self.trained_at = datetime.now().isoformat()
+        self._compiled = None
+
+    def relabel(self, transaction_id: int, features: List[str], category_id: int, category_type: str) -> bool:
+        """
+        把一条交易计为指定分类：已按该分类计入时不变；按其他分类计入且特征未变时先撤销原样本
+
+        Args:
+            transaction_id: 交易ID
+            features: 特征
+            category_id: 分类ID
+            category_type: 分类类型
+
+        Returns:
+            模型是否变化
+        """
+        fingerprint = feature_fingerprint(features)
+        counted = self.labels.get(transaction_id)
+        if counted == (category_id, fingerprint):
+            return False
+        # 交易内容变化后无法还原当初计入的特征，只计入新样本
+        if counted is not None and counted[1] == fingerprint:
+            self._add(features, counted[0], self.class_types.get(counted[0], category_type), -1)
+        self._add(features, category_id, category_type, 1)
+        self.labels[transaction_id] = (category_id, fingerprint)
+        self.version += 1
+        self._compiled = None
+        return True
+
+    def _add(self, features: List[str], category_id: int, category_type: str, weight: int) -> None:
+        if weight < 0 and category_id not in self.doc_counts:
+            return
+        self.class_types[category_id] = category_type
+        self.doc_counts[category_id] = max(self.doc_counts.get(category_id, 0) + weight, 0)
+        counts = self.feature_counts.setdefault(category_id, {})
+        for feature in features:
+            count = counts.get(feature, 0) + weight
+            if count > 0:
+                counts[feature] = count
+            else:
+                counts.pop(feature, None)
+        if not self.doc_counts[category_id]:
+            del self.doc_counts[category_id], self.feature_counts[category_id], self.class_types[category_id]
+
+    def _compile(self):
+        if self._compiled is not None:
+            return self._compiled
+
+        classes = sorted(self.doc_counts)
+        vocabulary: Dict[str, int] = {}
+        for category_id in classes:
+            for feature in self.feature_counts[category_id]:
+                vocabulary.setdefault(feature, len(vocabulary))
+
+        counts = np.zeros((len(classes), len(vocabulary)), dtype=np.float32)
+        for row, category_id in enumerate(classes):
+            items = self.feature_counts[category_id]
+            if items:
+                counts[row, [vocabulary[f] for f in items]] = list(items.values())
+
+        totals = counts.sum(axis=1, keepdims=True)
+        log_likelihood = np.log(counts + self.alpha) - np.log(totals + self.alpha * max(len(vocabulary), 1))
+        doc_counts = np.array([self.doc_counts[c] for c in classes], dtype=np.float64)
+        log_prior = np.log(doc_counts / doc_counts.sum()) if len(classes) else doc_counts
+        self._compiled = (
+            vocabulary,
+            log_prior.astype(np.float32),
+            log_likelihood.astype(np.float32),
+            counts > 0,
+            np.array(classes, dtype=np.int64),
+            [self.class_types[c] for c in classes]
+        )
+        return self._compiled
+
+    def predict(
+        self,
+        batch_features: Sequence[List[str]],
+        category_types: Optional[Sequence[Optional[str]]] = None
+    ) -> List[Optional[Tuple[int, float]]]:
+        """
+        批量预测
+
+        Args:
+            batch_features: 每条交易的特征
+            category_types: 每条交易限定的分类类型（expense/income），None 表示不限
+
+        Returns:
+            每条交易的 (分类ID, 概率)，没有已知特征或没有可选类别时为 None
+        """
+        results: List[Optional[Tuple[int, float]]] = [None] * len(batch_features)
+        vocabulary, _, _, _, classes, _ = self._compile()
+        if not len(classes):
+            return results
+
+        rows, indices, starts = [], [], []
+        for row, features in enumerate(batch_features):
+            known = [vocabulary[f] for f in features if f in vocabulary]
+            if not known:
+                continue
+            if indices and len(indices) + len(known) > PREDICT_CHUNK_FEATURES:
+                self._predict_chunk(rows, indices, starts, category_types, results)
+                rows, indices, starts = [], [], []
+            rows.append(row)
+            starts.append(len(indices))
+            indices.extend(known)
+        if rows:
+            self._predict_chunk(rows, indices, starts, category_types, results)
+        return results
+
+    def _predict_chunk(
+        self,
+        rows: List[int],
+        indices: List[int],
+        starts: List[int],
+        category_types: Optional[Sequence[Optional[str]]],
+        results: List[Optional[Tuple[int, float]]]
+    ) -> None:
+        """对一块交易打分，结果写入 results 对应位置"""
+        _, log_prior, log_likelihood, present, classes, class_types = self._compile()
+
+        # 每条交易的特征对数似然求和：先按特征取列，再按交易分段累加
+        joint = np.add.reduceat(log_likelihood[:, indices], starts, axis=1) + log_prior[:, None]
+
+        if category_types is not None:
+            class_types = np.array(class_types)
+            wanted = np.array([category_types[row] or "" for row in rows])
+            mask = (class_types[:, None] == wanted[None, :]) | (wanted[None, :] == "")
+            joint = np.where(mask, joint, -np.inf)
+
+        best = joint.argmax(axis=0)
+        columns = np.arange(len(rows))
+        top = joint[best, columns]
+        # 最佳类别至少见过其中一个特征才给出预测（否则只是先验和平滑的差异）；只取最佳类别所在行
+        lengths = np.diff(np.append(starts, len(indices)))
+        seen = present[np.repeat(best, lengths), indices]
+        evidence = np.add.reduceat(seen.astype(np.int32), starts) > 0
+        finite = np.isfinite(top) & evidence
+        with np.errstate(invalid="ignore", over="ignore"):
+            probabilities = 1.0 / np.exp(joint - top[None, :]).sum(axis=0)
+
+        for position, row in enumerate(rows):
+            if finite[position]:
+                results[row] = (int(classes[best[position]]), float(probabilities[position]))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "user_id": self.user_id,
+            "alpha": self.alpha,
+            "version": self.version,
+            "trained_at": self.trained_at,
+            "holdout": [self.holdout_total, self.holdout_correct],
+            "feedback": [self.feedback_total, self.feedback_correct],
+            "labels": {str(transaction_id): list(label) for transaction_id, label in self.labels.items()},
+            "classes": {
+                str(category_id): {
+                    "type": self.class_types[category_id],
+                    "docs": self.doc_counts[category_id],
+                    "counts": self.feature_counts[category_id]
+                }
+                for category_id in self.doc_counts
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "NaiveBayesModel":
+        model = cls(data["user_id"], data.get("alpha", 1.0))
+        model.version = data.get("version", 0)
+        model.trained_at = data.get("trained_at")
+        model.holdout_total, model.holdout_correct = data.get("holdout", [0, 0])
+        model.feedback_total, model.feedback_correct = data.get("feedback", [0, 0])
+        model.labels = {int(transaction_id): tuple(label) for transaction_id, label in data.get("labels", {}).items()}
+        for category_id, entry in data.get("classes", {}).items():
+            model.class_types[int(category_id)] = entry["type"]
+            model.doc_counts[int(category_id)] = entry["docs"]
+            model.feature_counts[int(category_id)] = entry["counts"]
+        return model
+
+
+def category_type_of(transaction_type: Optional[TransactionType]) -> Optional[str]:
+    """交易类型对应的分类类型，转账等不限定"""
+    if transaction_type == TransactionType.EXPENSE:
+        return "expense"
+    if transaction_type == TransactionType.INCOME:
+        return "income"
+    return None
+
+
+class MerchantClassifierService:
+    """用户商户分类器的训练、持久化、预测和反馈学习"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def train(self, user_id: int) -> NaiveBayesModel:
+        """
+        用用户全部已分类的收支交易重新训练并保存
+
+        留出每第 HOLDOUT_EVERY 条交易评估准确度，之后用全部数据训练最终模型。
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            训练好的模型
+        """
+        rows = self.db.query(
+            Transaction.id,
+            Transaction.merchant_name,
+            Transaction.remark,
+            Transaction.original_category,
+            Transaction.category_id,
+            Category.type
+        ).join(Category, Category.id == Transaction.category_id).filter(
+            Transaction.user_id == user_id,
+            Transaction.type.in_([TransactionType.EXPENSE, TransactionType.INCOME])
+        ).order_by(Transaction.id).all()
+
+        samples = []
+        for row in rows:
+            features = extract_features(row.merchant_name, row.remark, row.original_category)
+            if features:
+                samples.append((row.id, features, row.category_id, getattr(row.type, "value", row.type)))
+
+        previous = self.get_model(user_id)
+        model = NaiveBayesModel(user_id)
+
+        holdout = samples[HOLDOUT_EVERY - 1::HOLDOUT_EVERY]
+        if holdout and len(samples) > len(holdout):
+            model.fit(sample for i, sample in enumerate(samples) if (i + 1) % HOLDOUT_EVERY)
+            predictions = model.predict([s[1] for s in holdout], [s[3] for s in holdout])
+            model.holdout_total = len(holdout)
+            model.holdout_correct = sum(
+                1 for prediction, sample in zip(predictions, holdout)
+                if prediction and prediction[0] == sample[2]
+            )
+
+        model.fit(samples)
+        model.version = (previous.version if previous else 0) + 1
+        self.save(model)
+        return model
+
+    def get_model(self, user_id: int) -> Optional[NaiveBayesModel]:
+        """获取用户模型（进程缓存，其次本地文件），没有时为 None"""
+        model = classifier_models.get(user_id)
+        if model is not None:
+            return model
+
+        path = self._model_path(user_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            model = NaiveBayesModel.from_dict(json.load(f))
+        classifier_models.set(user_id, model)
+        return model
+
+    def save(self, model: NaiveBayesModel) -> None:
+        """原子写入模型文件并更新缓存"""
+        path = self._model_path(model.user_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(model.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        classifier_models.set(model.user_id, model)
+
+    def predict(self, user_id: int, rows: Sequence[Dict[str, Any]]) -> List[Optional[Tuple[int, float]]]:
+        """
+        批量预测交易数据的分类
+
+        Args:
+            user_id: 用户ID
+            rows: 交易数据字典，包含 merchant_name / remark(description) / original_category / transaction_type
+
+        Returns:
+            每条的 (分类ID, 概率)，没有模型或无法预测时为 None
+        """
+        model = self.get_model(user_id)
+        if model is None:
+            return [None] * len(rows)
+        return model.predict(
+            [row_features(row) for row in rows],
+            [category_type_of(row.get("transaction_type")) for row in rows]
+        )
+
+    def learn_feedback(self, transaction: Transaction, correct_category: Category) -> Dict[str, Any]:
+        """
+        用一条反馈增量更新模型（不保存，随会话提交后写入文件）
+
+        交易已按正确分类计入时不变（确认反馈、重复反馈）；按其他分类计入过时先撤销原样本。
+
+        Args:
+            transaction: 被反馈的交易
+            correct_category: 用户确认的正确分类
+
+        Returns:
+            model_version / accuracy / confidence_after
+        """
+        model = self.get_model(transaction.user_id) or NaiveBayesModel(transaction.user_id)
+        features = extract_features(transaction.merchant_name, transaction.remark, transaction.original_category)
+        category_type = getattr(correct_category.type, "value", correct_category.type)
+
+        if features:
+            predicted = model.predict([features], [category_type])[0]
+            if model.relabel(transaction.id, features, correct_category.id, category_type):
+                # 同一交易的重复反馈不重复计入准确度
+                model.feedback_total += 1
+                model.feedback_correct += 1 if predicted and predicted[0] == correct_category.id else 0
+                classifier_models.set(model.user_id, model)
+                self.db.info.setdefault(PENDING_MODELS_KEY, {})[model.user_id] = model
+
+        after = model.predict([features], [category_type])[0] if features else None
+        return {
+            "model_version": model.model_version,
+            "accuracy": model.accuracy,
+            "confidence_after": after[1] if after and after[0] == correct_category.id else 0.0
+        }
+
+    def _model_path(self, user_id: int) -> str:
+        return os.path.join(settings.classifier_model_path, f"user_{user_id}.json")
+
+
+@event.listens_for(Session, "after_commit")
+def _save_pending_models(session: Session) -> None:
+    pending: Dict[int, NaiveBayesModel] = session.info.pop(PENDING_MODELS_KEY, {})
+    for model in pending.values():
+        MerchantClassifierService(session).save(model)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_models(session: Session) -> None:
+    # 缓存中的模型已被原地修改，丢弃后从文件重新读取
+    pending: Dict[int, NaiveBayesModel] = session.info.pop(PENDING_MODELS_KEY, {})
+    if pending:
+        classifier_models.invalidate(lambda user_id: user_id in pending)
@@ -0,0 +1,190 @@
+"""
+商户分类建议索引
+
+把用户的 category_suggestions 一次加载到内存：商户名（小写）哈希表用于精确匹配，
+规范商户ID（见 merchant_canonicalizer）哈希表把同一商户的不同写法归到一起，
+单字/双字倒排索引用于“名称包含查询串”的模糊匹配（等价于 ILIKE '%merchant%'），
+候选按置信度、出现次数、成功次数排序。索引按会话和用户缓存在 session.info 中，
+建议的新增和置信度变化通过 upsert 增量更新。
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app.models.category_suggestion import CategorySuggestion
+
+INDEXES_KEY = "merchant_suggestion_indexes"
+
+
+def _grams(text: str) -> Set[str]:
+    """单字和相邻双字"""
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _rank_key(suggestion: CategorySuggestion):
+    return (
+        -(suggestion.confidence or 0),
+        -(suggestion.frequency or 0),
+        -(suggestion.success_count or 0),
+        suggestion.id or 0
+    )
+
+
+class MerchantSuggestionIndex:
+    """单个用户的商户建议内存索引"""
+
+    def __init__(self, suggestions: Iterable[CategorySuggestion] = ()):
+        self._suggestions: Dict[int, CategorySuggestion] = {}
+        self._names: Dict[int, str] = {}
+        self._exact: Dict[str, Set[int]] = defaultdict(set)
+        self._merchant_ids: Dict[int, int] = {}
+        self._by_merchant: Dict[int, Set[int]] = defaultdict(set)
+        # 每个规范商户排名最高的建议，该商户的建议变化时失效
+        self._merchant_best: Dict[int, Optional[CategorySuggestion]] = {}
+        self._grams: Dict[str, Set[int]] = defaultdict(set)
+        for suggestion in suggestions:
+            self.upsert(suggestion)
+
+    @classmethod
+    def for_session(cls, db: Session, user_id: int) -> "MerchantSuggestionIndex":
+        """
+        获取会话内共享的用户索引，首次使用时一次查询加载
+
+        Args:
+            db: 数据库会话
+            user_id: 用户ID
+
+        Returns:
+            索引
+        """
+        indexes = db.info.setdefault(INDEXES_KEY, {})
+        index = indexes.get(user_id)
+        if index is None:
+            index = indexes[user_id] = cls(
+                db.query(CategorySuggestion).filter(CategorySuggestion.user_id == user_id).all()
+            )
+        return index
+
+    def __len__(self) -> int:
+        return len(self._suggestions)
+
+    def upsert(self, suggestion: CategorySuggestion) -> None:
+        """
+        加入或刷新建议（需已 flush，拥有ID）
+
+        Args:
+            suggestion: 分类建议
+        """
+        if suggestion.id is None:
+            return
+        self.remove(suggestion.id)
+
+        name = (suggestion.merchant_name or "").lower()
+        self._suggestions[suggestion.id] = suggestion
+        self._names[suggestion.id] = name
+        self._exact[name].add(suggestion.id)
+        if suggestion.merchant_id is not None:
+            self._merchant_ids[suggestion.id] = suggestion.merchant_id
+            self._by_merchant[suggestion.merchant_id].add(suggestion.id)
+            self._merchant_best.pop(suggestion.merchant_id, None)
+        for gram in _grams(name):
+            self._grams[gram].add(suggestion.id)
+
+    def remove(self, suggestion_id: int) -> None:
+        """移除建议"""
+        if suggestion_id not in self._suggestions:
+            return
+        name = self._names.pop(suggestion_id)
+        del self._suggestions[suggestion_id]
+        self._discard(self._exact, name, suggestion_id)
+        merchant_id = self._merchant_ids.pop(suggestion_id, None)
+        if merchant_id is not None:
+            self._discard(self._by_merchant, merchant_id, suggestion_id)
+            self._merchant_best.pop(merchant_id, None)
+        for gram in _grams(name):
+            self._discard(self._grams, gram, suggestion_id)
+
+    @staticmethod
+    def _discard(postings: Dict, key, suggestion_id: int) -> None:
+        ids = postings.get(key)
+        if ids is not None:
+            ids.discard(suggestion_id)
+            if not ids:
+                del postings[key]
+
+    def exact(self, merchant_name: str, min_confidence: float = 0.0) -> Optional[CategorySuggestion]:
+        """
+        精确匹配商户名
+
+        Args:
+            merchant_name: 商户名称
+            min_confidence: 最低置信度
+
+        Returns:
+            排名最高的建议
+        """
+        candidates = [
+            self._suggestions[suggestion_id]
+            for suggestion_id in self._exact.get((merchant_name or "").lower(), ())
+        ]
+        return self._best(candidates, min_confidence)
+
+    def by_merchant(self, merchant_id: Optional[int], min_confidence: float = 0.0) -> Optional[CategorySuggestion]:
+        """
+        按规范商户ID匹配（同一商户的不同写法）
+
+        Args:
+            merchant_id: 规范商户ID
+            min_confidence: 最低置信度
+
+        Returns:
+            排名最高的建议
+        """
+        if merchant_id is None:
+            return None
+        if merchant_id not in self._merchant_best:
+            candidates = [self._suggestions[suggestion_id] for suggestion_id in self._by_merchant.get(merchant_id, ())]
+            self._merchant_best[merchant_id] = self._best(candidates, 0.0)
+        # 排名以置信度优先，最高者不满足则其余都不满足
+        best = self._merchant_best[merchant_id]
+        return best if best is not None and (best.confidence or 0) >= min_confidence else None
+
+    def search(
+        self,
+        fragment: str,
+        min_confidence: float = 0.0,
+        limit: Optional[int] = None
+    ) -> List[CategorySuggestion]:
+        """
+        查找商户名包含 fragment 的建议
+
+        Args:
+            fragment: 查询串
+            min_confidence: 最低置信度
+            limit: 返回数量限制
+
+        Returns:
+            按置信度、出现次数、成功次数降序的建议列表
+        """
+        fragment = (fragment or "").lower()
+        if not fragment:
+            candidate_ids = set(self._suggestions)
+        else:
+            keys = [fragment] if len(fragment) == 1 else [fragment[i:i + 2] for i in range(len(fragment) - 1)]
+            postings = sorted((self._grams.get(key, set()) for key in keys), key=len)
+            candidate_ids = set(postings[0]).intersection(*postings[1:]) if postings else set()
+
+        matches = [
+            self._suggestions[suggestion_id]
+            for suggestion_id in candidate_ids
+            if fragment in self._names[suggestion_id]
+            and (self._suggestions[suggestion_id].confidence or 0) >= min_confidence
+        ]
+        matches.sort(key=_rank_key)
+        return matches[:limit] if limit is not None else matches
+
+    def _best(self, candidates: List[CategorySuggestion], min_confidence: float) -> Optional[CategorySuggestion]:
+        candidates = [c for c in candidates if (c.confidence or 0) >= min_confidence]
+        return min(candidates, key=_rank_key) if candidates else None
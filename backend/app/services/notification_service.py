@@ -0,0 +1,287 @@
+"""
+通知发件箱与投递
+
+提醒触发时只向 notification_outbox 批量写入待发送通知（与推进 next_fire_at 同一事务），
+由后台投递任务分批取出、交给投递渠道（sink）发送，成功的批量标记已发送并回写
+reminders.last_reminded_at，失败的按指数退避重试，超过次数标记为失败。
+未送达（待发送/失败）的通知保留在用户的通知收件箱中，客户端读取后确认即标记为已发送。
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import insert, update, or_
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.core.events import broker
+from app.models.notification_outbox import NotificationOutbox, OutboxStatus
+from app.models.reminder import Reminder
+
+# 首次重试间隔，之后每次翻倍
+RETRY_BASE_DELAY = timedelta(seconds=30)
+RETRY_MAX_DELAY = timedelta(hours=1)
+
+
+class NotificationSink:
+    """投递渠道：批量发送通知，返回发送失败的通知ID及原因"""
+
+    def send(self, notifications: List[NotificationOutbox]) -> Dict[int, str]:
+        raise NotImplementedError
+
+
+class BrokerSink(NotificationSink):
+    """
+    推送给连接到当前进程的客户端（SSE）
+
+    用户在当前进程没有连接时视为发送失败，按退避重试；始终未送达的通知由客户端通过
+    通知收件箱读取并确认。
+    """
+
+    def send(self, notifications: List[NotificationOutbox]) -> Dict[int, str]:
+        failed = {}
+        for notification in notifications:
+            if not broker.publish(notification.user_id, {"event": "reminder", **notification.payload}):
+                failed[notification.id] = "用户当前没有在线连接"
+        return failed
+
+
+class FileSink(NotificationSink):
+    """逐行写入本地 JSONL 文件，用于开发调试"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, notifications: List[NotificationOutbox]) -> Dict[int, str]:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        lines = [
+            json.dumps({
+                "id": notification.id,
+                "user_id": notification.user_id,
+                "channel": notification.channel,
+                "payload": notification.payload
+            }, ensure_ascii=False, default=str)
+            for notification in notifications
+        ]
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return {}
+
+
+class MemorySink(NotificationSink):
+    """保存在内存中，可指定失败的通知ID，用于测试"""
+
+    def __init__(self):
+        self.sent: List[Dict[str, Any]] = []
+        self.fail_ids: Dict[int, str] = {}
+
+    def send(self, notifications: List[NotificationOutbox]) -> Dict[int, str]:
+        failed = {}
+        for notification in notifications:
+            if notification.id in self.fail_ids:
+                failed[notification.id] = self.fail_ids[notification.id]
+            else:
+                self.sent.append({"id": notification.id, "user_id": notification.user_id, "payload": notification.payload})
+        return failed
+
+
+def get_sink(name: Optional[str] = None) -> NotificationSink:
+    """
+    按名称创建投递渠道
+
+    Args:
+        name: broker / file / memory，默认取配置 notification_sink
+
+    Returns:
+        投递渠道
+    """
+    name = name or settings.notification_sink
+    if name == "broker":
+        return BrokerSink()
+    if name == "file":
+        return FileSink(settings.notification_file_path)
+    if name == "memory":
+        return MemorySink()
+    raise ValueError(f"未知的通知渠道: {name}")
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """第 attempts 次失败后的重试间隔"""
+    return min(RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0)), RETRY_MAX_DELAY)
+
+
+class NotificationService:
+    """通知发件箱服务"""
+
+    def __init__(self, db: Session, sink: Optional[NotificationSink] = None):
+        self.db = db
+        self.sink = sink
+
+    def enqueue(self, notifications: Iterable[Dict[str, Any]], now: Optional[datetime] = None, channel: str = "in_app") -> int:
+        """
+        批量写入待发送通知（不提交）
+
+        Args:
+            notifications: 通知内容，需包含 user_id，来自提醒的包含 id（提醒ID）
+            now: 创建时间
+            channel: 投递渠道
+
+        Returns:
+            写入的通知数量
+        """
+        now = now or datetime.now()
+        rows = [
+            {
+                "user_id": notification["user_id"],
+                "reminder_id": notification.get("id"),
+                "channel": channel,
+                "payload": notification,
+                "status": OutboxStatus.PENDING,
+                "attempts": 0,
+                "next_attempt_at": now,
+                "created_at": now
+            }
+            for notification in notifications
+        ]
+        for i in range(0, len(rows), 1000):
+            self.db.execute(insert(NotificationOutbox), rows[i:i + 1000])
+        return len(rows)
+
+    def deliver_pending(
+        self,
+        now: Optional[datetime] = None,
+        batch_size: Optional[int] = None,
+        max_batches: int = 20
+    ) -> Dict[str, int]:
+        """
+        分批投递到期的待发送通知，每批提交一次
+
+        Args:
+            now: 当前时间
+            batch_size: 每批数量，默认取配置
+            max_batches: 单次运行最多处理的批数
+
+        Returns:
+            发送成功、待重试、最终失败的数量
+        """
+        now = now or datetime.now()
+        batch_size = batch_size or settings.notification_batch_size
+        sink = self.sink or get_sink()
+        result = {"sent": 0, "retrying": 0, "failed": 0}
+
+        for _ in range(max_batches):
+            batch = self.db.query(NotificationOutbox).filter(
+                NotificationOutbox.status == OutboxStatus.PENDING,
+                NotificationOutbox.next_attempt_at <= now
+            ).order_by(NotificationOutbox.id).limit(batch_size).all()
+            if not batch:
+                break
+
+            try:
+                failures = sink.send(batch)
+            except Exception as e:
+                failures = {notification.id: str(e) for notification in batch}
+
+            sent = [notification for notification in batch if notification.id not in failures]
+            self._mark_sent(sent, now)
+            retrying, failed = self._mark_failed(
+                [notification for notification in batch if notification.id in failures], failures, now
+            )
+            self.db.commit()
+
+            result["sent"] += len(sent)
+            result["retrying"] += retrying
+            result["failed"] += failed
+            if len(batch) < batch_size:
+                break
+
+        return result
+
+    def list_inbox(self, user_id: int, include_sent: bool = False, limit: int = 50) -> List[NotificationOutbox]:
+        """
+        用户通知收件箱，默认只返回尚未送达（待发送/失败）的通知
+
+        Args:
+            user_id: 用户ID
+            include_sent: 是否包含已送达的通知
+            limit: 返回数量
+
+        Returns:
+            按时间倒序的通知
+        """
+        query = self.db.query(NotificationOutbox).filter(NotificationOutbox.user_id == user_id)
+        if not include_sent:
+            query = query.filter(NotificationOutbox.status != OutboxStatus.SENT)
+        return query.order_by(NotificationOutbox.id.desc()).limit(limit).all()
+
+    def acknowledge(self, user_id: int, notification_ids: List[int], now: Optional[datetime] = None) -> int:
+        """
+        客户端确认已读，标记为已发送并停止重试
+
+        Args:
+            user_id: 用户ID
+            notification_ids: 通知ID
+            now: 确认时间
+
+        Returns:
+            确认的通知数量
+        """
+        now = now or datetime.now()
+        notifications = self.db.query(NotificationOutbox).filter(
+            NotificationOutbox.user_id == user_id,
+            NotificationOutbox.id.in_(notification_ids),
+            NotificationOutbox.status != OutboxStatus.SENT
+        ).all()
+        self._mark_sent(notifications, now, count_attempt=False)
+        self.db.commit()
+        return len(notifications)
+
+    def _mark_sent(self, notifications: List[NotificationOutbox], now: datetime, count_attempt: bool = True) -> None:
+        """批量标记已发送，并按触发时间回写提醒的最后提醒时间"""
+        if not notifications:
+            return
+        values = {
+            NotificationOutbox.status: OutboxStatus.SENT,
+            NotificationOutbox.sent_at: now,
+            NotificationOutbox.last_error: None
+        }
+        if count_attempt:
+            values[NotificationOutbox.attempts] = NotificationOutbox.attempts + 1
+        self.db.query(NotificationOutbox).filter(
+            NotificationOutbox.id.in_([notification.id for notification in notifications])
+        ).update(values, synchronize_session=False)
+
+        # 同一次触发的通知创建时间相同，通常只需一条 UPDATE
+        fired: Dict[datetime, List[int]] = {}
+        for notification in notifications:
+            if notification.reminder_id:
+                fired.setdefault(notification.created_at, []).append(notification.reminder_id)
+        for fired_at, reminder_ids in fired.items():
+            self.db.query(Reminder).filter(
+                Reminder.id.in_(reminder_ids),
+                or_(Reminder.last_reminded_at == None, Reminder.last_reminded_at < fired_at)
+            ).update({Reminder.last_reminded_at: fired_at}, synchronize_session=False)
+
+    def _mark_failed(self, notifications: List[NotificationOutbox], failures: Dict[int, str], now: datetime) -> tuple:
+        """记录失败并安排重试，超过最大次数标记为失败"""
+        if not notifications:
+            return 0, 0
+        rows = []
+        failed = 0
+        for notification in notifications:
+            attempts = (notification.attempts or 0) + 1
+            exhausted = attempts >= settings.notification_max_attempts
+            failed += exhausted
+            rows.append({
+                "id": notification.id,
+                "attempts": attempts,
+                "status": OutboxStatus.FAILED if exhausted else OutboxStatus.PENDING,
+                "next_attempt_at": now + retry_delay(attempts),
+                "last_error": (failures.get(notification.id) or "")[:1000]
+            })
+        self.db.execute(update(NotificationOutbox), rows)
+        return len(rows) - failed, failed
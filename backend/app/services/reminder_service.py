@@ -1,15 +1,87 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, desc
-from typing import Optional, List
-from datetime import datetime, time, date
-from decimal import Decimal
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import and_, or_, desc
+from typing import Optional, List, Iterable, Set
+from datetime import datetime, time, date, timedelta
 
 from app.models.reminder import Reminder, ReminderType
 from app.models.user import User
 from app.models.transaction import Transaction
-from app.models.budget import Budget
-from app.schemas.reminder import ReminderCreate, ReminderUpdate
+from app.models.budget import Budget, PeriodType
+from app.schemas.reminder import ReminderCreate, ReminderUpdate, ReminderNotification
 from app.core.exceptions import ValidationError, NotFoundError
+from app.services.budget_service import BudgetService
+from app.services.notification_service import NotificationService
+
+# 定时提醒在计划时间后多久内仍会发送，超过则跳到下一次
+REMINDER_GRACE = timedelta(hours=1)
+# 预算提醒未达到阈值时的复查间隔
+BUDGET_CHECK_INTERVAL = timedelta(minutes=30)
+# 预算提醒的使用率阈值
+BUDGET_REMINDER_RATE = 0.8
+
+
+def compute_next_fire_at(
+    reminder: Reminder,
+    now: Optional[datetime] = None,
+    reminded_at: Optional[datetime] = None
+) -> Optional[datetime]:
+    """
+    计算提醒的下次触发时间
+
+    每日/循环/报告提醒取不早于 now - REMINDER_GRACE 且当天尚未提醒过的最近计划时间；
+    预算提醒当天未提醒过则立即可检查，否则从次日零点起检查。
+
+    Args:
+        reminder: 提醒
+        now: 当前时间
+        reminded_at: 视为最后提醒的时间，默认取 reminder.last_reminded_at（通知投递后才回写）
+
+    Returns:
+        下次触发时间，无法触发（缺少时间设置）时为 None
+    """
+    now = now or datetime.now()
+    reminded_at = reminded_at or reminder.last_reminded_at
+    last_day = reminded_at.date() if reminded_at else None
+
+    if reminder.type == ReminderType.BUDGET:
+        if last_day and last_day >= now.date():
+            return datetime.combine(now.date() + timedelta(days=1), time.min)
+        return now
+
+    if not reminder.remind_time:
+        return None
+    remind_time = reminder.remind_time.replace(tzinfo=None)
+
+    def eligible(day: date) -> bool:
+        candidate = datetime.combine(day, remind_time)
+        return candidate >= now - REMINDER_GRACE and (last_day is None or day > last_day)
+
+    if reminder.type == ReminderType.DAILY:
+        day = now.date()
+        while not eligible(day):
+            day += timedelta(days=1)
+        return datetime.combine(day, remind_time)
+
+    if reminder.type == ReminderType.RECURRING:
+        day_of_month = reminder.remind_day
+    elif reminder.type == ReminderType.REPORT:
+        day_of_month = 1
+    else:
+        return None
+    if not day_of_month:
+        return None
+
+    # 逐月查找，跳过没有该日期的月份
+    year, month = now.year, now.month
+    for _ in range(24):
+        try:
+            day = date(year, month, day_of_month)
+        except ValueError:
+            day = None
+        if day and eligible(day):
+            return datetime.combine(day, remind_time)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return None
 
 class ReminderService:
     def __init__(self, db: Session):
@@ -43,6 +115,7 @@ class ReminderService:
             user_id=user_id,
             **reminder_data.model_dump(exclude_unset=True)
         )
+        reminder.next_fire_at = compute_next_fire_at(reminder)
 
         self.db.add(reminder)
         self.db.commit()
@@ -136,6 +209,7 @@ class ReminderService:
         # 更新字段
         for field, value in update_data.items():
             setattr(reminder, field, value)
+        reminder.next_fire_at = compute_next_fire_at(reminder)
 
         self.db.commit()
         self.db.refresh(reminder)
@@ -160,67 +234,108 @@ class ReminderService:
 
         return True
 
-    def get_due_reminders(self) -> List[Reminder]:
+    def get_due_reminders(self, now: Optional[datetime] = None, limit: int = 1000) -> List[Reminder]:
         """
         获取到期的提醒（系统调用）
 
+        只按 next_fire_at 索引取出本次到期的提醒；超过宽限期未发送的定时提醒
+        直接顺延，未达到阈值的预算提醒推迟复查，均不返回。
+
+        Args:
+            now: 当前时间
+            limit: 单次最多处理的提醒数
+
         Returns:
             到期的提醒列表
         """
-        now = datetime.now()
-        current_time = now.time()
-        current_date = now.date()
+        now = now or datetime.now()
 
-        # 查询到期的提醒
-        reminders = self.db.query(Reminder).filter(
-            Reminder.is_enabled == True
-        ).all()
+        reminders = self.db.query(Reminder).options(selectinload(Reminder.category)).filter(
+            Reminder.is_enabled == True,
+            Reminder.next_fire_at <= now
+        ).order_by(Reminder.next_fire_at).limit(limit).all()
 
-        due_reminders = []
+        budget_reminders = [r for r in reminders if r.type == ReminderType.BUDGET]
+        triggered = self._evaluate_budget_reminders(budget_reminders, now)
 
+        due_reminders = []
         for reminder in reminders:
-            should_remind = False
-
-            if reminder.type == ReminderType.DAILY:
-                # 每日提醒：检查时间
-                if reminder.remind_time:
-                    # 简化处理：检查是否在提醒时间后的1小时内
-                    target_time = reminder.remind_time
-                    time_diff = abs((now.hour - target_time.hour) * 60 + (now.minute - target_time.minute))
-                    if time_diff <= 60:  # 1小时内
-                        # 检查今天是否已经提醒过
-                        if not self._was_reminded_today(reminder, current_date):
-                            should_remind = True
-
-            elif reminder.type == ReminderType.BUDGET:
-                # 预算提醒：检查预算使用情况
-                if self._should_trigger_budget_reminder(reminder):
-                    should_remind = True
-
-            elif reminder.type == ReminderType.RECURRING:
-                # 循环提醒：检查日期
-                if reminder.remind_day == current_date.day and reminder.remind_time:
-                    target_time = reminder.remind_time
-                    time_diff = abs((now.hour - target_time.hour) * 60 + (now.minute - target_time.minute))
-                    if time_diff <= 60:  # 1小时内
-                        if not self._was_reminded_today(reminder, current_date):
-                            should_remind = True
-
-            elif reminder.type == ReminderType.REPORT:
-                # 分析报告提醒：每月1号
-                if current_date.day == 1:
-                    if reminder.remind_time:
-                        target_time = reminder.remind_time
-                        time_diff = abs((now.hour - target_time.hour) * 60 + (now.minute - target_time.minute))
-                        if time_diff <= 60:  # 1小时内
-                            if not self._was_reminded_today(reminder, current_date):
-                                should_remind = True
-
-            if should_remind:
+            if reminder.type == ReminderType.BUDGET:
+                if reminder.id in triggered:
+                    due_reminders.append(reminder)
+                else:
+                    reminder.next_fire_at = now + BUDGET_CHECK_INTERVAL
+            elif reminder.next_fire_at < now - REMINDER_GRACE:
+                # 错过宽限期（如服务停机），不再补发
+                reminder.next_fire_at = compute_next_fire_at(reminder, now)
+            else:
                 due_reminders.append(reminder)
 
+        self.db.commit()
         return due_reminders
 
+    def process_due_reminders(
+        self,
+        now: Optional[datetime] = None,
+        batch_size: int = 1000,
+        max_batches: int = 20
+    ) -> List[dict]:
+        """
+        处理到期提醒：生成通知写入发件箱，并推进下次触发时间（手动接口和后台定时任务共用）
+
+        每批的通知与 next_fire_at 在同一事务中批量写入；实际发送及 last_reminded_at
+        的回写由通知投递任务完成。
+
+        Args:
+            now: 当前时间
+            batch_size: 每批处理的提醒数
+            max_batches: 单次最多处理的批数，剩余的留到下次
+
+        Returns:
+            通知列表
+        """
+        now = now or datetime.now()
+        notification_service = NotificationService(self.db)
+        notifications = []
+
+        for _ in range(max_batches):
+            due_reminders = self.get_due_reminders(now, limit=batch_size)
+            if not due_reminders:
+                break
+
+            batch = [
+                ReminderNotification(
+                    id=reminder.id,
+                    type=reminder.type,
+                    title=reminder.title or f"{reminder.type.value}提醒",
+                    content=reminder.content or "您有待处理的提醒",
+                    user_id=reminder.user_id,
+                    category_name=reminder.category.name if reminder.category else None
+                ).model_dump(mode="json")
+                for reminder in due_reminders
+            ]
+            for reminder in due_reminders:
+                reminder.next_fire_at = compute_next_fire_at(reminder, now, reminded_at=now)
+            notification_service.enqueue(batch, now)
+            self.db.commit()
+            notifications.extend(batch)
+
+        return notifications
+
+    def mark_fired(self, reminders: Iterable[Reminder], fired_at: Optional[datetime] = None) -> None:
+        """
+        记录提醒已发送并计算下次触发时间
+
+        Args:
+            reminders: 已发送的提醒
+            fired_at: 发送时间
+        """
+        fired_at = fired_at or datetime.now()
+        for reminder in reminders:
+            reminder.last_reminded_at = fired_at
+            reminder.next_fire_at = compute_next_fire_at(reminder, fired_at)
+        self.db.commit()
+
     def update_last_reminded(self, reminder_id: int) -> None:
         """
         更新最后提醒时间
@@ -230,8 +345,21 @@ class ReminderService:
         """
         reminder = self.db.query(Reminder).filter(Reminder.id == reminder_id).first()
         if reminder:
-            reminder.last_reminded_at = datetime.now()
-            self.db.commit()
+            self.mark_fired([reminder])
+
+    def reschedule_all(self, now: Optional[datetime] = None) -> int:
+        """
+        重新计算全部提醒的下次触发时间（迁移或修改调度规则后使用）
+
+        Returns:
+            处理的提醒数量
+        """
+        now = now or datetime.now()
+        reminders = self.db.query(Reminder).all()
+        for reminder in reminders:
+            reminder.next_fire_at = compute_next_fire_at(reminder, now)
+        self.db.commit()
+        return len(reminders)
 
     def check_and_create_daily_reminder(self, user_id: int) -> Optional[Reminder]:
         """
@@ -273,6 +401,56 @@ class ReminderService:
 
         return None
 
+    def check_daily_reminders_for_all(self, now: Optional[datetime] = None) -> int:
+        """
+        为今天尚未记账且从未设置过每日提醒的活跃用户批量创建每日记账提醒（后台定时任务）
+
+        已关闭每日提醒的用户同样跳过，不会被定时任务重新开启。
+
+        Args:
+            now: 当前时间
+
+        Returns:
+            创建的提醒数量
+        """
+        now = now or datetime.now()
+        today_start = datetime.combine(now.date(), time.min)
+
+        has_daily_reminder = self.db.query(Reminder.id).filter(
+            Reminder.user_id == User.id,
+            Reminder.type == ReminderType.DAILY
+        ).exists()
+        has_transaction_today = self.db.query(Transaction.id).filter(
+            Transaction.user_id == User.id,
+            Transaction.transaction_date >= today_start,
+            Transaction.transaction_date < today_start + timedelta(days=1)
+        ).exists()
+
+        user_ids = [
+            row[0] for row in self.db.query(User.id).filter(
+                User.is_active == True,
+                ~has_daily_reminder,
+                ~has_transaction_today
+            ).all()
+        ]
+
+        reminders = []
+        for user_id in user_ids:
+            reminder = Reminder(
+                user_id=user_id,
+                type=ReminderType.DAILY,
+                title="每日记账提醒",
+                content="记得今天记账哦！保持良好的记账习惯有助于财务管理。",
+                remind_time=time(20, 0),  # 晚上8点提醒
+                is_enabled=True
+            )
+            reminder.next_fire_at = compute_next_fire_at(reminder, now)
+            reminders.append(reminder)
+
+        self.db.add_all(reminders)
+        self.db.commit()
+        return len(reminders)
+
     def get_reminder_statistics(self, user_id: int) -> dict:
         """
         获取提醒统计信息
@@ -313,46 +491,42 @@ class ReminderService:
 
         return reminder.last_reminded_at.date() == current_date
 
-    def _should_trigger_budget_reminder(self, reminder: Reminder) -> bool:
+    def _evaluate_budget_reminders(self, reminders: List[Reminder], now: datetime) -> Set[int]:
         """
-        检查是否应该触发预算提醒
+        批量检查预算提醒：一次查询对应的当月预算，一次分组查询计算支出
 
         Args:
-            reminder: 预算提醒
+            reminders: 到期的预算提醒
+            now: 当前时间
 
         Returns:
-            是否应该触发提醒
+            应触发的提醒ID集合
         """
-        if not reminder.category_id:
-            return False
-
-        # 获取当前月份该分类的预算
-        current_month = datetime.now().month
-        current_year = datetime.now().year
-
-        budget = self.db.query(Budget).filter(
-            Budget.user_id == reminder.user_id,
-            Budget.category_id == reminder.category_id,
-            func.extract('month', Budget.start_date) == current_month,
-            func.extract('year', Budget.start_date) == current_year,
-            Budget.is_active == True
-        ).first()
+        reminders = [
+            r for r in reminders
+            if r.category_id and not self._was_reminded_today(r, now.date())
+        ]
+        if not reminders:
+            return set()
+
+        budgets = self.db.query(Budget).filter(
+            Budget.user_id.in_({r.user_id for r in reminders}),
+            Budget.category_id.in_({r.category_id for r in reminders}),
+            Budget.year == now.year,
+            Budget.month == now.month,
+            Budget.period_type == PeriodType.MONTHLY,
+            Budget.is_enabled == True
+        ).all()
+        if not budgets:
+            return set()
 
-        if not budget:
-            return False
+        spending = BudgetService(self.db).get_spending(budgets)
+        usage = {
+            (budget.user_id, budget.category_id): float(spending[budget.id]) / float(budget.amount)
+            for budget in budgets if budget.amount
+        }
 
-        # 计算当前支出
-        month_start = datetime(current_year, current_month, 1)
-        current_expense = self.db.query(func.sum(Transaction.amount)).filter(
-            Transaction.user_id == reminder.user_id,
-            Transaction.category_id == reminder.category_id,
-            Transaction.type == "expense",
-            Transaction.transaction_date >= month_start,
-            Transaction.transaction_date <= datetime.now()
-        ).scalar() or Decimal('0')
-
-        # 计算使用率
-        usage_rate = float(current_expense) / float(budget.amount)
-
-        # 使用率超过80%时提醒
-        return usage_rate >= 0.8 and not self._was_reminded_today(reminder, datetime.now().date())
\ No newline at end of file
+        return {
+            r.id for r in reminders
+            if usage.get((r.user_id, r.category_id), 0) >= BUDGET_REMINDER_RATE
+        }
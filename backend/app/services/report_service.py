@@ -3,11 +3,15 @@ from sqlalchemy import and_, func, desc
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
 from decimal import Decimal
+import json
 
 from app.models.transaction import Transaction, TransactionType
 from app.models.category import Category
 from app.models.account import Account
-from app.models.budget import Budget
+from app.models.budget import Budget, PeriodType
+from app.models.statistics_cache import StatisticsCache
+from app.models.merchant import Merchant
+from app.services.budget_service import BudgetService
 from app.core.exceptions import NotFoundError
 
 class ReportService:
@@ -70,6 +74,35 @@ class ReportService:
 
         return report
 
+    def store_monthly_report(self, user_id: int, year: int, month: int) -> Dict[str, Any]:
+        """
+        生成月度报告并保存到统计缓存（stat_type=monthly_report）
+
+        Args:
+            user_id: 用户ID
+            year: 年份
+            month: 月份
+
+        Returns:
+            月度报告数据
+        """
+        report = self.generate_monthly_report(user_id, year, month)
+        data = json.loads(json.dumps(report, default=str))
+        period = f"{year}-{month:02d}"
+
+        cache = self.db.query(StatisticsCache).filter(
+            StatisticsCache.user_id == user_id,
+            StatisticsCache.stat_type == "monthly_report",
+            StatisticsCache.period == period
+        ).first()
+        if cache:
+            cache.data = data
+        else:
+            self.db.add(StatisticsCache(user_id=user_id, stat_type="monthly_report", period=period, data=data))
+        self.db.commit()
+
+        return report
+
     def generate_yearly_report(self, user_id: int, year: int) -> Dict[str, Any]:
         """
         生成年度财务报告
@@ -300,9 +333,10 @@ class ReportService:
         """获取预算分析"""
         budgets = self.db.query(Budget).filter(
             Budget.user_id == user_id,
-            func.extract('year', Budget.start_date) == year,
-            func.extract('month', Budget.start_date) == month,
-            Budget.is_active == True
+            Budget.year == year,
+            Budget.month == month,
+            Budget.period_type == PeriodType.MONTHLY,
+            Budget.is_enabled == True
         ).all()
 
         budget_analysis = {
@@ -313,24 +347,14 @@ class ReportService:
             "budget_performance": []
         }
 
+        spending = BudgetService(self.db).get_spending(budgets)
         for budget in budgets:
-            # 计算当前支出
-            month_start = datetime(year, month, 1)
-            month_end = datetime(year, month + 1, 1) - timedelta(days=1) if month < 12 else datetime(year + 1, 1, 1) - timedelta(days=1)
-
-            current_expense = self.db.query(func.sum(Transaction.amount)).filter(
-                Transaction.user_id == user_id,
-                Transaction.category_id == budget.category_id,
-                Transaction.type == TransactionType.EXPENSE,
-                Transaction.transaction_date >= month_start,
-                Transaction.transaction_date <= month_end.replace(hour=23, minute=59, second=59, microsecond=999999)
-            ).scalar() or Decimal('0')
-
+            current_expense = spending.get(budget.id, Decimal('0'))
             usage_rate = float(current_expense) / float(budget.amount)
 
             budget_performance = {
                 "category_id": budget.category_id,
-                "category_name": budget.category.name if budget.category else "未知分类",
+                "category_name": budget.category.name if budget.category else "总预算",
                 "budget_amount": float(budget.amount),
                 "current_expense": float(current_expense),
                 "usage_rate": usage_rate,
@@ -454,14 +478,18 @@ class ReportService:
         return []
 
     def _get_merchant_analysis(self, user_id: int, category_id: int, days: int) -> List[Dict[str, Any]]:
-        """获取商户分析"""
+        """获取商户分析（按规范商户归并同一商户的不同写法）"""
         end_date = datetime.now()
         start_date = end_date - timedelta(days=days)
 
+        merchant_name = func.coalesce(Merchant.display_name, Transaction.merchant_name)
         merchants = self.db.query(
-            Transaction.merchant_name,
+            Transaction.merchant_id,
+            merchant_name.label('merchant_name'),
             func.sum(Transaction.amount).label('total_amount'),
             func.count(Transaction.id).label('transaction_count')
+        ).outerjoin(
+            Merchant, Merchant.id == Transaction.merchant_id
         ).filter(
             Transaction.user_id == user_id,
             Transaction.category_id == category_id,
@@ -469,7 +497,7 @@ class ReportService:
             Transaction.transaction_date <= end_date,
             Transaction.merchant_name.isnot(None)
         ).group_by(
-            Transaction.merchant_name
+            Transaction.merchant_id, merchant_name
         ).order_by(
             desc('total_amount')
         ).limit(10).all()
@@ -477,6 +505,7 @@ class ReportService:
         result = []
         for merchant in merchants:
             result.append({
+                "merchant_id": merchant.merchant_id,
                 "merchant_name": merchant.merchant_name,
                 "total_amount": float(merchant.total_amount),
                 "transaction_count": merchant.transaction_count
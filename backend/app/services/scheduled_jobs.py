@@ -0,0 +1,77 @@
+"""
+后台定时任务定义
+
+任务函数接收调度器为每次运行创建的独立数据库会话，返回值作为运行结果记入指标。
+"""
+
+from sqlalchemy.orm import Session
+from datetime import date, timedelta
+
+from app.config.settings import settings
+from app.core.scheduler import Scheduler
+from app.models.reminder import Reminder, ReminderType
+from app.services.reminder_service import ReminderService
+from app.services.notification_service import NotificationService
+from app.services.report_service import ReportService
+from app.services.balance_drift_service import BalanceDriftService
+
+
+def process_due_reminders(db: Session) -> dict:
+    """处理到期提醒"""
+    notifications = ReminderService(db).process_due_reminders()
+    return {"processed_count": len(notifications)}
+
+
+def deliver_notifications(db: Session) -> dict:
+    """投递发件箱中的待发送通知"""
+    return NotificationService(db).deliver_pending()
+
+
+def check_daily_reminders(db: Session) -> dict:
+    """为今天尚未记账的用户创建每日记账提醒"""
+    return {"created_count": ReminderService(db).check_daily_reminders_for_all()}
+
+
+def generate_monthly_reports(db: Session) -> dict:
+    """每月 1 日为开启了报告提醒的用户生成上月报告"""
+    today = date.today()
+    if today.day != 1:
+        return {"generated_count": 0}
+
+    last_month = today - timedelta(days=1)
+    user_ids = [
+        row[0] for row in db.query(Reminder.user_id).filter(
+            Reminder.type == ReminderType.REPORT,
+            Reminder.is_enabled == True
+        ).distinct().all()
+    ]
+
+    report_service = ReportService(db)
+    generated = 0
+    errors = []
+    for user_id in user_ids:
+        try:
+            report_service.store_monthly_report(user_id, last_month.year, last_month.month)
+            generated += 1
+        except Exception as e:
+            db.rollback()
+            errors.append({"user_id": user_id, "error": str(e)})
+
+    return {"generated_count": generated, "errors": errors[:10]}
+
+
+def check_balance_drift(db: Session) -> dict:
+    """比较账户余额与校验和，新出现的漂移写入校验记录"""
+    result = BalanceDriftService(db).check()
+    return {**result, "drifted_count": len(result["drifted"]), "drifted": result["drifted"][:10]}
+
+
+def register_jobs(scheduler: Scheduler) -> None:
+    """注册全部后台定时任务"""
+    scheduler.add_job("reminders.process_due", process_due_reminders, settings.reminder_tick_seconds)
+    scheduler.add_job("notifications.deliver", deliver_notifications, settings.notification_delivery_seconds)
+    # 每天 19:00 检查，提醒在 20:00 发送
+    scheduler.add_job("reminders.daily_check", check_daily_reminders, 86400, offset_seconds=19 * 3600)
+    scheduler.add_job("reports.monthly_auto", generate_monthly_reports, 86400, offset_seconds=9 * 3600)
+    # 每天 03:00 业务低峰检查余额漂移
+    scheduler.add_job("balances.drift_check", check_balance_drift, 86400, offset_seconds=3 * 3600)
@@ -1,16 +1,27 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, desc
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import and_, or_, func, desc, insert, update
 from typing import List, Optional, Dict, Tuple
 from datetime import datetime, timedelta
 import re
 import json
 
-from app.models.category import Category
 from app.models.transaction import Transaction, TransactionType
-from app.models.category_suggestion import CategorySuggestion, LearningRecord
+from app.models.category_suggestion import CategorySuggestion, LearningRecord, LearningWatermark
 from app.models.user import User
 from app.schemas.import_log import CategorySuggestion as CategorySuggestionSchema
 from app.core.exceptions import NotFoundError, ValidationError
+from app.services.category_resolver import CategoryResolver
+from app.services.merchant_suggestion_index import MerchantSuggestionIndex, INDEXES_KEY
+from app.services.merchant_classifier import MerchantClassifierService
+from app.services.merchant_canonicalizer import MerchantCanonicalizer
+
+# 分类器预测概率达到该值才作为建议
+ML_MIN_CONFIDENCE = 0.6
+# 从用户自己的交易学到的建议置信度较高
+LEARNED_CONFIDENCE = 0.7
+# 增量学习每次读取的交易数
+LEARNING_CHUNK_SIZE = 5000
 
 class SmartCategorizationService:
     def __init__(self, db: Session):
@@ -33,23 +44,22 @@ class SmartCategorizationService:
         Returns:
             分类建议列表
         """
-        suggestions = self.db.query(CategorySuggestion).filter(
-            CategorySuggestion.user_id == user_id,
-            CategorySuggestion.merchant_name.ilike(f"%{merchant_name}%")
-        ).order_by(
-            desc(CategorySuggestion.confidence),
-            desc(CategorySuggestion.frequency),
-            desc(CategorySuggestion.success_count)
-        ).limit(limit).all()
-
-        return suggestions
+        index = self._get_index(user_id)
+        results = index.search(merchant_name, limit=limit)
+        # 同一规范商户的其他写法排在最前
+        canonical = index.by_merchant(MerchantCanonicalizer(self.db).lookup(merchant_name))
+        if canonical and canonical not in results and limit > 0:
+            results = [canonical] + results[:limit - 1]
+        return results
 
     def suggest_category(
         self,
         user_id: int,
         merchant_name: str,
         amount: float,
-        transaction_type: TransactionType
+        transaction_type: TransactionType,
+        remark: Optional[str] = None,
+        original_category: Optional[str] = None
     ) -> Optional[CategorySuggestion]:
         """
         智能分类建议
@@ -59,39 +69,112 @@ class SmartCategorizationService:
             merchant_name: 商户名称
             amount: 金额
             transaction_type: 交易类型
+            remark: 备注（分类器特征）
+            original_category: 原始分类（分类器特征）
 
         Returns:
             分类建议
         """
-        # 1. 精确匹配
-        exact_match = self.db.query(CategorySuggestion).filter(
-            CategorySuggestion.user_id == user_id,
-            CategorySuggestion.merchant_name == merchant_name,
-            CategorySuggestion.confidence >= 0.8
-        ).first()
+        return self.suggest_categories(user_id, [{
+            "merchant_name": merchant_name,
+            "amount": amount,
+            "transaction_type": transaction_type,
+            "remark": remark,
+            "original_category": original_category
+        }])[0]
+
+    def suggest_categories(
+        self,
+        user_id: int,
+        transactions: List[Dict]
+    ) -> List[Optional[CategorySuggestion]]:
+        """
+        批量智能分类建议（整批导入/预览共用一次索引加载和一次分类器打分）
 
-        if exact_match:
-            return exact_match
+        依次尝试：商户名精确匹配 → 同一规范商户 → 商户名模糊匹配 → 分类器预测 → 关键词规则。
+        规范商户与模糊匹配同用 0.6 的置信度下限，学习得到的建议（LEARNED_CONFIDENCE）也能命中。
 
-        # 2. 模糊匹配
-        fuzzy_match = self.db.query(CategorySuggestion).filter(
-            CategorySuggestion.user_id == user_id,
-            CategorySuggestion.merchant_name.ilike(f"%{merchant_name}%"),
-            CategorySuggestion.confidence >= 0.6
-        ).order_by(
-            desc(CategorySuggestion.confidence),
-            desc(CategorySuggestion.frequency)
-        ).first()
+        Args:
+            user_id: 用户ID
+            transactions: 交易数据列表，包含 merchant_name / amount / transaction_type，
+                可选 remark(description) / original_category
 
-        if fuzzy_match:
-            return fuzzy_match
+        Returns:
+            与输入一一对应的分类建议，没有商户名或无建议时为 None
+        """
+        index = self._get_index(user_id)
+        merchant_ids = MerchantCanonicalizer(self.db).lookup_many(t.get('merchant_name') for t in transactions)
+        results: List[Optional[CategorySuggestion]] = [None] * len(transactions)
+
+        # 1. 精确匹配 / 2. 规范商户及模糊匹配（同一商户只查一次）
+        matches: Dict[str, Optional[CategorySuggestion]] = {}
+        pending = []
+        for position, transaction in enumerate(transactions):
+            merchant_name = transaction.get('merchant_name')
+            if not merchant_name:
+                continue
+            if merchant_name not in matches:
+                matches[merchant_name] = (
+                    index.exact(merchant_name, min_confidence=0.8)
+                    or index.by_merchant(merchant_ids.get(merchant_name), min_confidence=0.6)
+                    or next(iter(index.search(merchant_name, min_confidence=0.6, limit=1)), None)
+                )
+            if matches[merchant_name]:
+                results[position] = matches[merchant_name]
+            else:
+                pending.append(position)
+
+        # 3. 分类器整批打分
+        predictions = MerchantClassifierService(self.db).predict(
+            user_id, [transactions[position] for position in pending]
+        ) if pending else []
+
+        # 4. 基于规则的初步建议
+        rule_suggestions: Dict[Tuple[str, Optional[TransactionType]], Optional[CategorySuggestion]] = {}
+        for position, prediction in zip(pending, predictions):
+            transaction = transactions[position]
+            merchant_name = transaction['merchant_name']
+            if prediction and prediction[1] >= ML_MIN_CONFIDENCE:
+                results[position] = CategorySuggestion(
+                    user_id=user_id,
+                    merchant_name=merchant_name,
+                    merchant_id=merchant_ids.get(merchant_name),
+                    category_id=prediction[0],
+                    confidence=round(prediction[1], 4),
+                    based_on='machine_learning'
+                )
+                continue
 
-        # 3. 基于规则的初步建议
-        rule_suggestion = self._get_rule_based_suggestion(
-            user_id, merchant_name, amount, transaction_type
-        )
+            key = (merchant_name, transaction.get('transaction_type'))
+            if key not in rule_suggestions:
+                rule_suggestions[key] = self._get_rule_based_suggestion(
+                    user_id, merchant_name, transaction.get('amount'), transaction.get('transaction_type')
+                )
+            results[position] = rule_suggestions[key]
+
+        return results
+
+    def _get_index(self, user_id: int) -> MerchantSuggestionIndex:
+        """获取会话内共享的用户商户建议索引"""
+        return MerchantSuggestionIndex.for_session(self.db, user_id)
+
+    @staticmethod
+    def _find_suggestion(
+        index: MerchantSuggestionIndex,
+        merchant_name: str,
+        merchant_id: Optional[int],
+        min_confidence: float = 0.0
+    ) -> Optional[CategorySuggestion]:
+        """同一规范商户的建议优先，其次按商户名精确匹配"""
+        return index.by_merchant(merchant_id, min_confidence) or index.exact(merchant_name, min_confidence)
 
-        return rule_suggestion
+    def _refresh_index(self, suggestions: List[CategorySuggestion]) -> None:
+        """建议新增或变化后增量更新已加载的索引"""
+        indexes = self.db.info.get(INDEXES_KEY, {})
+        for suggestion in suggestions:
+            index = indexes.get(suggestion.user_id)
+            if index is not None:
+                index.upsert(suggestion)
 
     def _get_rule_based_suggestion(
         self,
@@ -113,6 +196,7 @@ class SmartCategorizationService:
             规则建议
         """
         merchant_lower = merchant_name.lower()
+        resolver = CategoryResolver.for_session(self.db, user_id)
 
         # 餐饮类关键词
         restaurant_keywords = [
@@ -120,10 +204,7 @@ class SmartCategorizationService:
             'restaurant', 'cafe', 'coffee', 'food', 'meal'
         ]
         if any(keyword in merchant_lower for keyword in restaurant_keywords):
-            category = self.db.query(Category).filter(
-                Category.user_id == user_id,
-                Category.name.ilike('%餐饮%') | Category.name.ilike('%食物%')
-            ).first()
+            category = resolver.find_containing(['餐饮', '食物'])
             if category:
                 return CategorySuggestion(
                     user_id=user_id,
@@ -139,10 +220,7 @@ class SmartCategorizationService:
             'taxi', 'bus', 'subway', 'transport'
         ]
         if any(keyword in merchant_lower for keyword in transport_keywords):
-            category = self.db.query(Category).filter(
-                Category.user_id == user_id,
-                Category.name.ilike('%交通%') | Category.name.ilike('%出行%')
-            ).first()
+            category = resolver.find_containing(['交通', '出行'])
             if category:
                 return CategorySuggestion(
                     user_id=user_id,
@@ -158,10 +236,7 @@ class SmartCategorizationService:
             'supermarket', 'mall', 'shopping'
         ]
         if any(keyword in merchant_lower for keyword in shopping_keywords):
-            category = self.db.query(Category).filter(
-                Category.user_id == user_id,
-                Category.name.ilike('%购物%') | Category.name.ilike('%超市%')
-            ).first()
+            category = resolver.find_containing(['购物', '超市'])
             if category:
                 return CategorySuggestion(
                     user_id=user_id,
@@ -205,6 +280,13 @@ class SmartCategorizationService:
         if not transaction:
             raise NotFoundError("交易不存在")
 
+        correct_category = CategoryResolver.for_session(self.db, user_id).get(correct_category_id)
+        if not correct_category:
+            raise NotFoundError("分类不存在")
+
+        # 分类器增量学习这条反馈
+        learning = MerchantClassifierService(self.db).learn_feedback(transaction, correct_category)
+
         # 获取原始建议
         original_suggestion = None
         confidence_before = 0.0
@@ -224,9 +306,10 @@ class SmartCategorizationService:
             correct_category_id=correct_category_id,
             feedback_type=feedback_type,
             confidence_before=confidence_before,
-            user_notes=user_notes,
-            model_version="1.0",
-            learning_algorithm="user_feedback"
+            confidence_after=learning["confidence_after"],
+            model_version=learning["model_version"],
+            learning_algorithm="naive_bayes",
+            learning_accuracy=learning["accuracy"]
         )
 
         self.db.add(learning_record)
@@ -236,18 +319,19 @@ class SmartCategorizationService:
         # 更新建议统计
         if suggestion_id:
             self._update_suggestion_stats(
-                suggestion_id, feedback_type == "confirm"
+                suggestion_id, feedback_type == "confirm", user_notes
             )
 
         return learning_record
 
-    def _update_suggestion_stats(self, suggestion_id: int, is_correct: bool):
+    def _update_suggestion_stats(self, suggestion_id: int, is_correct: bool, user_notes: Optional[str] = None):
         """
         更新建议统计
 
         Args:
             suggestion_id: 建议ID
             is_correct: 是否正确
+            user_notes: 用户备注
         """
         suggestion = self.db.query(CategorySuggestion).filter(
             CategorySuggestion.id == suggestion_id
@@ -268,7 +352,11 @@ class SmartCategorizationService:
             suggestion.confidence = max(0.1, suggestion.confidence - 0.05)
             suggestion.user_feedback = False
 
+        if user_notes:
+            suggestion.user_notes = user_notes
+
         self.db.commit()
+        self._refresh_index([suggestion])
 
     def update_suggestion_from_learning(
         self,
@@ -290,10 +378,9 @@ class SmartCategorizationService:
             更新的建议
         """
         # 查找现有建议
-        suggestion = self.db.query(CategorySuggestion).filter(
-            CategorySuggestion.user_id == user_id,
-            CategorySuggestion.merchant_name == merchant_name
-        ).first()
+        suggestion = self._find_suggestion(
+            self._get_index(user_id), merchant_name, MerchantCanonicalizer(self.db).lookup(merchant_name)
+        )
 
         if suggestion:
             # 更新现有建议
@@ -301,7 +388,6 @@ class SmartCategorizationService:
             suggestion.frequency += 1
             suggestion.confidence = confidence
             suggestion.based_on = 'machine_learning'
-            suggestion.last_updated_at = datetime.now()
         else:
             # 创建新建议
             suggestion = CategorySuggestion(
@@ -316,40 +402,207 @@ class SmartCategorizationService:
 
         self.db.commit()
         self.db.refresh(suggestion)
+        self._refresh_index([suggestion])
         return suggestion
 
-    def batch_learn_from_transactions(self, user_id: int) -> int:
+    def batch_learn_from_transactions(self, user_id: int, chunk_size: int = LEARNING_CHUNK_SIZE) -> int:
         """
-        从现有交易批量学习
+        从交易增量学习
+
+        按 (updated_at, id) 水位线只读取上次学习之后新增或修改的交易，找出涉及的商户，
+        再用一次分组查询重新统计这些商户近期交易的次数和分类分布，最后批量写回建议和水位线。
+        修改过的交易只是触发重新统计，不会重复计数；开销与新交易及其涉及商户的交易数成正比。
+
+        MySQL DATETIME 只精确到秒，与水位线同一秒内修改的较小ID交易既不晚于水位线时间、
+        ID 也不大于水位线ID，严格比较会永远漏掉。因此每次从水位线所在那一秒的开头重新扫描，
+        重复读到的交易只会触发幂等的重新统计，且不计入本次学习数量。
 
         Args:
             user_id: 用户ID
+            chunk_size: 每次读取的交易数
 
         Returns:
-            学习记录数量
+            本次学习的交易数量
         """
-        # 获取最近的交易
-        recent_transactions = self.db.query(Transaction).filter(
-            Transaction.user_id == user_id,
-            Transaction.transaction_date >= datetime.now() - timedelta(days=90),
-            Transaction.merchant_name.isnot(None)
-        ).all()
-
+        watermark = self.db.query(LearningWatermark).filter(
+            LearningWatermark.user_id == user_id
+        ).first()
+        if not watermark:
+            watermark = LearningWatermark(user_id=user_id, last_transaction_id=0, processed_count=0)
+            self.db.add(watermark)
+
+        since = datetime.now() - timedelta(days=90)
+        watermark_key = (watermark.last_updated_at, watermark.last_transaction_id or 0)
+        rescan_from = watermark.last_updated_at.replace(microsecond=0) if watermark.last_updated_at else None
+        last_updated_at, last_id = watermark_key
+        cursor = None
+        merchant_ids, merchant_names = set(), set()
         learned_count = 0
 
-        for transaction in recent_transactions:
-            if transaction.merchant_name:
-                # 更新或创建建议
-                self.update_suggestion_from_learning(
-                    user_id=user_id,
-                    merchant_name=transaction.merchant_name,
-                    category_id=transaction.category_id,
-                    confidence=0.7  # 基于用户自己的交易，置信度较高
-                )
-                learned_count += 1
+        while True:
+            query = self.db.query(
+                Transaction.id, Transaction.updated_at, Transaction.merchant_name,
+                Transaction.merchant_id, Transaction.category_id
+            ).filter(
+                Transaction.user_id == user_id,
+                Transaction.transaction_date >= since,
+                Transaction.merchant_name.isnot(None)
+            )
+            if cursor is not None:
+                query = query.filter(or_(
+                    Transaction.updated_at > cursor[0],
+                    and_(Transaction.updated_at == cursor[0], Transaction.id > cursor[1])
+                ))
+            elif rescan_from is not None:
+                query = query.filter(Transaction.updated_at >= rescan_from)
+            rows = query.order_by(Transaction.updated_at, Transaction.id).limit(chunk_size).all()
+
+            for row in rows:
+                if not row.merchant_name.strip():
+                    continue
+                if row.merchant_id is not None:
+                    merchant_ids.add(row.merchant_id)
+                else:
+                    merchant_names.add(row.merchant_name)
+                if rescan_from is None or (row.updated_at, row.id) > watermark_key:
+                    learned_count += 1
+
+            if rows:
+                cursor = (rows[-1].updated_at, rows[-1].id)
+                if last_updated_at is None or cursor > (last_updated_at, last_id):
+                    last_updated_at, last_id = cursor
+            if len(rows) < chunk_size:
+                break
+
+        if merchant_ids or merchant_names:
+            self._write_learned_suggestions(
+                user_id, self._count_merchant_transactions(user_id, merchant_ids, merchant_names, since)
+            )
 
+        watermark.last_updated_at = last_updated_at
+        watermark.last_transaction_id = last_id
+        watermark.processed_count = (watermark.processed_count or 0) + learned_count
+        self.db.commit()
         return learned_count
 
+    def _count_merchant_transactions(
+        self,
+        user_id: int,
+        merchant_ids: set,
+        merchant_names: set,
+        since: datetime
+    ) -> Dict[object, list]:
+        """
+        分组统计商户近期交易的次数和分类分布
+
+        Args:
+            user_id: 用户ID
+            merchant_ids: 规范商户ID
+            merchant_names: 没有规范商户ID的商户名
+            since: 统计起始时间
+
+        Returns:
+            规范商户ID或商户名(小写) -> [原始商户名, 规范商户ID, 次数, {分类ID: (次数, 最大交易ID)}]
+        """
+        base = self.db.query(
+            Transaction.merchant_id,
+            Transaction.merchant_name,
+            Transaction.category_id,
+            func.count(Transaction.id).label("count"),
+            func.max(Transaction.id).label("last_id")
+        ).filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_date >= since,
+            Transaction.merchant_name.isnot(None)
+        ).group_by(Transaction.merchant_id, Transaction.merchant_name, Transaction.category_id)
+
+        ids, names = list(merchant_ids), list(merchant_names)
+        groups = []
+        for i in range(0, len(ids), 1000):
+            groups.extend(base.filter(Transaction.merchant_id.in_(ids[i:i + 1000])).all())
+        for i in range(0, len(names), 1000):
+            groups.extend(base.filter(
+                Transaction.merchant_id.is_(None),
+                Transaction.merchant_name.in_(names[i:i + 1000])
+            ).all())
+
+        merchants: Dict[object, list] = {}
+        for group in groups:
+            name = group.merchant_name.strip()
+            if not name:
+                continue
+            key = ("id", group.merchant_id) if group.merchant_id is not None else ("name", name.lower())
+            entry = merchants.setdefault(key, [name, group.merchant_id, 0, {}])
+            entry[2] += group.count
+            count, last_id = entry[3].get(group.category_id, (0, 0))
+            entry[3][group.category_id] = (count + group.count, max(last_id, group.last_id))
+        return merchants
+
+    def _write_learned_suggestions(self, user_id: int, merchants: Dict[object, list]) -> None:
+        """
+        批量写回学习结果：已有建议按主键批量更新，新商户批量插入
+
+        Args:
+            user_id: 用户ID
+            merchants: 规范商户ID或商户名(小写) -> [原始商户名, 规范商户ID, 次数, {分类ID: (次数, 最大交易ID)}]
+        """
+        index = self.db.info.get(INDEXES_KEY, {}).get(user_id)
+        if index is None:
+            # 会话中没有加载索引时只查询本次涉及的商户
+            entries = list(merchants.values())
+            index = MerchantSuggestionIndex(
+                suggestion
+                for i in range(0, len(entries), 1000)
+                for suggestion in self.db.query(CategorySuggestion).filter(
+                    CategorySuggestion.user_id == user_id,
+                    or_(
+                        CategorySuggestion.merchant_id.in_(
+                            [entry[1] for entry in entries[i:i + 1000] if entry[1] is not None]
+                        ),
+                        func.lower(CategorySuggestion.merchant_name).in_(
+                            [entry[0].lower() for entry in entries[i:i + 1000]]
+                        )
+                    )
+                )
+            )
+        updates = []
+        inserts = []
+        for name, merchant_id, frequency, counts in merchants.values():
+            # 出现最多的分类，次数相同时取较新的
+            category_id = max(counts, key=counts.get)
+            suggestion = self._find_suggestion(index, name, merchant_id)
+            if suggestion:
+                values = {
+                    "merchant_id": merchant_id if merchant_id is not None else suggestion.merchant_id,
+                    "category_id": category_id,
+                    "frequency": frequency,
+                    "confidence": LEARNED_CONFIDENCE,
+                    "based_on": "machine_learning"
+                }
+                updates.append({"id": suggestion.id, **values})
+                # 同步会话中已加载的对象，不标记为脏
+                for attr, value in values.items():
+                    set_committed_value(suggestion, attr, value)
+                index.upsert(suggestion)
+            else:
+                inserts.append({
+                    "user_id": user_id,
+                    "merchant_name": name,
+                    "merchant_id": merchant_id,
+                    "category_id": category_id,
+                    "confidence": LEARNED_CONFIDENCE,
+                    "frequency": frequency,
+                    "based_on": "machine_learning"
+                })
+
+        if updates:
+            self.db.execute(update(CategorySuggestion), updates)
+        for i in range(0, len(inserts), 1000):
+            self.db.execute(insert(CategorySuggestion), inserts[i:i + 1000])
+        if inserts:
+            # 新建议没有加载到索引中，下次使用时重新加载
+            self.db.info.get(INDEXES_KEY, {}).pop(user_id, None)
+
     def get_learning_statistics(self, user_id: int) -> Dict:
         """
         获取学习统计信息
@@ -439,17 +692,18 @@ class SmartCategorizationService:
             导入数量
         """
         imported_count = 0
+        index = self._get_index(user_id)
+        merchant_ids = MerchantCanonicalizer(self.db).lookup_many(mappings)
+        changed = []
 
         for merchant_name, category_id in mappings.items():
-            existing = self.db.query(CategorySuggestion).filter(
-                CategorySuggestion.user_id == user_id,
-                CategorySuggestion.merchant_name == merchant_name
-            ).first()
+            existing = self._find_suggestion(index, merchant_name, merchant_ids.get(merchant_name))
 
             if existing and overwrite:
                 existing.category_id = category_id
                 existing.confidence = 0.9  # 用户手动设置，高置信度
                 existing.based_on = 'user_input'
+                changed.append(existing)
                 imported_count += 1
             elif not existing:
                 suggestion = CategorySuggestion(
@@ -460,7 +714,9 @@ class SmartCategorizationService:
                     based_on='user_input'
                 )
                 self.db.add(suggestion)
+                changed.append(suggestion)
                 imported_count += 1
 
         self.db.commit()
+        self._refresh_index(changed)
         return imported_count
\ No newline at end of file
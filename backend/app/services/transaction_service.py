@@ -1,6 +1,6 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, Query, aliased
 from sqlalchemy import and_, or_, func, desc
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterator
 from datetime import datetime
 from decimal import Decimal
 
@@ -12,7 +12,8 @@ from app.schemas.transaction import (
     TransactionSummary
 )
 from app.core.exceptions import ValidationError, NotFoundError
-from app.services.account_balance_history_service import AccountBalanceHistoryService
+from app.services.ledger_hooks import on_transactions_changed
+from app.utils.ledger import snapshot_transaction
 
 class TransactionService:
     def __init__(self, db: Session):
@@ -70,24 +71,10 @@ class TransactionService:
             **transaction_data.model_dump(exclude_unset=True)
         )
 
-        # 更新账户余额
-        if transaction_data.type == TransactionType.INCOME:
-            account.balance += transaction_data.amount
-        elif transaction_data.type == TransactionType.EXPENSE:
-            account.balance -= transaction_data.amount
-        # 转账类型的余额变化在专门的转账方法中处理
-
+        # 账户余额（含转账双方）及余额历史由交易写入钩子在同一事务中更新
         self.db.add(transaction)
+        on_transactions_changed(self.db, added=[transaction])
         self.db.commit()
-
-        # 记录余额变化历史
-        balance_service = AccountBalanceHistoryService(self.db)
-        try:
-            balance_service.record_transaction_change(transaction)
-        except Exception:
-            # 如果记录历史失败，不影响交易创建
-            pass
-
         self.db.refresh(transaction)
 
         return transaction
@@ -135,58 +122,135 @@ class TransactionService:
         query = self.db.query(Transaction).filter(Transaction.user_id == user_id)
 
         # 应用筛选条件
-        if filter:
-            if filter.type:
-                query = query.filter(Transaction.type == filter.type)
-
-            if filter.category_id:
-                query = query.filter(Transaction.category_id == filter.category_id)
-
-            if filter.account_id:
-                query = query.filter(
-                    or_(
-                        Transaction.account_id == filter.account_id,
-                        Transaction.to_account_id == filter.account_id
-                    )
+        query = self._apply_filter(query, filter)
+
+        # 获取总数量
+        total = query.count()
+
+        # 分页和排序
+        transactions = query.order_by(desc(Transaction.transaction_date)).offset(
+            (page - 1) * page_size
+        ).limit(page_size).all()
+
+        return transactions, total
+
+    def _apply_filter(self, query: Query, filter: Optional[TransactionFilter]) -> Query:
+        """
+        将筛选条件应用到交易查询
+
+        Args:
+            query: 交易查询
+            filter: 筛选条件
+
+        Returns:
+            应用筛选条件后的查询
+        """
+        if not filter:
+            return query
+
+        if filter.type:
+            query = query.filter(Transaction.type == filter.type)
+
+        if filter.category_id:
+            query = query.filter(Transaction.category_id == filter.category_id)
+
+        if filter.account_id:
+            query = query.filter(
+                or_(
+                    Transaction.account_id == filter.account_id,
+                    Transaction.to_account_id == filter.account_id
                 )
+            )
 
-            if filter.start_date:
-                query = query.filter(Transaction.transaction_date >= filter.start_date)
+        if filter.start_date:
+            query = query.filter(Transaction.transaction_date >= filter.start_date)
 
-            if filter.end_date:
-                query = query.filter(Transaction.transaction_date <= filter.end_date)
+        if filter.end_date:
+            query = query.filter(Transaction.transaction_date <= filter.end_date)
 
-            if filter.keyword:
-                keyword = f"%{filter.keyword}%"
-                query = query.filter(
-                    or_(
-                        Transaction.remark.ilike(keyword),
-                        Transaction.merchant_name.ilike(keyword),
-                        Transaction.tags.ilike(keyword)
-                    )
+        if filter.keyword:
+            keyword = f"%{filter.keyword}%"
+            query = query.filter(
+                or_(
+                    Transaction.remark.ilike(keyword),
+                    Transaction.merchant_name.ilike(keyword),
+                    Transaction.tags.ilike(keyword)
                 )
+            )
 
-            if filter.min_amount:
-                query = query.filter(Transaction.amount >= filter.min_amount)
+        if filter.min_amount:
+            query = query.filter(Transaction.amount >= filter.min_amount)
 
-            if filter.max_amount:
-                query = query.filter(Transaction.amount <= filter.max_amount)
+        if filter.max_amount:
+            query = query.filter(Transaction.amount <= filter.max_amount)
 
-            if filter.source:
-                query = query.filter(Transaction.source == filter.source)
+        if filter.source:
+            query = query.filter(Transaction.source == filter.source)
 
-            if filter.is_repeated is not None:
-                query = query.filter(Transaction.is_repeated == filter.is_repeated)
+        if filter.is_repeated is not None:
+            query = query.filter(Transaction.is_repeated == filter.is_repeated)
 
-        # 获取总数量
-        total = query.count()
+        return query
 
-        # 分页和排序
-        transactions = query.order_by(desc(Transaction.transaction_date)).offset(
-            (page - 1) * page_size
-        ).limit(page_size).all()
+    def stream_transactions(
+        self,
+        user_id: int,
+        filter: Optional[TransactionFilter] = None,
+        batch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        流式读取全部匹配的交易记录
 
-        return transactions, total
+        使用服务端游标按批次拉取，内存占用与结果集大小无关；
+        按交易ID升序输出，便于对账脚本断点续传。
+
+        Args:
+            user_id: 用户ID
+            filter: 筛选条件
+            batch_size: 每批从游标拉取的行数
+
+        Returns:
+            交易记录字典迭代器
+        """
+        to_account = aliased(Account)
+
+        query = self.db.query(
+            Transaction.id,
+            Transaction.user_id,
+            Transaction.type,
+            Transaction.amount,
+            Transaction.category_id,
+            Category.name.label("category_name"),
+            Transaction.account_id,
+            Account.name.label("account_name"),
+            Transaction.to_account_id,
+            to_account.name.label("to_account_name"),
+            Transaction.transaction_date,
+            Transaction.remark,
+            Transaction.tags,
+            Transaction.location,
+            Transaction.source,
+            Transaction.wechat_transaction_id,
+            Transaction.original_category,
+            Transaction.merchant_name,
+            Transaction.merchant_id,
+            Transaction.pay_method,
+            Transaction.is_repeated,
+            Transaction.created_at,
+            Transaction.updated_at
+        ).outerjoin(
+            Category, Category.id == Transaction.category_id
+        ).outerjoin(
+            Account, Account.id == Transaction.account_id
+        ).outerjoin(
+            to_account, to_account.id == Transaction.to_account_id
+        ).filter(Transaction.user_id == user_id)
+
+        query = self._apply_filter(query, filter)
+
+        # yield_per 会启用 stream_results（服务端游标），避免一次性加载全部结果
+        for row in query.order_by(Transaction.id).yield_per(batch_size):
+            yield row._asdict()
 
     def update_transaction(
         self,
@@ -227,9 +291,11 @@ class TransactionService:
                 raise ValidationError("账户不存在或无权访问")
 
         # 更新字段
+        previous = snapshot_transaction(transaction)
         for field, value in update_data.items():
             setattr(transaction, field, value)
 
+        on_transactions_changed(self.db, added=[transaction], removed=[previous])
         self.db.commit()
         self.db.refresh(transaction)
 
@@ -248,7 +314,9 @@ class TransactionService:
         """
         transaction = self.get_transaction(user_id, transaction_id)
 
+        previous = snapshot_transaction(transaction)
         self.db.delete(transaction)
+        on_transactions_changed(self.db, removed=[previous])
         self.db.commit()
 
         return True
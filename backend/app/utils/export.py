@@ -1,6 +1,12 @@
 import os
-from datetime import datetime
-from typing import List
+import io
+import csv
+import json
+import zlib
+import enum
+from datetime import datetime, date
+from decimal import Decimal
+from typing import List, Dict, Any, Iterable, Iterator
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
@@ -186,4 +192,99 @@ def _fill_details_sheet(ws, transactions, header_font, header_fill, border, cent
         ws.column_dimensions[get_column_letter(col_idx)].width = width
 
     # 冻结窗格
-    ws.freeze_panes = 'A3'
\ No newline at end of file
+    ws.freeze_panes = 'A3'
+
+# 流式导出字段（与 TransactionService.stream_transactions 的输出一致）
+TRANSACTION_STREAM_FIELDS = [
+    "id", "user_id", "type", "amount", "category_id", "category_name",
+    "account_id", "account_name", "to_account_id", "to_account_name",
+    "transaction_date", "remark", "tags", "location", "source",
+    "wechat_transaction_id", "original_category", "merchant_name", "merchant_id",
+    "pay_method", "is_repeated", "created_at", "updated_at"
+]
+
+def _to_stream_value(value: Any) -> Any:
+    """将数据库取值转换为可序列化的值"""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def iter_ndjson(rows: Iterable[Dict[str, Any]], chunk_rows: int = 500) -> Iterator[bytes]:
+    """
+    将记录流编码为 NDJSON（每行一个JSON对象）
+
+    Args:
+        rows: 记录迭代器
+        chunk_rows: 每次输出合并的行数
+
+    Returns:
+        字节块迭代器
+    """
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps(
+            {key: _to_stream_value(value) for key, value in row.items()},
+            ensure_ascii=False
+        ))
+        if len(buffer) >= chunk_rows:
+            yield ("\n".join(buffer) + "\n").encode("utf-8")
+            buffer = []
+
+    if buffer:
+        yield ("\n".join(buffer) + "\n").encode("utf-8")
+
+def iter_csv(
+    rows: Iterable[Dict[str, Any]],
+    fields: List[str],
+    chunk_rows: int = 500
+) -> Iterator[bytes]:
+    """
+    将记录流编码为 CSV（首行为表头）
+
+    Args:
+        rows: 记录迭代器
+        fields: 输出字段
+        chunk_rows: 每次输出合并的行数
+
+    Returns:
+        字节块迭代器
+    """
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(fields)
+
+    count = 0
+    for row in rows:
+        writer.writerow([_to_stream_value(row.get(field)) for field in fields])
+        count += 1
+        if count >= chunk_rows:
+            yield output.getvalue().encode("utf-8")
+            output.seek(0)
+            output.truncate(0)
+            count = 0
+
+    remaining = output.getvalue()
+    if remaining:
+        yield remaining.encode("utf-8")
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """
+    对字节流进行增量 gzip 压缩
+
+    Args:
+        chunks: 原始字节块
+        level: 压缩级别
+
+    Returns:
+        压缩后的字节块迭代器
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip 封装
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,120 @@
+"""
+Aho-Corasick 多关键词匹配
+
+把全部关键词编译成一个自动机，对文本只做一次线性扫描即可找出其中出现的所有关键词，
+耗时与关键词数量无关。关键词和文本均按小写匹配。
+"""
+
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class KeywordMatcher:
+    """Aho-Corasick 自动机，每个关键词可关联多个值"""
+
+    def __init__(self, keywords: Iterable[Tuple[str, Any]] = ()):
+        # 节点以下标表示：_goto[节点][字符] -> 子节点
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 节点上结束的关键词下标；_output 另含经失败链继承的，build 时重新计算
+        self._terminal: List[Optional[int]] = [None]
+        self._output: List[List[int]] = [[]]
+        self.keywords: List[str] = []
+        self.values: List[List[Any]] = []
+        self._index: Dict[str, int] = {}
+        self._built = False
+        for keyword, value in keywords:
+            self.add(keyword, value)
+        self.build()
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def add(self, keyword: str, value: Any) -> None:
+        """
+        添加关键词（添加后需重新 build）
+
+        Args:
+            keyword: 关键词
+            value: 关联值
+        """
+        keyword = (keyword or "").strip().lower()
+        if not keyword:
+            return
+        if keyword in self._index:
+            self.values[self._index[keyword]].append(value)
+            return
+
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._terminal.append(None)
+                self._output.append([])
+                self._goto[node][char] = next_node
+            node = next_node
+
+        self._index[keyword] = len(self.keywords)
+        self._terminal[node] = len(self.keywords)
+        self.keywords.append(keyword)
+        self.values.append([value])
+        self._built = False
+
+    def build(self) -> None:
+        """按广度优先计算失败指针并合并输出"""
+        self._output = [[] if terminal is None else [terminal] for terminal in self._terminal]
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                # 失败节点对应的关键词都是当前关键词的后缀，一并输出
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+                queue.append(child)
+        self._built = True
+
+    def find(self, text: str) -> List[int]:
+        """
+        扫描文本，返回出现过的关键词下标（每个关键词只返回一次，按首次出现顺序）
+
+        Args:
+            text: 待匹配文本
+
+        Returns:
+            关键词下标列表，可通过 keywords / values 取得关键词和关联值
+        """
+        if not self._built:
+            self.build()
+
+        goto, fail, output = self._goto, self._fail, self._output
+        found: Dict[int, None] = {}
+        node = 0
+        for char in (text or "").lower():
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for index in output[node]:
+                found[index] = None
+        return list(found)
+
+    def find_keywords(self, text: str) -> List[Tuple[str, List[Any]]]:
+        """
+        扫描文本，返回出现过的关键词及其关联值
+
+        Args:
+            text: 待匹配文本
+
+        Returns:
+            (关键词, 关联值列表) 列表
+        """
+        return [(self.keywords[index], self.values[index]) for index in self.find(text)]
@@ -0,0 +1,90 @@
+"""
+账本口径工具
+
+统一定义一笔交易对账户余额的影响：
+- 收入：account_id 账户 +amount
+- 支出：account_id 账户 -amount
+- 转账：account_id 账户 -amount，to_account_id 账户 +amount
+"""
+
+from types import SimpleNamespace
+from decimal import Decimal
+from typing import List, Tuple
+
+from sqlalchemy import select, union_all, case
+
+from app.models.transaction import Transaction, TransactionType
+
+LEDGER_FIELDS = ("id", "user_id", "type", "amount", "account_id", "to_account_id", "category_id", "transaction_date")
+
+
+def snapshot_transaction(transaction) -> SimpleNamespace:
+    """
+    复制交易中影响余额和预算计数的字段，用于修改/删除前保留旧值
+
+    Args:
+        transaction: 交易对象
+
+    Returns:
+        只包含账本字段的快照
+    """
+    return SimpleNamespace(**{field: getattr(transaction, field, None) for field in LEDGER_FIELDS})
+
+
+def transaction_deltas(transaction) -> List[Tuple[int, Decimal]]:
+    """
+    计算交易对各账户余额的变化
+
+    Args:
+        transaction: 交易对象或快照
+
+    Returns:
+        [(账户ID, 变化金额)]
+    """
+    amount = Decimal(str(transaction.amount or 0))
+    if transaction.type == TransactionType.INCOME:
+        return [(transaction.account_id, amount)]
+    if transaction.type == TransactionType.EXPENSE:
+        return [(transaction.account_id, -amount)]
+    if transaction.type == TransactionType.TRANSFER:
+        deltas = [(transaction.account_id, -amount)]
+        if transaction.to_account_id:
+            deltas.append((transaction.to_account_id, amount))
+        return deltas
+    return []
+
+
+def ledger_legs(*conditions):
+    """
+    把交易展开为 (account_id, transaction_date, delta) 的余额变化分录子查询
+
+    转账会拆成转出、转入两条分录，conditions 同时作用于两条分支。
+
+    Args:
+        conditions: 作用于 Transaction 列的过滤条件
+
+    Returns:
+        子查询，列为 account_id、user_id、transaction_date、delta
+    """
+    outgoing = select(
+        Transaction.account_id.label("account_id"),
+        Transaction.user_id.label("user_id"),
+        Transaction.transaction_date.label("transaction_date"),
+        case(
+            (Transaction.type == TransactionType.INCOME, Transaction.amount),
+            else_=-Transaction.amount
+        ).label("delta")
+    ).where(*conditions)
+
+    incoming = select(
+        Transaction.to_account_id.label("account_id"),
+        Transaction.user_id.label("user_id"),
+        Transaction.transaction_date.label("transaction_date"),
+        Transaction.amount.label("delta")
+    ).where(
+        Transaction.type == TransactionType.TRANSFER,
+        Transaction.to_account_id.isnot(None),
+        *conditions
+    )
+
+    return union_all(outgoing, incoming).subquery("ledger_legs")
@@ -0,0 +1,118 @@
+"""
+商户名称规范化
+
+同一商户在账单里常有多种写法：全角/半角、分店后缀、“有限公司”等公司后缀、夹带的订单号。
+clean_merchant_name 去掉这些部分得到便于展示的名称；merchant_key 再统一大小写、去掉空白和标点，
+作为精确匹配的键；merchant_shingles 给出键的字符二元组，用于相似度比较。
+
+没有分隔符的“品牌+地点+分店”（如“肯德基徐家汇分店”）无法只靠规则切分品牌和地点，
+规则只去掉“分店”，由 branch_brand_keys 给出候选品牌键，交给归并时与已知商户比对。
+"""
+
+import re
+import unicodedata
+from typing import FrozenSet, List, Tuple
+
+# 订单号、流水号等（带前缀的整段去掉，或连续 6 位以上含数字的编号）
+ORDER_NUMBER_PATTERN = re.compile(
+    r"(订单号|订单编号|订单|单号|流水号|交易号|no\.?)\s*[:：#]?\s*[A-Za-z0-9\-_]+"
+    r"|[A-Za-z0-9\-_]*\d{6,}[A-Za-z0-9\-_]*",
+    re.IGNORECASE
+)
+# 括号内的补充信息，多为分店或公司全称
+BRACKET_PATTERN = re.compile(r"[(\[【{][^()\[\]【】{}]*[)\]】}]")
+# 结尾的分店：“上海分公司”“第3分店”“-徐家汇店”“·万达店”
+BRANCH_PATTERNS = [
+    re.compile(r"(?<=公司)[^\s\-·_]{1,8}分公司$"),
+    re.compile(r"第?[0-9一二三四五六七八九十百]+(号)?分?店$"),
+    re.compile(r"[\s\-·_—]+[^\s\-·_—]{1,10}店$"),
+]
+# 紧接在地点后的“分店”只去掉这两个字，地点由 branch_brand_keys 处理
+BRANCH_WORD_PATTERN = re.compile(r"(?<=[^\s\-·_—])分店$")
+# 候选品牌键的最短长度，以及被视为地点的最短后缀长度
+MIN_BRAND_LENGTH = 2
+MIN_LOCATION_LENGTH = 2
+# 去掉分店后至少保留的字符数，避免“7-11便利店”之类被截成编号
+MIN_BRANCH_REMAINDER = 2
+# 公司后缀
+COMPANY_SUFFIX_PATTERN = re.compile(r"(股份)?有限(责任)?公司$|(股份)?公司$")
+SEPARATORS = " \t-·_—/|:：,，.。"
+KEY_STRIP_PATTERN = re.compile(r"[\W_]+")
+
+
+def _clean(name: str) -> Tuple[str, bool]:
+    """清理名称，并返回是否去掉了紧接地点的“分店”"""
+    original = unicodedata.normalize("NFKC", name or "").strip()
+    cleaned = ORDER_NUMBER_PATTERN.sub(" ", original)
+    cleaned = BRACKET_PATTERN.sub(" ", cleaned).strip(SEPARATORS)
+    for pattern in BRANCH_PATTERNS:
+        stripped = pattern.sub("", cleaned).strip(SEPARATORS)
+        if len(stripped) >= MIN_BRANCH_REMAINDER:
+            cleaned = stripped
+    has_location = False
+    stripped = BRANCH_WORD_PATTERN.sub("", cleaned).strip(SEPARATORS)
+    if stripped != cleaned and len(stripped) >= MIN_BRAND_LENGTH + MIN_LOCATION_LENGTH:
+        cleaned, has_location = stripped, True
+    stripped = COMPANY_SUFFIX_PATTERN.sub("", cleaned).strip(SEPARATORS)
+    if stripped:
+        cleaned = stripped
+    cleaned = " ".join(cleaned.split())
+    return cleaned or original, has_location
+
+
+def clean_merchant_name(name: str) -> str:
+    """
+    去掉订单号、括号说明、分店和公司后缀，保留原有大小写
+
+    Args:
+        name: 原始商户名称
+
+    Returns:
+        清理后的名称；规则把名称全部去掉时返回原名
+    """
+    return _clean(name)[0]
+
+
+def merchant_key(name: str) -> str:
+    """
+    商户规范化键：清理后转小写，去掉空白和标点
+
+    Args:
+        name: 原始商户名称
+
+    Returns:
+        规范化键，无有效字符时为空字符串
+    """
+    return KEY_STRIP_PATTERN.sub("", clean_merchant_name(name).lower())
+
+
+def branch_brand_keys(name: str) -> List[str]:
+    """
+    “品牌+地点+分店”形式名称的候选品牌键：依次去掉末尾 MIN_LOCATION_LENGTH 个及以上字符
+
+    Args:
+        name: 原始商户名称
+
+    Returns:
+        由长到短的候选键；不是该形式时为空列表
+    """
+    cleaned, has_location = _clean(name)
+    if not has_location:
+        return []
+    key = KEY_STRIP_PATTERN.sub("", cleaned.lower())
+    return [key[:length] for length in range(len(key) - MIN_LOCATION_LENGTH, MIN_BRAND_LENGTH - 1, -1)]
+
+
+def merchant_shingles(key: str) -> FrozenSet[str]:
+    """
+    规范化键的字符二元组（单字键返回自身）
+
+    Args:
+        key: 规范化键
+
+    Returns:
+        二元组集合
+    """
+    if len(key) < 2:
+        return frozenset([key]) if key else frozenset()
+    return frozenset(key[i:i + 2] for i in range(len(key) - 1))
@@ -0,0 +1,41 @@
+"""
+数据库迁移脚本：添加账户余额检查点表
+
+运行方式：
+python migrations/add_balance_checkpoints.py
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config.database import engine, SessionLocal
+from app.models import AccountBalanceCheckpoint
+from app.services.balance_checkpoint_service import BalanceCheckpointService
+
+def add_balance_checkpoints():
+    """创建 account_balance_checkpoints 表并按现有交易生成检查点"""
+
+    print("开始添加账户余额检查点表...")
+
+    try:
+        AccountBalanceCheckpoint.__table__.create(engine, checkfirst=True)
+        print("✓ 创建 account_balance_checkpoints 表")
+    except Exception as e:
+        print(f"✗ 创建 account_balance_checkpoints 表失败: {e}")
+        return
+
+    db = SessionLocal()
+    try:
+        result = BalanceCheckpointService(db).rebuild()
+        print(f"✓ 生成检查点：{result['accounts']} 个账户，{result['checkpoints']} 个检查点")
+    except Exception as e:
+        db.rollback()
+        print(f"✗ 生成检查点失败: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_balance_checkpoints()
@@ -0,0 +1,41 @@
+"""
+数据库迁移脚本：添加账户余额校验和表（余额漂移监控）
+
+运行方式：
+python migrations/add_balance_checksums.py
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config.database import engine, SessionLocal
+from app.models import AccountBalanceChecksum
+from app.services.balance_drift_service import BalanceDriftService
+
+def add_balance_checksums():
+    """创建 account_balance_checksums 表并按现有交易初始化"""
+
+    print("开始添加账户余额校验和表...")
+
+    try:
+        AccountBalanceChecksum.__table__.create(engine, checkfirst=True)
+        print("✓ 创建 account_balance_checksums 表")
+    except Exception as e:
+        print(f"✗ 创建 account_balance_checksums 表失败: {e}")
+        return
+
+    db = SessionLocal()
+    try:
+        seeded = BalanceDriftService(db).seed_missing()
+        print(f"✓ 初始化 {seeded} 个账户的校验和")
+    except Exception as e:
+        db.rollback()
+        print(f"✗ 初始化校验和失败: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_balance_checksums()
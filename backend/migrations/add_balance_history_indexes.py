@@ -0,0 +1,52 @@
+"""
+数据库迁移脚本：为 account_balance_history 添加 (account_id, created_at) 索引
+
+运行方式：
+python migrations/add_balance_history_indexes.py
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import text
+from app.config.database import SessionLocal
+
+INDEXES = [
+    ("account_balance_history", "idx_balance_history_account_created", "account_id, created_at"),
+]
+
+def add_balance_history_indexes():
+    """添加余额历史统计查询所需索引"""
+
+    print("开始添加余额历史索引...")
+
+    db = SessionLocal()
+
+    try:
+        for table, index_name, columns in INDEXES:
+            exists = db.execute(text("""
+                SELECT COUNT(*) FROM information_schema.statistics
+                WHERE table_schema = DATABASE() AND table_name = :table AND index_name = :index_name
+            """), {"table": table, "index_name": index_name}).scalar() > 0
+
+            if exists:
+                print(f"✓ 索引 {index_name} 已存在，跳过")
+                continue
+
+            db.execute(text(f"CREATE INDEX {index_name} ON {table}({columns})"))
+            print(f"✓ 创建索引 {index_name} ON {table}({columns})")
+
+        db.commit()
+        print("索引添加完成！")
+
+    except Exception as e:
+        db.rollback()
+        print(f"✗ 添加索引失败: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_balance_history_indexes()
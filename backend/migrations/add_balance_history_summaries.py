@@ -0,0 +1,29 @@
+"""
+数据库迁移脚本：添加余额历史汇总表
+
+运行方式：
+python migrations/add_balance_history_summaries.py
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config.database import engine
+from app.models import AccountBalanceHistorySummary
+
+def add_balance_history_summaries():
+    """创建 account_balance_history_summaries 表"""
+
+    print("开始添加余额历史汇总表...")
+
+    try:
+        AccountBalanceHistorySummary.__table__.create(engine, checkfirst=True)
+        print("✓ 创建 account_balance_history_summaries 表")
+    except Exception as e:
+        print(f"✗ 创建 account_balance_history_summaries 表失败: {e}")
+
+if __name__ == "__main__":
+    add_balance_history_summaries()
@@ -0,0 +1,60 @@
+"""
+数据库迁移脚本：为 budgets 表添加消费计数器字段，并按交易数据回填
+
+运行方式：
+python migrations/add_budget_counters.py
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import text
+from app.config.database import SessionLocal
+from app.models.budget import Budget
+from app.services.budget_service import BudgetService
+
+def column_exists(db, table: str, column: str) -> bool:
+    """检查字段是否已存在"""
+    return db.execute(text("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = :table AND column_name = :column
+    """), {"table": table, "column": column}).scalar() > 0
+
+def add_budget_counters():
+    """添加 budgets.spent_amount / budgets.alert_status 并回填"""
+
+    print("开始添加预算计数器字段...")
+
+    db = SessionLocal()
+
+    try:
+        columns = {
+            "spent_amount": "ALTER TABLE budgets ADD COLUMN spent_amount DECIMAL(12, 2) NOT NULL DEFAULT 0 COMMENT '已消费金额(随交易写入累加)'",
+            "alert_status": "ALTER TABLE budgets ADD COLUMN alert_status VARCHAR(20) NOT NULL DEFAULT 'normal' COMMENT '当前预警状态: normal/warning/exceeded'",
+        }
+        for column, sql in columns.items():
+            if column_exists(db, "budgets", column):
+                print(f"✓ budgets.{column} 已存在，跳过")
+            else:
+                db.execute(text(sql))
+                print(f"✓ 添加 budgets.{column} 字段")
+        db.commit()
+
+        budgets = db.query(Budget).all()
+        BudgetService(db).refresh_counters(budgets)
+        db.commit()
+        print(f"✓ 回填 {len(budgets)} 个预算的消费计数器")
+
+        print("迁移完成！")
+
+    except Exception as e:
+        db.rollback()
+        print(f"✗ 迁移失败: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_budget_counters()
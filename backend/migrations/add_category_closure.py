@@ -0,0 +1,50 @@
+"""
+数据库迁移脚本：添加分类闭包表（用于父分类预算及子树汇总）
+
+运行方式：
+python migrations/add_category_closure.py
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config.database import engine, SessionLocal
+from app.models import CategoryClosure
+from app.services.category_closure_service import CategoryClosureService
+from app.services.budget_service import BudgetService
+from app.models.budget import Budget
+
+def add_category_closure():
+    """创建 category_closure 表，按 parent_id 生成闭包行，并重算预算计数器"""
+
+    print("开始添加分类闭包表...")
+
+    try:
+        CategoryClosure.__table__.create(engine, checkfirst=True)
+        print("✓ 创建 category_closure 表")
+    except Exception as e:
+        print(f"✗ 创建 category_closure 表失败: {e}")
+        return
+
+    db = SessionLocal()
+    try:
+        count = CategoryClosureService(db).rebuild()
+        db.commit()
+        print(f"✓ 生成 {count} 条闭包记录")
+
+        # 父分类预算现在包含子分类支出，计数器需要重算
+        budgets = db.query(Budget).all()
+        BudgetService(db).refresh_counters(budgets)
+        db.commit()
+        print(f"✓ 重算 {len(budgets)} 个预算的消费计数器")
+    except Exception as e:
+        db.rollback()
+        print(f"✗ 生成闭包记录失败: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_category_closure()
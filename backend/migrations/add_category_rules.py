@@ -0,0 +1,29 @@
+"""
+数据库迁移脚本：添加用户自定义分类规则表
+
+运行方式：
+python migrations/add_category_rules.py
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config.database import engine
+from app.models import CategoryRule
+
+def add_category_rules():
+    """创建 category_rules 表"""
+
+    print("开始添加分类规则表...")
+
+    try:
+        CategoryRule.__table__.create(engine, checkfirst=True)
+        print("✓ 创建 category_rules 表")
+    except Exception as e:
+        print(f"✗ 创建 category_rules 表失败: {e}")
+
+if __name__ == "__main__":
+    add_category_rules()
@@ -0,0 +1,29 @@
+"""
+数据库迁移脚本：添加增量学习水位线表
+
+运行方式：
+python migrations/add_learning_watermarks.py
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config.database import engine
+from app.models import LearningWatermark
+
+def add_learning_watermarks():
+    """创建 learning_watermarks 表"""
+
+    print("开始添加学习水位线表...")
+
+    try:
+        LearningWatermark.__table__.create(engine, checkfirst=True)
+        print("✓ 创建 learning_watermarks 表")
+    except Exception as e:
+        print(f"✗ 创建 learning_watermarks 表失败: {e}")
+
+if __name__ == "__main__":
+    add_learning_watermarks()
@@ -0,0 +1,88 @@
+"""
+数据库迁移脚本：添加规范商户表，为 transactions / category_suggestions 添加 merchant_id 并回填
+
+运行方式：
+python migrations/add_merchant_canonicalization.py
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import text
+from app.config.database import SessionLocal, engine
+from app.models import Merchant
+from app.services.merchant_canonicalizer import MerchantCanonicalizer
+
+TABLES = ("transactions", "category_suggestions")
+
+def column_exists(db, table: str, column: str) -> bool:
+    """检查字段是否已存在"""
+    return db.execute(text("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = :table AND column_name = :column
+    """), {"table": table, "column": column}).scalar() > 0
+
+def backfill_merchant_ids(db, table: str, batch_size: int = 1000) -> int:
+    """按不同的商户名解析规范商户并回填 merchant_id"""
+    names = [row[0] for row in db.execute(text(
+        f"SELECT DISTINCT merchant_name FROM {table} WHERE merchant_name IS NOT NULL AND merchant_id IS NULL"
+    ))]
+    canonicalizer = MerchantCanonicalizer(db)
+    updated = 0
+    for i in range(0, len(names), batch_size):
+        merchant_ids = canonicalizer.resolve_many(names[i:i + batch_size])
+        params = [{"merchant_id": merchant_id, "merchant_name": name} for name, merchant_id in merchant_ids.items() if merchant_id]
+        if params:
+            db.execute(text(
+                f"UPDATE {table} SET merchant_id = :merchant_id WHERE merchant_name = :merchant_name AND merchant_id IS NULL"
+            ), params)
+        db.commit()
+        updated += len(params)
+    return updated
+
+def add_merchant_canonicalization():
+    """创建 merchants 表、添加 merchant_id 字段并回填"""
+
+    print("开始添加规范商户...")
+
+    db = SessionLocal()
+
+    try:
+        Merchant.__table__.create(engine, checkfirst=True)
+        print("✓ 创建 merchants 表")
+
+        for table in TABLES:
+            if column_exists(db, table, "merchant_id"):
+                print(f"✓ {table}.merchant_id 已存在，跳过")
+                continue
+            alter_sqls = [
+                f"ALTER TABLE {table} ADD COLUMN merchant_id INT NULL COMMENT '规范商户ID'",
+                f"CREATE INDEX ix_{table}_merchant_id ON {table}(merchant_id)",
+                f"""
+                ALTER TABLE {table}
+                ADD CONSTRAINT fk_{table}_merchant
+                FOREIGN KEY (merchant_id) REFERENCES merchants(id) ON DELETE SET NULL
+                """,
+            ]
+            for sql in alter_sqls:
+                db.execute(text(sql))
+            print(f"✓ 添加 {table}.merchant_id 字段、索引及外键")
+        db.commit()
+
+        for table in TABLES:
+            count = backfill_merchant_ids(db, table)
+            print(f"✓ 回填 {table}.merchant_id：{count} 个商户名")
+
+        print("迁移完成！")
+
+    except Exception as e:
+        db.rollback()
+        print(f"✗ 迁移失败: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_merchant_canonicalization()
@@ -0,0 +1,29 @@
+"""
+数据库迁移脚本：添加通知发件箱表
+
+运行方式：
+python migrations/add_notification_outbox.py
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config.database import engine
+from app.models import NotificationOutbox
+
+def add_notification_outbox():
+    """创建 notification_outbox 表"""
+
+    print("开始添加通知发件箱表...")
+
+    try:
+        NotificationOutbox.__table__.create(engine, checkfirst=True)
+        print("✓ 创建 notification_outbox 表")
+    except Exception as e:
+        print(f"✗ 创建 notification_outbox 表失败: {e}")
+
+if __name__ == "__main__":
+    add_notification_outbox()
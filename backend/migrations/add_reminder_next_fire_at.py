@@ -0,0 +1,67 @@
+"""
+数据库迁移脚本：为 reminders 表添加下次触发时间字段及索引，并计算初始值
+
+运行方式：
+python migrations/add_reminder_next_fire_at.py
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import text
+from app.config.database import SessionLocal
+from app.services.reminder_service import ReminderService
+
+def column_exists(db, table: str, column: str) -> bool:
+    """检查字段是否已存在"""
+    return db.execute(text("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = :table AND column_name = :column
+    """), {"table": table, "column": column}).scalar() > 0
+
+def index_exists(db, table: str, index: str) -> bool:
+    """检查索引是否已存在"""
+    return db.execute(text("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = :table AND index_name = :index
+    """), {"table": table, "index": index}).scalar() > 0
+
+def add_reminder_next_fire_at():
+    """添加 reminders.next_fire_at 并计算所有提醒的下次触发时间"""
+
+    print("开始添加提醒调度字段...")
+
+    db = SessionLocal()
+
+    try:
+        if column_exists(db, "reminders", "next_fire_at"):
+            print("✓ reminders.next_fire_at 已存在，跳过")
+        else:
+            db.execute(text(
+                "ALTER TABLE reminders ADD COLUMN next_fire_at DATETIME NULL COMMENT '下次触发时间(调度索引)'"
+            ))
+            print("✓ 添加 reminders.next_fire_at 字段")
+
+        if index_exists(db, "reminders", "idx_reminder_due"):
+            print("✓ 索引 idx_reminder_due 已存在，跳过")
+        else:
+            db.execute(text("CREATE INDEX idx_reminder_due ON reminders(is_enabled, next_fire_at)"))
+            print("✓ 创建索引 idx_reminder_due")
+        db.commit()
+
+        count = ReminderService(db).reschedule_all()
+        print(f"✓ 计算 {count} 个提醒的下次触发时间")
+
+        print("迁移完成！")
+
+    except Exception as e:
+        db.rollback()
+        print(f"✗ 迁移失败: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_reminder_next_fire_at()
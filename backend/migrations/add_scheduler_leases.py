@@ -0,0 +1,29 @@
+"""
+数据库迁移脚本：添加后台任务租约表
+
+运行方式：
+python migrations/add_scheduler_leases.py
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config.database import engine
+from app.models import SchedulerLease
+
+def add_scheduler_leases():
+    """创建 scheduler_leases 表"""
+
+    print("开始添加后台任务租约表...")
+
+    try:
+        SchedulerLease.__table__.create(engine, checkfirst=True)
+        print("✓ 创建 scheduler_leases 表")
+    except Exception as e:
+        print(f"✗ 创建 scheduler_leases 表失败: {e}")
+
+if __name__ == "__main__":
+    add_scheduler_leases()
@@ -0,0 +1,66 @@
+"""
+数据库迁移脚本：为 transactions 表添加导入批次字段，为 user_preferences 表添加余额校验容差
+
+运行方式：
+python migrations/add_transaction_import_log_id.py
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import text
+from app.config.database import SessionLocal
+
+def column_exists(db, table: str, column: str) -> bool:
+    """检查字段是否已存在"""
+    return db.execute(text("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = :table AND column_name = :column
+    """), {"table": table, "column": column}).scalar() > 0
+
+def add_transaction_import_log_id():
+    """添加 transactions.import_log_id 与 user_preferences.tolerance"""
+
+    print("开始添加导入批次字段...")
+
+    db = SessionLocal()
+
+    try:
+        if column_exists(db, "transactions", "import_log_id"):
+            print("✓ transactions.import_log_id 已存在，跳过")
+        else:
+            alter_sqls = [
+                "ALTER TABLE transactions ADD COLUMN import_log_id INT NULL COMMENT '导入批次ID'",
+                "CREATE INDEX ix_transactions_import_log_id ON transactions(import_log_id)",
+                """
+                ALTER TABLE transactions
+                ADD CONSTRAINT fk_transactions_import_log
+                FOREIGN KEY (import_log_id) REFERENCES import_logs(id) ON DELETE SET NULL
+                """,
+            ]
+            for sql in alter_sqls:
+                db.execute(text(sql))
+            print("✓ 添加 transactions.import_log_id 字段、索引及外键")
+
+        if column_exists(db, "user_preferences", "tolerance"):
+            print("✓ user_preferences.tolerance 已存在，跳过")
+        else:
+            db.execute(text(
+                "ALTER TABLE user_preferences ADD COLUMN tolerance FLOAT DEFAULT 0.01 COMMENT '余额校验容差'"
+            ))
+            print("✓ 添加 user_preferences.tolerance 字段")
+
+        db.commit()
+        print("迁移完成！")
+
+    except Exception as e:
+        db.rollback()
+        print(f"✗ 迁移失败: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_transaction_import_log_id()
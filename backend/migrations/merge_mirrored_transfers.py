@@ -0,0 +1,87 @@
+"""
+数据库迁移脚本：清理旧版转账产生的镜像交易
+
+旧版账户转账会为一笔转账写入两条 transfer 交易（A→B 和 B→A），
+按账本口径两条记录相互抵消。此脚本找出紧随原交易之后写入的镜像记录并删除，
+之后重建余额检查点。默认只列出候选记录，加 --apply 才会删除。
+
+运行方式：
+python migrations/merge_mirrored_transfers.py [--apply]
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import text
+from app.config.database import SessionLocal
+from app.services.balance_checkpoint_service import BalanceCheckpointService
+
+FIND_MIRRORS_SQL = """
+    SELECT b.id, b.user_id, b.account_id, b.to_account_id, b.amount
+    FROM transactions a
+    JOIN transactions b
+      ON b.id = a.id + 1
+     AND b.user_id = a.user_id
+     AND b.type = 'transfer'
+     AND b.account_id = a.to_account_id
+     AND b.to_account_id = a.account_id
+     AND b.amount = a.amount
+     AND b.transaction_date = a.transaction_date
+    WHERE a.type = 'transfer'
+"""
+
+def merge_mirrored_transfers(apply: bool = False):
+    """查找并删除镜像转账交易"""
+
+    print("开始查找镜像转账交易...")
+
+    db = SessionLocal()
+    try:
+        mirrors = db.execute(text(FIND_MIRRORS_SQL)).fetchall()
+        print(f"✓ 找到 {len(mirrors)} 条镜像转账交易")
+        for row in mirrors[:20]:
+            print(f"  - 交易 {row.id}：用户 {row.user_id}，账户 {row.account_id} → {row.to_account_id}，金额 {row.amount}")
+
+        if not mirrors or not apply:
+            if mirrors:
+                print("未删除任何记录，确认后使用 --apply 执行")
+            return
+
+        ids = [row.id for row in mirrors]
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            db.execute(
+                text(f"DELETE FROM transactions WHERE id IN ({','.join(str(id) for id in chunk)})")
+            )
+        db.commit()
+        print(f"✓ 删除 {len(ids)} 条镜像转账交易")
+
+        user_ids = sorted({row.user_id for row in mirrors})
+        checkpoint_service = BalanceCheckpointService(db)
+        for user_id in user_ids:
+            checkpoint_service.rebuild(user_id=user_id)
+        print(f"✓ 重建 {len(user_ids)} 个用户的余额检查点")
+
+    except Exception as e:
+        db.rollback()
+        print(f"✗ 清理镜像转账失败: {e}")
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='清理旧版转账产生的镜像交易')
+    parser.add_argument('--apply', action='store_true', help='删除找到的镜像交易')
+
+    args = parser.parse_args()
+
+    try:
+        merge_mirrored_transfers(apply=args.apply)
+        print("\n迁移完成！")
+    except Exception:
+        sys.exit(1)
@@ -0,0 +1,89 @@
+"""
+关键词匹配基准：逐关键词 `in` 查找与 Aho-Corasick 自动机一次扫描的耗时对比
+
+运行方式：
+python scripts/benchmark_keyword_matcher.py [--count 100000] [--extra-keywords 0]
+"""
+
+import sys
+import os
+import random
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.category import CategoryType
+from app.services.intelligent_category_service import MERCHANT_KEYWORDS
+from app.utils.keyword_matcher import KeywordMatcher
+
+SUFFIXES = ["", "(万达店)", "有限公司", "旗舰店", "-扫码付款", "第3分店", " 订单号2024061812345678"]
+FILLER = "的一是在不了有和人这中大为上个国我以要他时来到"
+
+
+def generate_merchants(count: int, keywords: list, seed: int = 42) -> list:
+    """生成商户名称：约一半包含规则关键词，其余为随机汉字"""
+    rng = random.Random(seed)
+    merchants = []
+    for _ in range(count):
+        name = "".join(rng.choice(FILLER) for _ in range(rng.randint(2, 8)))
+        if rng.random() < 0.5:
+            name = name[:rng.randint(0, len(name))] + rng.choice(keywords) + name
+        merchants.append((name + rng.choice(SUFFIXES)).lower())
+    return merchants
+
+
+def naive_match(rules: dict, text: str) -> dict:
+    """原实现：每个分类的每个关键词做一次子串查找"""
+    scores = {}
+    for category_name, keywords in rules.items():
+        score = sum(1 for keyword in keywords if keyword.lower() in text)
+        if score:
+            scores[category_name] = score
+    return scores
+
+
+def matcher_match(matcher: KeywordMatcher, text: str) -> dict:
+    scores = {}
+    for index in matcher.find(text):
+        for _, category_name in matcher.values[index]:
+            scores[category_name] = scores.get(category_name, 0) + 1
+    return scores
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='关键词匹配基准')
+    parser.add_argument('--count', type=int, default=100000, help='商户名称数量')
+    parser.add_argument('--extra-keywords', type=int, default=0, help='额外生成的随机关键词数量（模拟用户规则）')
+
+    args = parser.parse_args()
+
+    rules = {name: list(keywords) for name, keywords in MERCHANT_KEYWORDS[CategoryType.EXPENSE].items()}
+    rng = random.Random(7)
+    for i in range(args.extra_keywords):
+        rules.setdefault(f"自定义{i % 20}", []).append("".join(rng.choice(FILLER) for _ in range(4)))
+
+    all_keywords = [keyword for keywords in rules.values() for keyword in keywords]
+    merchants = generate_merchants(args.count, all_keywords)
+
+    start = time.perf_counter()
+    matcher = KeywordMatcher(
+        (keyword, (rank, name)) for rank, (name, keywords) in enumerate(rules.items()) for keyword in keywords
+    )
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    naive_results = [naive_match(rules, text) for text in merchants]
+    naive_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matcher_results = [matcher_match(matcher, text) for text in merchants]
+    matcher_seconds = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(naive_results, matcher_results) if a != b)
+    print(f"✓ {len(merchants)} 个商户名称，{len(all_keywords)} 个关键词，结果不一致 {mismatches} 条")
+    print(f"  自动机编译: {build_seconds * 1000:.1f} ms")
+    print(f"  逐关键词查找: {naive_seconds:.2f} s")
+    print(f"  自动机扫描: {matcher_seconds:.2f} s（{naive_seconds / matcher_seconds:.1f}x）")
@@ -0,0 +1,38 @@
+"""
+余额漂移检查：比较每个账户的校验和与当前余额，只在出现新漂移时写入校验记录
+
+运行方式：
+python scripts/check_balance_drift.py [--tolerance 0.01] [--user-id 1]
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config.database import SessionLocal
+from app.services.balance_drift_service import BalanceDriftService
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='检查账户余额漂移')
+    parser.add_argument('--tolerance', type=float, default=0.01, help='容差（元）')
+    parser.add_argument('--user-id', type=int, help='仅检查指定用户')
+
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        result = BalanceDriftService(db).check(tolerance=args.tolerance, user_id=args.user_id)
+        print(f"✓ 检查 {result['accounts_checked']} 个账户（新初始化 {result['seeded']} 个）：")
+        print(f"  漂移 {len(result['drifted'])} 个，新记录 {result['recorded']} 条，已恢复 {result['resolved']} 个")
+        for item in result["drifted"][:20]:
+            print(f"  - 账户 {item['account_id']}（{item['account_name']}）漂移 {item['drift']:.2f}")
+    except Exception as e:
+        db.rollback()
+        print(f"✗ 检查失败: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
@@ -0,0 +1,43 @@
+"""
+压缩余额历史：早于保留期限的明细折叠为按日/月汇总，原始记录归档为 gzip JSONL
+
+运行方式：
+python scripts/compact_balance_history.py [--retention-days 180] [--period day|month] [--user-id 1]
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config.database import SessionLocal
+from app.models.account_balance_history import HistorySummaryPeriod
+from app.services.balance_history_compaction_service import BalanceHistoryCompactionService
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='压缩并归档账户余额历史')
+    parser.add_argument('--retention-days', type=int, help='明细保留天数，默认取配置')
+    parser.add_argument('--period', choices=[p.value for p in HistorySummaryPeriod], help='汇总周期，默认取配置')
+    parser.add_argument('--user-id', type=int, help='仅压缩指定用户')
+    parser.add_argument('--account-id', type=int, help='仅压缩指定账户')
+
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        period = HistorySummaryPeriod(args.period) if args.period else None
+        result = BalanceHistoryCompactionService(db, period).compact(
+            retention_days=args.retention_days,
+            user_id=args.user_id,
+            account_id=args.account_id
+        )
+        print(f"✓ 压缩完成（边界 {result['horizon']}）：{result['accounts']} 个账户，"
+              f"归档 {result['archived_rows']} 条明细，写入 {result['summaries']} 个汇总周期")
+    except Exception as e:
+        print(f"✗ 压缩失败: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
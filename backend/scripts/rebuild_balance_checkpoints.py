@@ -0,0 +1,41 @@
+"""
+重建账户余额检查点
+
+运行方式：
+python scripts/rebuild_balance_checkpoints.py [--user-id 1] [--account-id 2] [--period month|day]
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config.database import SessionLocal
+from app.models.account_balance_checkpoint import CheckpointPeriod
+from app.services.balance_checkpoint_service import BalanceCheckpointService
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='按交易数据重建账户余额检查点')
+    parser.add_argument('--user-id', type=int, help='仅重建指定用户')
+    parser.add_argument('--account-id', type=int, help='仅重建指定账户')
+    parser.add_argument('--period', choices=[p.value for p in CheckpointPeriod], help='检查点周期，默认取配置')
+
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        period = CheckpointPeriod(args.period) if args.period else None
+        result = BalanceCheckpointService(db, period).rebuild(
+            user_id=args.user_id,
+            account_id=args.account_id
+        )
+        print(f"✓ 重建完成：{result['accounts']} 个账户，{result['checkpoints']} 个检查点")
+    except Exception as e:
+        db.rollback()
+        print(f"✗ 重建失败: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
@@ -0,0 +1,53 @@
+"""
+全量账户余额对账（适合每晚定时执行）
+
+运行方式：
+python scripts/reconcile_balances.py [--fix] [--tolerance 0.01] [--chunk-size 200] [--workers 4]
+"""
+
+import sys
+import os
+import json
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config.database import SessionLocal
+from app.services.balance_reconciliation_service import BalanceReconciliationService
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='按交易记录核对全部账户余额')
+    parser.add_argument('--fix', action='store_true', help='修正差异并记录 CORRECTION 余额历史')
+    parser.add_argument('--tolerance', type=float, default=0.01, help='容差（元）')
+    parser.add_argument('--chunk-size', type=int, default=200, help='每个分块的用户数')
+    parser.add_argument('--workers', type=int, default=4, help='并行线程数')
+    parser.add_argument('--output', help='把完整结果写入 JSON 文件')
+
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        summary = BalanceReconciliationService(db).reconcile_all(
+            fix=args.fix,
+            tolerance=args.tolerance,
+            chunk_size=args.chunk_size,
+            max_workers=args.workers
+        )
+    finally:
+        db.close()
+
+    print(f"✓ 检查用户 {summary['users_checked']} 个，账户 {summary['accounts_checked']} 个")
+    print(f"  差异账户 {summary['discrepancy_count']} 个，已修正 {summary['fixed_count']} 个")
+    for item in summary["discrepancies"][:20]:
+        print(f"  - 账户 {item['account_id']}（{item['account_name']}）："
+              f"实际 {item['actual_balance']:.2f}，应为 {item['expected_balance']:.2f}")
+    for error in summary["errors"]:
+        print(f"✗ 用户 {error['user_ids'][0]}-{error['user_ids'][1]} 对账失败: {error['error']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    sys.exit(1 if summary["errors"] else 0)
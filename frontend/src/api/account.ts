@@ -109,6 +109,16 @@ export function getBalanceStatistics(accountId: number, params?: {
   return request.get<{ data: any }>(`/accounts/${accountId}/balance-statistics`, { params })
 }
 
+/**
+ * 获取账户在指定日期结束时的余额
+ */
+export function getBalanceAsOf(accountId: number, date: string) {
+  return request.get<{ account_id: number; balance: number; checkpoint_date: string | null }>(
+    `/accounts/${accountId}/balance-as-of`,
+    { params: { date } }
+  )
+}
+
 // 导出为accountApi（与组件中使用的名称一致）
 export const accountApi = {
   getAccounts,
@@ -121,5 +131,44 @@ export const accountApi = {
   setDefaultAccount,
   transfer,
   getBalanceHistory,
-  getBalanceStatistics
-}
\ No newline at end of file
+  getBalanceStatistics,
+  getBalanceAsOf
+}
+/**
+ * 获取全部账户及统计信息（余额、收支、转账、交易次数）
+ */
+export function getAccountsWithStats(params?: {
+  type?: string
+  is_enabled?: boolean
+}) {
+  return request.get<{ accounts: Account[]; total: number }>('/accounts/with-stats', { params })
+}
+
+/**
+ * 获取净资产时间序列（总额及各账户余额）
+ */
+export function getNetWorth(params?: {
+  start_date?: string
+  end_date?: string
+  granularity?: 'day' | 'month'
+}) {
+  return request.get<{
+    granularity: string
+    accounts: { id: number; name: string; type: string }[]
+    series: { date: string; total: number; balances: Record<number, number> }[]
+  }>('/accounts/net-worth', { params })
+}
+
+/**
+ * 按交易记录核对账户余额（仅报告差异）
+ */
+export function getBalanceReconciliation(params?: { tolerance?: number }) {
+  return request.get<any>('/accounts/reconciliation', { params })
+}
+
+/**
+ * 按交易记录核对并修正账户余额
+ */
+export function fixBalanceReconciliation(params?: { tolerance?: number }) {
+  return request.post<any>('/accounts/reconciliation', null, { params })
+}
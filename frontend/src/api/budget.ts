@@ -1,8 +1,11 @@
 import request from '@/utils/request'
+import { useUserStore } from '@/stores/user'
 import type {
   Budget,
   BudgetSummary,
   BudgetAlerts,
+  BudgetAlertEvent,
+  BudgetForecastResult,
   CreateBudgetData,
   UpdateBudgetData
 } from '@/types/budget'
@@ -14,6 +17,8 @@ export function getBudgets(params: {
   year: number
   month?: number
   period_type?: string
+  category_id?: number
+  include_descendants?: boolean
 }) {
   return request.get<{
     year: number
@@ -59,4 +64,46 @@ export function getBudgetSummary(params: {
  */
 export function getBudgetAlerts() {
   return request.get<BudgetAlerts>('/budgets/alerts')
-}
\ No newline at end of file
+}
+/**
+ * 获取月度预算的月末支出预测
+ */
+export function getBudgetForecast(params?: {
+  year?: number
+  month?: number
+  history_months?: number
+}) {
+  return request.get<BudgetForecastResult>('/budgets/forecast', { params })
+}
+
+/**
+ * 订阅预算预警推送（SSE），返回取消订阅函数
+ * EventSource 无法携带认证头，这里用 fetch 读取事件流
+ */
+export function subscribeBudgetAlerts(onAlert: (alert: BudgetAlertEvent) => void) {
+  const controller = new AbortController()
+  const baseURL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000/api'
+  const userStore = useUserStore()
+
+  fetch(`${baseURL}/budgets/alerts/stream`, {
+    headers: { Authorization: `Bearer ${userStore.token}` },
+    signal: controller.signal
+  }).then(async (response) => {
+    if (!response.ok || !response.body) return
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+    let buffer = ''
+    while (true) {
+      const { value, done } = await reader.read()
+      if (done) break
+      buffer += value
+      const messages = buffer.split('\n\n')
+      buffer = messages.pop() || ''
+      for (const message of messages) {
+        const data = message.split('\n').find((line) => line.startsWith('data: '))
+        if (data) onAlert(JSON.parse(data.slice(6)))
+      }
+    }
+  }).catch(() => {})
+
+  return () => controller.abort()
+}
@@ -12,6 +12,7 @@ export interface Reminder {
   amount?: number
   is_enabled: boolean
   last_reminded_at?: string
+  next_fire_at?: string
   created_at: string
   updated_at: string
   category_name?: string
@@ -93,4 +93,23 @@ export function getStatistics(params?: {
     net_income: number
     transaction_count: number
   }>('/transactions/statistics', { params })
-}
\ No newline at end of file
+}
+/**
+ * 流式导出全部匹配的交易记录（NDJSON/CSV，用于离线缓存和对账）
+ */
+export function exportTransactionsStream(params?: {
+  format?: 'ndjson' | 'csv'
+  gzip?: boolean
+  type?: string
+  category_id?: number
+  account_id?: number
+  start_date?: string
+  end_date?: string
+  keyword?: string
+  min_amount?: number
+  max_amount?: number
+  source?: string
+  is_repeated?: boolean
+}) {
+  return request.get<string>('/transactions/export/stream', { params, responseType: 'text' })
+}
@@ -55,6 +55,47 @@ export interface BudgetAlert {
   period_type: 'monthly' | 'yearly'
 }
 
+export interface BudgetAlertEvent {
+  event: 'budget_alert'
+  id: number
+  category_id?: number
+  category_name: string
+  budget_amount: number
+  actual_spending: number
+  percentage: number
+  status: 'warning' | 'exceeded'
+  previous_status: 'normal' | 'warning' | 'exceeded'
+  remaining: number
+  alert_threshold: number
+  period_type: 'monthly' | 'yearly'
+  year: number
+  month?: number
+  triggered_at: string
+}
+
+export interface BudgetForecast {
+  id: number
+  category_id?: number
+  category_name: string
+  budget_amount: number
+  actual_spending: number
+  projected_spending: number
+  projected_remaining: number
+  projected_percentage: number
+  overrun_date: string | null
+  already_exceeded: boolean
+  method: 'history' | 'run_rate'
+  history_months_used: number
+}
+
+export interface BudgetForecastResult {
+  year: number
+  month: number
+  history_months: number
+  forecasts: BudgetForecast[]
+  overrun_count: number
+}
+
 export interface BudgetAlerts {
   alerts: BudgetAlert[]
   total_count: number